@@ -8,16 +8,40 @@ sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent))
 
 
 from unit_tests.tests_md_to_html.codeblocks_in_footnote import run_tests as test_codeblocks_in_footnote
+from unit_tests.tests_md_to_html.rewriter import run_tests as test_rewriter
+from unit_tests.tests_md_to_html.compiled_template import run_tests as test_compiled_template
 from unit_tests.tests_note_to_md.inline_tags import run_tests as test_inline_tags
 from unit_tests.tests_note_to_md.obs_img_to_md import run_tests as test_obs_img_to_md
 from unit_tests.tests_post_processing.obs_callout_to_markdown_callout import run_tests as test_obs_callout_to_markdown_callout
+from unit_tests.tests_core.file_finder import run_tests as test_file_finder
+from unit_tests.tests_core.network_tree import run_tests as test_network_tree
+from unit_tests.tests_search.search_index import run_tests as test_search_index
+from unit_tests.tests_search.content_compactor import run_tests as test_content_compactor
+from unit_tests.tests_search.search_server import run_tests as test_search_server
+from unit_tests.tests_serve.pooled_server import run_tests as test_pooled_server
+from unit_tests.tests_serve.file_cache import run_tests as test_file_cache
+from unit_tests.tests_serve.byte_range import run_tests as test_byte_range
+from unit_tests.tests_build.parallel_build import run_tests as test_parallel_build
+from unit_tests.tests_build.incremental_build import run_tests as test_incremental_build
 
 os.environ["TESTS_FAILED"] = "0"
 
 test_codeblocks_in_footnote()
+test_rewriter()
+test_compiled_template()
 test_inline_tags()
 test_obs_img_to_md()
 test_obs_callout_to_markdown_callout()
+test_file_finder()
+test_network_tree()
+test_search_index()
+test_content_compactor()
+test_search_server()
+test_pooled_server()
+test_file_cache()
+test_byte_range()
+test_parallel_build()
+test_incremental_build()
 
 if (os.environ["TESTS_FAILED"] == '1'):
     sys.exit(1)
\ No newline at end of file
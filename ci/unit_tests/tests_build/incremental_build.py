@@ -0,0 +1,85 @@
+import sys
+import os
+import shutil
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import paths, temp_dir, write_test_config, convert_test_vault, check_same_output, test, \
+                                      load_vault, BuildManifest
+
+
+def edit_note(path, old, new):
+    with open(path, 'r', encoding='utf-8') as f:
+        contents = f.read()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(contents.replace(old, new))
+
+
+def get_dirty_notes(cfg_path):
+    """Returns the notes that the next incremental build would convert (this discards the manifest of the previous build)"""
+    argv = sys.argv
+    sys.argv = ['obsidianhtml', 'convert', '-i', cfg_path.as_posix()]
+    try:
+        manifest = BuildManifest(load_vault())
+    finally:
+        sys.argv = argv
+    manifest.load()
+    manifest.compile_dirty_notes()
+    return manifest.dirty_notes
+
+
+def run_tests():
+    # work on a copy of the test vault, so that notes can be changed
+    folder = temp_dir.joinpath('incremental_build')
+    vault = folder.joinpath('vault')
+    shutil.copytree(paths['test_vault'], vault)
+    entrypoint = {'obsidian_entrypoint_path_str': vault.joinpath('entrypoint.md').as_posix()}
+
+    incremental_cfg = write_test_config(folder.joinpath('incremental'), {**entrypoint, 'incremental_build': True})
+    convert_test_vault(incremental_cfg)
+
+    def check_same_as_full_build(name):
+        full_folder = folder.joinpath('full')
+        shutil.rmtree(full_folder, ignore_errors=True)
+        convert_test_vault(write_test_config(full_folder, entrypoint))
+        for output in ('md', 'html'):
+            case = {'name': f'Incremental build :: {output} output is the same as a full build - {name}'}
+            check_same_output(case, folder.joinpath('incremental', output), full_folder.joinpath(output))
+
+    # most of the vault is only reachable through the link to [[Note link]]
+    edit_note(vault.joinpath('entrypoint.md'), '[[Note link]]', 'no link')
+    convert_test_vault(incremental_cfg)
+    check_same_as_full_build('after unlinking most notes')
+
+    html_folder = folder.joinpath('incremental/html')
+    test({
+        'name'    : 'Incremental build :: pages and attachments that are no longer reached are removed with their folders',
+        'function': lambda: [x for x in ('note_inclusion', 'images', 'obs.html/tags/date/2022-02-12') if html_folder.joinpath(x).exists()],
+        'set'     : ([], [])
+    })
+
+    edit_note(vault.joinpath('entrypoint.md'), 'no link', '[[Note link]]')
+    convert_test_vault(incremental_cfg)
+    check_same_as_full_build('after linking them again')
+
+    # noteA includes and links to noteB, noteC links to noteB, the other notes are not affected
+    with open(vault.joinpath('note_inclusion/level1/noteB.md'), 'a', encoding='utf-8') as f:
+        f.write('\nchanged\n')
+    dirty = get_dirty_notes(incremental_cfg)
+    test({
+        'name'    : 'Incremental build :: a changed note marks itself and the notes that include or link to it dirty',
+        'function': lambda: sorted(x for x in dirty if x.startswith('note_inclusion/') or x in ('entrypoint.md', 'images.md')),
+        'set'     : ([], ['note_inclusion/level1/level2/notec.md', 'note_inclusion/level1/noteb.md', 'note_inclusion/notea.md'])
+    })
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
@@ -0,0 +1,33 @@
+import sys
+import os
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import temp_dir, write_test_config, convert_test_vault, check_same_output
+
+
+def run_tests():
+    # converting with workers should give the same output as converting serially
+    for name, extra_config in (
+        ('crawl from the entrypoint', {}),
+        ('process_all', {'toggles': {'process_all': True}}),
+    ):
+        folder = temp_dir.joinpath('parallel_build', name.replace(' ', '_'))
+        convert_test_vault(write_test_config(folder.joinpath('serial'), {**extra_config, 'workers': 1}))
+        convert_test_vault(write_test_config(folder.joinpath('parallel'), {**extra_config, 'workers': 4}))
+
+        for output in ('md', 'html'):
+            case = {'name': f'Build :: {output} output with workers: 4 is the same as a serial build - {name}'}
+            check_same_output(case, folder.joinpath('serial', output), folder.joinpath('parallel', output))
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
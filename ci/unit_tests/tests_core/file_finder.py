@@ -0,0 +1,104 @@
+import sys
+import os
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import test, \
+                                      FileFinder, ResolutionCache
+
+
+def get_matches(rel_paths, link):
+    files = {x: None for x in rel_paths}
+    return sorted(FileFinder().GetMatches(files, link))
+
+
+def get_cached_keys_after(change):
+    """Caches three results that looked up different suffixes, applies the change to a file finder, and returns the keys that are still cached"""
+    files = {'folder/note.md': None, 'other.md': None}
+    finder = FileFinder()
+    finder.update_suffix_index(files)
+    finder.caches = {'FindFile': ResolutionCache('FindFile', 10)}
+    resolution_cache = finder.caches['FindFile']
+    resolution_cache.put('note', 'folder/note.md', {'note.md'})
+    resolution_cache.put('folder/note', 'folder/note.md', {'note.md', 'folder/note.md'})
+    resolution_cache.put('other', 'other.md', {'other.md'})
+
+    change(finder, files)
+    return sorted(resolution_cache.entries.keys())
+
+
+def add_file(finder, files):
+    files['new/note.md'] = None
+    finder.update_suffix_index(files)
+
+
+def remove_file(finder, files):
+    del files['other.md']
+    finder.remove_paths(['other.md'])
+
+
+def get_matches_after_removing():
+    files = {'a/note.md': None, 'b/note.md': None}
+    finder = FileFinder()
+    finder.update_suffix_index(files)
+    del files['b/note.md']
+    finder.remove_paths(['b/note.md'])
+    return finder.GetMatches(files, 'note.md'), 'b/note.md' in finder.suffix_index
+
+
+def get_resolution_cache_after_eviction():
+    resolution_cache = ResolutionCache('test', 2)
+    resolution_cache.put('a', 1, {'a.md'})
+    resolution_cache.put('b', 2, {'b.md'})
+    resolution_cache.get('a')
+    resolution_cache.put('c', 3, {'c.md'})
+    return sorted(resolution_cache.entries.keys()), resolution_cache.evictions, sorted(resolution_cache.dependents.keys())
+
+
+def run_tests():
+    rel_paths = ['note.md', 'folder/note.md', 'folder/sub/note.md', 'other/thing.md']
+    cases = [
+        {   'name'    : 'FileFinder :: suffix index - file name matches every folder',
+            'function':  get_matches,
+            'set'     : ([rel_paths, 'note.md'], ['folder/note.md', 'folder/sub/note.md', 'note.md'])
+        },
+        {   'name'    : 'FileFinder :: suffix index - tail of the path',
+            'function':  get_matches,
+            'set'     : ([rel_paths, 'sub/note.md'], ['folder/sub/note.md'])
+        },
+        {   'name'    : 'FileFinder :: suffix index - only whole path segments match',
+            'function':  get_matches,
+            'set'     : ([rel_paths, 'ote.md'], [])
+        },
+        {   'name'    : 'FileFinder :: adding a file only invalidates the results that looked up one of its suffixes',
+            'function':  get_cached_keys_after,
+            'set'     : ([add_file], ['other'])
+        },
+        {   'name'    : 'FileFinder :: removing a file only invalidates the results that looked up one of its suffixes',
+            'function':  get_cached_keys_after,
+            'set'     : ([remove_file], ['folder/note', 'note'])
+        },
+        {   'name'    : 'FileFinder :: removing a file drops it from the suffix index',
+            'function':  get_matches_after_removing,
+            'set'     : ([], (['a/note.md'], False))
+        },
+        {   'name'    : 'ResolutionCache :: the least recently used entry is evicted, with its lookups',
+            'function':  get_resolution_cache_after_eviction,
+            'set'     : ([], (['a', 'c'], 1, ['a.md', 'c.md']))
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
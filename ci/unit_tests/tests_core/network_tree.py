@@ -0,0 +1,87 @@
+import sys
+import os
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import pb, temp_dir, write_test_config, test, \
+                                      load_vault, NetworkTree
+
+
+def new_node(network_tree, node_id, metadata=None):
+    node = network_tree.NewNode()
+    node["id"] = node_id
+    node["metadata"] = metadata or {}
+    return node
+
+
+def new_link(network_tree, source, target):
+    link = network_tree.NewLink()
+    link["source"] = source
+    link["target"] = target
+    return link
+
+
+def add_nodes_twice():
+    network_tree = NetworkTree(pb.index)
+    network_tree.add_node(new_node(network_tree, "a", {"v": 1}))
+    network_tree.add_node(new_node(network_tree, "b"))
+    network_tree.add_node(new_node(network_tree, "a", {"v": 2}))
+    return [(x["id"], x["nid"], x["metadata"]) for x in network_tree.tree["nodes"]], network_tree.node_lookup["a"] is network_tree.tree["nodes"][0]
+
+
+def add_links_twice():
+    network_tree = NetworkTree(pb.index)
+    for source, target in (("a", "b"), ("c", "b"), ("a", "b"), ("b", "a")):
+        network_tree.AddLink(new_link(network_tree, source, target))
+    links = [(x["source"], x["target"]) for x in network_tree.tree["links"]]
+    backlinks = [x["source"] for x in network_tree.get_backlinks("b")]
+    return links, backlinks, network_tree.get_backlinks("unknown")
+
+
+def project_metadata(graph_metadata_fields, metadata):
+    """Returns the metadata as it ends up in graph.json, for a vault with the given config value graph_metadata_fields"""
+    argv = sys.argv
+    sys.argv = ['obsidianhtml', 'convert', '-i', write_test_config(temp_dir.joinpath('network_tree'), {'graph_metadata_fields': graph_metadata_fields}).as_posix()]
+    try:
+        network_tree = NetworkTree(load_vault().index)
+    finally:
+        sys.argv = argv
+    return network_tree.project_metadata(metadata)
+
+
+def run_tests():
+    metadata = {'title': 'T', 'tags': ['a'], 'obs.html': {'disable_dir_nav': True}, 'other': 1}
+
+    cases = [
+        {   'name'    : 'NetworkTree :: a node that is added again keeps its nid and gets the new metadata',
+            'function':  add_nodes_twice,
+            'set'     : ([], ([("a", 1, {"v": 2}), ("b", 2, {})], True))
+        },
+        {   'name'    : 'NetworkTree :: a link that is added again is skipped, backlinks keep the order in which they were added',
+            'function':  add_links_twice,
+            'set'     : ([], ([("a", "b"), ("c", "b"), ("b", "a")], ["a", "c"], []))
+        },
+        {   'name'    : 'NetworkTree :: graph_metadata_fields - the tags and the obs.html settings are always kept',
+            'function':  project_metadata,
+            'set'     : ([['title'], metadata], {'title': 'T', 'tags': ['a'], 'obs.html': {'disable_dir_nav': True}})
+        },
+        {   'name'    : 'NetworkTree :: graph_metadata_fields - * keeps all metadata',
+            'function':  project_metadata,
+            'set'     : ([['*'], metadata], metadata)
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
@@ -0,0 +1,72 @@
+import sys
+import os
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import pb, test, \
+                                      CompiledTemplate, CompileTemplate, PopulateTemplate, compile_navbar_links
+
+
+def render(template, slots):
+    """Compiles a template in which every {name} is a slot, and renders it"""
+    for name in ('node_id', 'title', 'content'):
+        template = template.replace('{' + name + '}', CompiledTemplate.slot(name))
+    return CompiledTemplate(template).render(slots)
+
+
+def compile_twice():
+    template = '<div>{content}</div>'
+    first = CompileTemplate(pb, '', template, html_url_prefix='/a')
+    return first is CompileTemplate(pb, '', template, html_url_prefix='/a'), first is CompileTemplate(pb, '', template, html_url_prefix='/b')
+
+
+def run_tests():
+    # the navbar links are part of every compiled template, they are normally compiled at the start of the html step
+    compile_navbar_links(pb)
+    template = '<title>{title}</title><div id="{node_id}" data-pinned="{pinnedNode}">{content}</div>|{page_depth}|{node_name}|{html_url_prefix}'
+
+    cases = [
+        {   'name'    : 'CompiledTemplate :: render - slots are filled in, also when used more than once',
+            'function':  render,
+            'set'     : (['<p>{node_id}</p><p>{title}</p><p>{node_id}</p>', {'node_id': 'n1', 'title': 'T'}], '<p>n1</p><p>T</p><p>n1</p>')
+        },
+        {   'name'    : 'CompiledTemplate :: render - missing slots are left as {name}',
+            'function':  render,
+            'set'     : (['<p>{title}</p>{content}', {'title': 'T'}], '<p>T</p>{content}')
+        },
+        {   'name'    : 'CompiledTemplate :: render - placeholders in the slot values are not filled in',
+            'function':  render,
+            'set'     : (['{title}{content}', {'title': '{content}', 'content': '{title}'}], '{content}{title}')
+        },
+        {   'name'    : 'CompiledTemplate :: render - a template without slots is returned as is',
+            'function':  render,
+            'set'     : (['<p>{other}</p>', {'title': 'T'}], '<p>{other}</p>')
+        },
+        {   'name'    : 'CompiledTemplate :: CompileTemplate - templates are compiled once per html url prefix',
+            'function':  compile_twice,
+            'set'     : ([], (True, False))
+        },
+        {   'name'    : 'CompiledTemplate :: PopulateTemplate - the page is filled in, the content is inserted literally',
+            'function':  lambda: PopulateTemplate(pb, 'n1', '', template, 'x {title} {node_id}', html_url_prefix='/p', title='T', page_depth=2),
+            'set'     : ([], '<title>T</title><div id="n1" data-pinned="n1">x {title} {node_id}</div>|2|{node_name}|/p')
+        },
+        {   'name'    : 'CompiledTemplate :: PopulateTemplate - the site name is the default title, node_name is filled in when given',
+            'function':  lambda: PopulateTemplate(pb, 'n1', '', '{title}|{node_name}', '', html_url_prefix='/p', node_name='note'),
+            'set'     : ([], f"{pb.gc('site_name')}|note")
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
@@ -0,0 +1,73 @@
+import sys
+import os
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import test, \
+                                      tag_links, fill_slots, find_queries
+
+
+def run_tests():
+    cases = [
+        {   'name'    : 'Rewriter :: tag_links - anchor link',
+            'function':  tag_links,
+            'set'     : (['<a href="#header">x</a>', '/prefix'], '<a href="#header" class="anchor-link">x</a>')
+        },
+        {   'name'    : 'Rewriter :: tag_links - external link',
+            'function':  tag_links,
+            'set'     : (['<a href="https://example.com">x</a>', '/prefix'], '<a href="https://example.com" class="external-link">x</a>')
+        },
+        {   'name'    : 'Rewriter :: tag_links - external link with external_blank',
+            'function':  tag_links,
+            'set'     : (['<a href="https://example.com">x</a>', '/prefix', True], '<a href="https://example.com" target="_blank" class="external-link">x</a>')
+        },
+        {   'name'    : 'Rewriter :: tag_links - internal link to a file that is not a page',
+            'function':  tag_links,
+            'set'     : (['<a href="/prefix/image.png">x</a>', '/prefix'], '<a href="/prefix/image.png" class="external-link">x</a>')
+        },
+        {   'name'    : 'Rewriter :: tag_links - internal link to a page is left alone',
+            'function':  tag_links,
+            'set'     : (['<a href="/prefix/note.html">x</a>', '/prefix'], '<a href="/prefix/note.html">x</a>')
+        },
+        {   'name'    : 'Rewriter :: tag_links - link to a note that was not created, every occurrence once',
+            'function':  tag_links,
+            'set'     : (['<a href="/prefix/not_created.html">a</a><a href="/prefix/not_created.html">b</a>', '/prefix'],
+                         '<a href="/prefix/not_created.html" class="nonexistent-link">a</a><a href="/prefix/not_created.html" class="nonexistent-link">b</a>')
+        },
+        {   'name'    : 'Rewriter :: fill_slots - known slots are filled, unknown slots are left alone',
+            'function':  fill_slots,
+            'set'     : (['<p>{left_pane}|{unknown}|{right_pane}</p>', {'left_pane': 'L', 'right_pane': 'R'}], '<p>L|{unknown}|R</p>')
+        },
+        {   'name'    : 'Rewriter :: fill_slots - snippets are inserted literally',
+            'function':  fill_slots,
+            'set'     : (['{_obsidian_html_backlinks_pattern_}', {'_obsidian_html_backlinks_pattern_': r'a\1b {left_pane}'}], r'a\1b {left_pane}')
+        },
+        {   'name'    : 'Rewriter :: fill_slots - inline tags',
+            'function':  fill_slots,
+            'set'     : (['<code>{_obsidian_pattern_tag_a/b}</code> <code>{_obsidian_pattern_tag_c}</code>', {}, {'a/b': '<a>a/b</a>'}],
+                         '<a>a/b</a> <code>{_obsidian_pattern_tag_c}</code>')
+        },
+        {   'name'    : 'Rewriter :: fill_slots - embedded search queries are only filled when query is given',
+            'function':  lambda html: (fill_slots(html, {}), fill_slots(html, {}, query=lambda listing: f'[{listing}]')),
+            'set'     : (['<p>{_obsidian_html_query:list|-|cat }</p>'], ('<p>{_obsidian_html_query:list|-|cat }</p>', '[list|-|cat]'))
+        },
+        {   'name'    : 'Rewriter :: find_queries - listings in the same form as fill_slots passes them',
+            'function':  find_queries,
+            'set'     : (['<p>{_obsidian_html_query:list|-|cat }</p><p>{_obsidian_html_query:full|-|dog }</p>'], ['list|-|cat', 'full|-|dog'])
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
@@ -0,0 +1,137 @@
+import sys
+import os
+import gzip
+import json
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import pb, temp_dir, write_test_config, convert_test_vault, test, \
+                                      SearchHead, ContentCompactor, get_query_stopwords
+
+
+def get_compaction_config(**settings):
+    """Returns a gc function that only knows the compaction settings"""
+    config = {
+        "enabled": True,
+        "content_max_bytes": 0,
+        "remove_duplicate_tokens": False,
+        "remove_stopwords": True,
+        "stopwords": ["The", "a"],
+        **settings,
+    }
+    return lambda path, cached=False: config[path.split("/")[-1]]
+
+
+def compact(content, max_bytes=0, stopwords=None, remove_duplicates=False):
+    return ContentCompactor(max_bytes, stopwords, remove_duplicates).compact(content)
+
+
+def output_json():
+    search = SearchHead()
+    search.add_entry({"title": "The Title", "content": "The cat, the dog."})
+    return [(doc["title"], doc["content"]) for doc in json.loads(search.OutputJson(ContentCompactor(stopwords=["the"])))]
+
+
+def write_snippets(count):
+    search = SearchHead()
+    for i in range(count):
+        search.add_entry({"title": str(i), "content": f"content {i}"})
+
+    folder = temp_dir.joinpath("content_compactor", str(count))
+    search.WriteSnippets(folder)
+    buckets = []
+    for path in sorted(folder.joinpath("snippets").iterdir(), key=lambda x: int(x.stem)):
+        with open(path, "r", encoding="utf-8") as f:
+            buckets.append(len(json.load(f)))
+    return buckets
+
+
+def build_with_compaction():
+    """Returns whether search.json.gzip keeps the full content, whether the compacted search data holds the compacted content,
+    and whether search.js loads the compacted search data
+    """
+    folder = temp_dir.joinpath("content_compactor", "build")
+    convert_test_vault(write_test_config(folder, {"toggles": {"features": {"search": {"compaction": {"enabled": True}}}}}))
+
+    data_folder = folder.joinpath("html/obs.html/data")
+    with gzip.open(data_folder.joinpath("search.json.gzip"), "rt", encoding="utf-8") as f:
+        full = json.load(f)
+    with gzip.open(data_folder.joinpath("search.compact.json.gzip"), "rt", encoding="utf-8") as f:
+        compacted = json.load(f)
+
+    compactor = ContentCompactor.from_config(get_compaction_config(stopwords=pb.gc("toggles/features/search/compaction/stopwords"), remove_duplicate_tokens=True))
+    with open(folder.joinpath("html/obs.html/static/search.js"), "r", encoding="utf-8") as f:
+        search_js = f.read()
+    return (
+        any(compactor.compact(doc["content"]) != doc["content"] for doc in full),
+        [compactor.compact(doc["content"]) for doc in full] == [doc["content"] for doc in compacted],
+        "'search.compact.json.gzip'" in search_js,
+    )
+
+
+def run_tests():
+    cases = [
+        {   'name'    : 'ContentCompactor :: stopwords are left out, regardless of case',
+            'function':  compact,
+            'set'     : (['The cat and THE dog', 0, ['the']], 'cat and dog')
+        },
+        {   'name'    : 'ContentCompactor :: duplicates are removed, the first occurrence is kept',
+            'function':  compact,
+            'set'     : (['b a b c a', 0, None, True], 'b a c')
+        },
+        {   'name'    : 'ContentCompactor :: max_bytes cuts off at the last whole word that fits',
+            'function':  compact,
+            'set'     : (['abc def ghi', 9], 'abc def')
+        },
+        {   'name'    : 'ContentCompactor :: max_bytes counts bytes, not characters',
+            'function':  compact,
+            'set'     : (['über über', 9], 'über')
+        },
+        {   'name'    : 'ContentCompactor :: max_bytes keeps everything when it fits exactly',
+            'function':  compact,
+            'set'     : (['abc def', 7], 'abc def')
+        },
+        {   'name'    : 'ContentCompactor :: OutputJson only compacts the content',
+            'function':  output_json,
+            'set'     : ([], [('The Title', 'cat dog')])
+        },
+        {   'name'    : 'ContentCompactor :: from_config returns None when compaction is disabled',
+            'function':  lambda: ContentCompactor.from_config(get_compaction_config(enabled=False)),
+            'set'     : ([], None)
+        },
+        {   'name'    : 'ContentCompactor :: get_query_stopwords - the configured stopwords, lowercased and sorted',
+            'function':  get_query_stopwords,
+            'set'     : ([get_compaction_config()], ['a', 'the'])
+        },
+        {   'name'    : 'ContentCompactor :: get_query_stopwords - no stopwords when they are not removed from the content',
+            'function':  lambda: (get_query_stopwords(get_compaction_config(remove_stopwords=False)), get_query_stopwords(get_compaction_config(enabled=False))),
+            'set'     : ([], ([], []))
+        },
+        {   'name'    : 'ContentCompactor :: get_query_stopwords - compaction is disabled in the default config',
+            'function':  get_query_stopwords,
+            'set'     : ([pb.gc], [])
+        },
+        {   'name'    : 'ContentCompactor :: WriteSnippets - entries are split into buckets of SNIPPET_BUCKET_SIZE',
+            'function':  lambda: (write_snippets(1), write_snippets(250)),
+            'set'     : ([], ([1], [100, 100, 50]))
+        },
+        {   'name'    : 'ContentCompactor :: build - search.json.gzip keeps the full content, search.js loads the compacted search data',
+            'function':  build_with_compaction,
+            'set'     : ([], (True, True, True))
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
@@ -0,0 +1,76 @@
+import sys
+import os
+import json
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import temp_dir, test, \
+                                      SearchHead, ContentCompactor, tokenize
+
+
+def write_index_shards(compactor=None):
+    """Writes the prebuilt index of three documents, returns the folder"""
+    search = SearchHead()
+    for title, content in (("Cats", "the cat sat on the car"), ("Cars", "car car cat"), ("Über", "über a b")):
+        search.add_entry({"title": title, "url": f"/{title}.html", "rtr_url": f"{title}.html", "content": content})
+
+    folder = temp_dir.joinpath("search_index", "compacted" if compactor is not None else "plain")
+    search.WriteIndexShards(folder, 2, compactor)
+    return folder
+
+
+def read_shard(folder, prefix):
+    path = folder.joinpath("terms", prefix.encode("utf-8").hex() + ".json")
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_tests():
+    folder = write_index_shards()
+    compacted_folder = write_index_shards(ContentCompactor(stopwords=["the", "on"]))
+    with open(folder.joinpath("index.json"), "r", encoding="utf-8") as f:
+        index = json.load(f)
+
+    cases = [
+        {   'name'    : 'Search :: tokenize - lowercase, split on punctuation, symbols and whitespace',
+            'function':  tokenize,
+            'set'     : (['Hello, World! a+b  über-cool'], ['hello', 'world', 'a', 'b', 'über', 'cool'])
+        },
+        {   'name'    : 'Search :: WriteIndexShards - terms are grouped by prefix, documents ordered by number of occurrences per field',
+            'function':  read_shard,
+            'set'     : ([folder, 'ca'], {'cat': [[], [0, 1]], 'cats': [[0], []], 'car': [[], [1, 0]], 'cars': [[1], []]})
+        },
+        {   'name'    : 'Search :: WriteIndexShards - terms shorter than the prefix length are stored under the term itself',
+            'function':  read_shard,
+            'set'     : ([folder, 'a'], {'a': [[], [2]]})
+        },
+        {   'name'    : 'Search :: WriteIndexShards - prefixes are split on characters, not bytes',
+            'function':  lambda: sorted(read_shard(folder, 'üb').keys()),
+            'set'     : ([], ['über'])
+        },
+        {   'name'    : 'Search :: WriteIndexShards - index.json lists the documents in order',
+            'function':  lambda: (index['prefix_length'], [doc['title'] for doc in index['docs']]),
+            'set'     : ([], (2, ['Cats', 'Cars', 'Über']))
+        },
+        {   'name'    : 'Search :: WriteIndexShards - the compactor only applies to the content',
+            'function':  lambda: (read_shard(folder, 'th'), read_shard(compacted_folder, 'th'), read_shard(compacted_folder, 'ca') == read_shard(folder, 'ca')),
+            'set'     : ([], ({'the': [[], [0]]}, None, True))
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
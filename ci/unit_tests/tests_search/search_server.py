@@ -0,0 +1,120 @@
+import sys
+import os
+import json
+import time
+import socket
+import threading
+import http.client
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import temp_dir, test, \
+                                      EmbeddedSearch, ServeEmbeddedSearch
+
+
+class TestSearchService:
+    """Serves a fixed index in the temp dir, instead of an index in the appdir like SearchService"""
+
+    def __init__(self, search_data):
+        self.esearch = EmbeddedSearch(temp_dir.joinpath("search_server", "index"), json_data=json.dumps(search_data))
+
+    def get_search(self):
+        return self.esearch
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path):
+        super().__init__("localhost")
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.socket_path)
+
+
+def start_server():
+    search_data = [
+        {"path": "cats.html", "file": "cats.md", "title": "Cats", "content": "the cat sat on the mat", "tags": ""},
+        {"path": "dogs.html", "file": "dogs.md", "title": "Dogs", "content": "the dog barked", "tags": ""},
+    ]
+    socket_path = temp_dir.joinpath("search_server", "search.sock").as_posix()
+    service = TestSearchService(search_data)
+    threading.Thread(target=ServeEmbeddedSearch, args=(service,), kwargs={"socket_path": socket_path}, daemon=True).start()
+
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.05)
+    return UnixHTTPConnection(socket_path)
+
+
+def run_tests():
+    # all requests go over the same connection, so a rejected request should not leave its body behind on the connection
+    connection = start_server()
+
+    def request(method, url, body=None):
+        connection.request(method, url, body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            return response.status, sorted(data.keys())
+        return response.status, {query: [x["title"] for x in results] for query, results in data["results"].items()}
+
+    def post(body):
+        return request("POST", "/search", json.dumps(body) if not isinstance(body, str) else body)
+
+    cases = [
+        {   'name'    : 'Search server :: POST - queries are answered together',
+            'function':  post,
+            'set'     : ([{'queries': ['cat', 'dog']}], (200, {'cat': ['Cats'], 'dog': ['Dogs']}))
+        },
+        {   'name'    : 'Search server :: POST - body that is not json',
+            'function':  post,
+            'set'     : (['{"queries": ['], (400, ['error']))
+        },
+        {   'name'    : 'Search server :: POST - body without queries',
+            'function':  post,
+            'set'     : ([{'query': 'cat'}], (400, ['error']))
+        },
+        {   'name'    : 'Search server :: POST - queries that are not a list',
+            'function':  post,
+            'set'     : ([{'queries': 'cat'}], (400, ['error']))
+        },
+        {   'name'    : 'Search server :: POST - queries that are not strings',
+            'function':  post,
+            'set'     : ([{'queries': ['cat', 1]}], (400, ['error']))
+        },
+        {   'name'    : 'Search server :: POST - empty list of queries',
+            'function':  post,
+            'set'     : ([{'queries': []}], (400, ['error']))
+        },
+        {   'name'    : 'Search server :: GET - every q is a query',
+            'function':  request,
+            'set'     : (['GET', '/search?q=cat&q=dog'], (200, {'cat': ['Cats'], 'dog': ['Dogs']}))
+        },
+        {   'name'    : 'Search server :: unknown path',
+            'function':  request,
+            'set'     : (['POST', '/other', '{"queries": ["cat"]}'], (404, ['error']))
+        },
+        {   'name'    : 'Search server :: the connection can still be used after a rejected request',
+            'function':  post,
+            'set'     : ([{'queries': ['mat']}], (200, {'mat': ['Cats']}))
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+    connection.close()
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
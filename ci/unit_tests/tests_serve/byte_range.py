@@ -0,0 +1,109 @@
+import sys
+import os
+import http.client
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import temp_dir, serve_test_folder, test, \
+                                      FileCache, parse_range
+
+
+def get_range(port, byte_range, if_range=None, url='/video.bin'):
+    headers = {'Range': byte_range}
+    if if_range is not None:
+        headers['If-Range'] = if_range
+    connection = http.client.HTTPConnection('localhost', port, timeout=5)
+    connection.request('GET', url, headers=headers)
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response.status, response.getheader('Content-Range'), body
+
+
+def run_tests():
+    folder = temp_dir.joinpath('byte_range')
+    folder.mkdir(parents=True)
+    folder.joinpath('video.bin').write_bytes(b'0123456789')
+    folder.joinpath('empty.bin').write_bytes(b'')
+
+    # files that are cached are sent from memory, other files with sendfile
+    cached_port = serve_test_folder(folder, file_cache=FileCache(1024))
+    uncached_port = serve_test_folder(folder)
+
+    cases = [
+        {   'name'    : 'parse_range :: first and last byte',
+            'function':  parse_range,
+            'set'     : (['bytes=2-5', 10], (2, 5))
+        },
+        {   'name'    : 'parse_range :: open ended',
+            'function':  parse_range,
+            'set'     : (['bytes=7-', 10], (7, 9))
+        },
+        {   'name'    : 'parse_range :: last byte past the end of the file',
+            'function':  parse_range,
+            'set'     : (['bytes=7-20', 10], (7, 9))
+        },
+        {   'name'    : 'parse_range :: suffix range',
+            'function':  parse_range,
+            'set'     : (['bytes=-3', 10], (7, 9))
+        },
+        {   'name'    : 'parse_range :: suffix range larger than the file',
+            'function':  parse_range,
+            'set'     : (['bytes=-30', 10], (0, 9))
+        },
+        {   'name'    : 'parse_range :: past the end of the file',
+            'function':  parse_range,
+            'set'     : (['bytes=10-', 10], False)
+        },
+        {   'name'    : 'parse_range :: empty suffix range',
+            'function':  parse_range,
+            'set'     : (['bytes=-0', 10], False)
+        },
+        {   'name'    : 'parse_range :: suffix range of an empty file',
+            'function':  parse_range,
+            'set'     : (['bytes=-5', 0], False)
+        },
+        {   'name'    : 'parse_range :: ignored headers',
+            'function':  lambda: [parse_range(header, 10) for header in ('items=0-5', 'bytes=0-1,4-5', 'bytes=5-2', 'bytes=-', 'bytes=a-5', 'bytes=5')],
+            'set'     : ([], [None, None, None, None, None, None])
+        },
+        {   'name'    : 'Serve :: a range is sent from the cache',
+            'function':  get_range,
+            'set'     : ([cached_port, 'bytes=2-5'], (206, 'bytes 2-5/10', b'2345'))
+        },
+        {   'name'    : 'Serve :: a range is sent from disk',
+            'function':  get_range,
+            'set'     : ([uncached_port, 'bytes=-3'], (206, 'bytes 7-9/10', b'789'))
+        },
+        {   'name'    : 'Serve :: a range past the end of the file is not satisfiable',
+            'function':  get_range,
+            'set'     : ([uncached_port, 'bytes=20-'], (416, 'bytes */10', b''))
+        },
+        {   'name'    : 'Serve :: a suffix range of an empty file is not satisfiable',
+            'function':  get_range,
+            'set'     : ([uncached_port, 'bytes=-5', None, '/empty.bin'], (416, 'bytes */0', b''))
+        },
+        {   'name'    : 'Serve :: an ignored range header gets the whole file',
+            'function':  get_range,
+            'set'     : ([cached_port, 'bytes=0-1,4-5'], (200, None, b'0123456789'))
+        },
+        {   'name'    : 'Serve :: the whole file is sent when If-Range does not match',
+            'function':  get_range,
+            'set'     : ([cached_port, 'bytes=2-5', '"outdated"'], (200, None, b'0123456789'))
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
@@ -0,0 +1,132 @@
+import sys
+import os
+import gzip
+import http.client
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import temp_dir, serve_test_folder, test, \
+                                      FileCache, accepts_gzip
+
+
+def get_cached_after_eviction():
+    file_cache = FileCache(10)
+    file_cache.put('a', 1, b'aaaa')
+    file_cache.put('b', 1, b'bbbb')
+    file_cache.get('a', 1)
+    file_cache.put('c', 1, b'cccc')
+    return list(file_cache.entries.keys()), file_cache.size
+
+
+def get_after_change():
+    file_cache = FileCache(10)
+    file_cache.put('a', (1, 4), b'aaaa')
+    return file_cache.get('a', (1, 4)), file_cache.get('a', (2, 4))
+
+
+def get_size_after_replacing():
+    file_cache = FileCache(10)
+    file_cache.put('a', 1, b'aaaa')
+    file_cache.put('a', 2, b'aa')
+    file_cache.put('b', 1, b'b' * 11)
+    return list(file_cache.entries.keys()), file_cache.size
+
+
+def request(port, url, headers=None):
+    connection = http.client.HTTPConnection('localhost', port, timeout=5)
+    connection.request('GET', url, headers=headers or {})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    if response.getheader('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    return response, body
+
+
+def get_gzipped(port, accept_encoding):
+    response, body = request(port, '/note.html', {'Accept-Encoding': accept_encoding})
+    return response.status, response.getheader('Content-Encoding'), response.getheader('Vary'), body
+
+
+def revalidate(port, folder):
+    """Returns the statuses of a request with the ETag, the ETag after the file changed, and a request with Last-Modified"""
+    response, _ = request(port, '/other.html')
+    etag = response.getheader('ETag')
+    last_modified = response.getheader('Last-Modified')
+    statuses = [request(port, '/other.html', {'If-None-Match': etag})[0].status]
+
+    path = folder.joinpath('other.html')
+    path.write_bytes(b'<p>other, changed</p>')
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 5 * 10**9))
+    response, body = request(port, '/other.html', {'If-None-Match': etag})
+    statuses += [response.status, body, response.getheader('ETag') != etag]
+
+    statuses.append(request(port, '/other.html', {'If-Modified-Since': last_modified})[0].status)
+    return statuses
+
+
+def run_tests():
+    folder = temp_dir.joinpath('file_cache')
+    folder.mkdir(parents=True)
+    folder.joinpath('note.html').write_bytes(b'<p>note</p>')
+    folder.joinpath('note.html.gz').write_bytes(gzip.compress(b'<p>note</p>'))
+    folder.joinpath('other.html').write_bytes(b'<p>other</p>')
+    port = serve_test_folder(folder, file_cache=FileCache(1024))
+
+    cases = [
+        {   'name'    : 'accepts_gzip :: gzip among other encodings',
+            'function':  accepts_gzip,
+            'set'     : (['br, GZIP;q=0.8, deflate'], True)
+        },
+        {   'name'    : 'accepts_gzip :: any encoding',
+            'function':  accepts_gzip,
+            'set'     : (['*'], True)
+        },
+        {   'name'    : 'accepts_gzip :: gzip excluded with q=0',
+            'function':  accepts_gzip,
+            'set'     : (['gzip;q=0, br'], False)
+        },
+        {   'name'    : 'accepts_gzip :: no gzip',
+            'function':  accepts_gzip,
+            'set'     : (['br, deflate'], False)
+        },
+        {   'name'    : 'FileCache :: the least recently used files are evicted when the cache is full',
+            'function':  get_cached_after_eviction,
+            'set'     : ([], (['a', 'c'], 8))
+        },
+        {   'name'    : 'FileCache :: a file is only returned while it has the same stat',
+            'function':  get_after_change,
+            'set'     : ([], (b'aaaa', None))
+        },
+        {   'name'    : 'FileCache :: replaced files are counted once, files larger than the cache are not cached',
+            'function':  get_size_after_replacing,
+            'set'     : ([], (['a'], 2))
+        },
+        {   'name'    : 'Serve :: the gzipped copy is sent when the client accepts it',
+            'function':  get_gzipped,
+            'set'     : ([port, 'gzip'], (200, 'gzip', 'Accept-Encoding', b'<p>note</p>'))
+        },
+        {   'name'    : 'Serve :: the file itself is sent when the client does not accept gzip',
+            'function':  get_gzipped,
+            'set'     : ([port, 'gzip;q=0'], (200, None, 'Accept-Encoding', b'<p>note</p>'))
+        },
+        {   'name'    : 'Serve :: copies are revalidated with ETag and Last-Modified, a changed file is sent again',
+            'function':  revalidate,
+            'set'     : ([port, folder], [304, 200, b'<p>other, changed</p>', True, 200])
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
@@ -0,0 +1,100 @@
+import sys
+import os
+import time
+import http.client
+from pathlib import Path
+
+# add /obsidian-html/ci to path
+sys.path.insert(1, str(Path(os.path.realpath(__file__)).parent.parent.parent))
+
+# import pb and tests
+from unit_tests.unit_test_init import temp_dir, serve_test_folder, test
+
+
+def get(connection, url='/note.html'):
+    connection.request('GET', url)
+    response = connection.getresponse()
+    return response.status, response.read()
+
+
+def requests_on_one_connection(port):
+    """Returns the responses of three requests, and whether they were all sent over the same socket"""
+    connection = http.client.HTTPConnection('localhost', port, timeout=5)
+    responses = [get(connection)]
+    sock = connection.sock
+    responses += [get(connection), get(connection, '/other.html')]
+    same_socket = connection.sock is sock
+    connection.close()
+    return responses, same_socket
+
+
+def idle_connections(port):
+    """Opens a connection per worker without closing the previous ones, returns whether they were all served within a second"""
+    connections = [http.client.HTTPConnection('localhost', port, timeout=5) for _ in range(3)]
+    start = time.time()
+    statuses = [get(connection)[0] for connection in connections]
+    in_time = time.time() - start < 1
+    for connection in connections:
+        connection.close()
+    return statuses, in_time
+
+
+def idle_connection_is_closed(port):
+    """Returns whether the server closed an idle connection, and whether the freed worker serves the next connection"""
+    idle = http.client.HTTPConnection('localhost', port, timeout=5)
+    get(idle)
+    time.sleep(1)
+    closed = idle.sock.recv(1) == b''
+    idle.close()
+
+    connection = http.client.HTTPConnection('localhost', port, timeout=5)
+    status = get(connection)[0]
+    connection.close()
+    return closed, status
+
+
+def without_keep_alive(port):
+    connection = http.client.HTTPConnection('localhost', port, timeout=5)
+    connection.request('GET', '/note.html')
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    return response.version, response.will_close
+
+
+def run_tests():
+    folder = temp_dir.joinpath('pooled_server')
+    folder.mkdir(parents=True)
+    folder.joinpath('note.html').write_bytes(b'<p>note</p>')
+    folder.joinpath('other.html').write_bytes(b'<p>other</p>')
+
+    cases = [
+        {   'name'    : 'PooledHTTPServer :: keep-alive - requests reuse the connection',
+            'function':  requests_on_one_connection,
+            'set'     : ([serve_test_folder(folder)], ([(200, b'<p>note</p>'), (200, b'<p>note</p>'), (200, b'<p>other</p>')], True))
+        },
+        {   'name'    : 'PooledHTTPServer :: keep-alive - connections that are kept open do not wait for each other while workers are free',
+            'function':  idle_connections,
+            'set'     : ([serve_test_folder(folder, workers=3)], ([200, 200, 200], True))
+        },
+        {   'name'    : 'PooledHTTPServer :: keep-alive - idle connections are closed after the timeout, which frees the worker',
+            'function':  idle_connection_is_closed,
+            'set'     : ([serve_test_folder(folder, workers=1, keep_alive=0.3)], (True, 200))
+        },
+        {   'name'    : 'PooledHTTPServer :: keep-alive 0 - connections are closed after every request',
+            'function':  without_keep_alive,
+            'set'     : ([serve_test_folder(folder, keep_alive=0)], (10, True))
+        },
+    ]
+
+    for case in cases:
+        test(case)
+
+
+if __name__ == "__main__":
+    os.environ["TESTS_FAILED"] = "0"
+
+    run_tests()
+
+    if (os.environ["TESTS_FAILED"] == '1'):
+        sys.exit(1)
@@ -1,5 +1,12 @@
 import sys
 import os
+import gzip
+import yaml
+import shutil
+import atexit
+import tempfile
+import threading
+import subprocess
 from pathlib import Path
 from termcolor import colored
 
@@ -13,17 +20,34 @@ paths = get_paths()
 # add /obsidian-html to path
 sys.path.insert(1, str(paths['root']))
 
-# build picknickbasket
-from obsidianhtml.core.PicknickBasket import PicknickBasket
-pb = PicknickBasket()
-
-# create input dict so that we can set the entrypoint dynamically
-input_cfg = {}
-input_cfg['obsidian_entrypoint_path_str'] = paths['test_entrypoint'].resolve().as_posix()
-pb.user_config_dict = input_cfg
+# write a config that converts the test vault to a temporary folder
+def write_test_config(folder, extra_config=None):
+    folder = Path(folder)
+    cfg = {
+        'obsidian_entrypoint_path_str': paths['test_entrypoint'].resolve().as_posix(),
+        'md_folder_path_str': folder.joinpath('md').as_posix(),
+        'md_entrypoint_path_str': folder.joinpath('md/index.md').as_posix(),
+        'html_output_folder_path_str': folder.joinpath('html').as_posix(),
+        'module_data_folder': folder.joinpath('mod').as_posix(),
+        'verbosity': 'error',
+    }
+    if extra_config is not None:
+        cfg.update(extra_config)
+    folder.mkdir(parents=True, exist_ok=True)
+    cfg_path = folder.joinpath('config.yml')
+    with open(cfg_path, 'w', encoding='utf-8') as f:
+        yaml.dump(cfg, f)
+    return cfg_path
+
+temp_dir = Path(tempfile.mkdtemp(prefix='obshtml_unit_tests_'))
+atexit.register(shutil.rmtree, temp_dir, ignore_errors=True)
 
-# finish creation of picknickbasket
-pb.construct('')
+# build picknickbasket
+from obsidianhtml.controller.ConvertVault import load_vault
+argv = sys.argv
+sys.argv = ['obsidianhtml', 'convert', '-i', write_test_config(temp_dir.joinpath('pb')).as_posix()]
+pb = load_vault()
+sys.argv = argv
 
 # set color output
 is_windows = hasattr(sys, 'getwindowsversion')
@@ -36,6 +60,15 @@ from obsidianhtml import md2html
 from obsidianhtml.parser.MarkdownPage import get_inline_tags
 from obsidianhtml.markdown_extensions.FootnoteExtension import convert_codeblocks
 from obsidianhtml.features.post_processing import obs_callout_to_markdown_callout
+from obsidianhtml.controller.BuildManifest import BuildManifest
+from obsidianhtml.compiler.Rewriter import tag_links, fill_slots, find_queries
+from obsidianhtml.compiler.Templating import CompiledTemplate, CompileTemplate, PopulateTemplate
+from obsidianhtml.compiler.HTML import compile_navbar_links
+from obsidianhtml.core.FileFinder import FileFinder, ResolutionCache
+from obsidianhtml.core.NetworkTree import NetworkTree
+from obsidianhtml.features.Search import SearchHead, ContentCompactor, tokenize, get_query_stopwords
+from obsidianhtml.features.EmbeddedSearch import EmbeddedSearch, ServeEmbeddedSearch
+from obsidianhtml.controller.Serve import PooledHTTPServer, FileCache, get_handler_class, accepts_gzip, parse_range
 
 
 def check_test_result(case, output):
@@ -66,6 +99,49 @@ def test(case):
     else:
         print_succes(case)
 
+def convert_test_vault(cfg_path):
+    """Converts the vault in a separate process, the same way as `obsidianhtml convert` would.
+    The hash seed is fixed, because the order of the tags of a note depends on it (see parse_metadata)."""
+    env = dict(os.environ, PYTHONHASHSEED='0')
+    result = subprocess.run([sys.executable, '-m', 'obsidianhtml', 'convert', '-i', Path(cfg_path).as_posix()], cwd=paths['root'], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"Converting the test vault failed:\n{result.stdout}\n{result.stderr}")
+
+def serve_test_folder(folder, workers=2, keep_alive=5.0, file_cache=None):
+    """Serves folder on a free local port in the background, the same way as `obsidianhtml serve` would. Returns the port."""
+    server = PooledHTTPServer(('localhost', 0), get_handler_class(folder, keep_alive=keep_alive, file_cache=file_cache), workers)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    atexit.register(server.server_close)
+    atexit.register(server.shutdown)
+    return server.server_address[1]
+
+def compare_output_folders(folder_a, folder_b):
+    """Returns the relative paths of the files that differ between the two folders (gzip files are compared by their contents)."""
+    def list_files(folder):
+        return {p.relative_to(folder).as_posix() for p in Path(folder).rglob('*') if p.is_file()}
+    def read(path):
+        if path.suffix == '.gzip':
+            with gzip.open(path, 'rb') as f:
+                return f.read()
+        return path.read_bytes()
+
+    files_a = list_files(folder_a)
+    files_b = list_files(folder_b)
+    differences = sorted(files_a ^ files_b)
+    for rel_path in sorted(files_a & files_b):
+        if read(Path(folder_a).joinpath(rel_path)) != read(Path(folder_b).joinpath(rel_path)):
+            differences.append(rel_path)
+    return differences
+
+def check_same_output(case, folder_a, folder_b):
+    differences = compare_output_folders(folder_a, folder_b)
+    if len(differences) > 0:
+        print_fail(case)
+        print("    - Files that differ:\n" + '\n'.join(differences))
+        os.environ["TESTS_FAILED"] = "1"
+    else:
+        print_succes(case)
+
 def print_succes(case):
     print(colored(f"✓  {case['name']}", 'green'))
 
@@ -7,6 +7,8 @@ from .controller.ConvertVault import ConvertVault
 from .controller.Run import Run
 from .controller.Export import RunExport
 from .controller.Serve import ServeDir
+from .controller.Watch import Watch
+from .controller.DevServer import DevServer
 from .controller.Config import Config
 from .features.EmbeddedSearch import CliEmbeddedSearch
 
@@ -28,6 +30,9 @@ def main():
     # Execute command
     if main_command == "convert":
         ConvertVault()
+    elif main_command == "watch":
+        Watch()
+        exit()
     elif main_command == "config":
         Config()
     elif main_command == "export":
@@ -49,6 +54,9 @@ def main():
     elif main_command == "serve":
         ServeDir()
         exit()
+    elif main_command == "dev":
+        DevServer()
+        exit()
     elif main_command == "search":
         CliEmbeddedSearch()
         exit()
@@ -144,6 +144,8 @@ def recurseTagList(tagtree, tagpath, pb, level):
     tag_dst_path.parent.mkdir(parents=True, exist_ok=True)
     with open(tag_dst_path_posix, "w", encoding="utf-8") as f:
         f.write(html)
+    if pb.build_manifest is not None:
+        pb.build_manifest.add_system_output(tag_dst_path)
 
     # Return link of this page, to be used by caller for building its page
     return rel_dst_path_as_posix
@@ -238,3 +240,5 @@ def create_foldable_tag_lists(pb):
     # write to destination
     with open(tag_dst_path_posix, "w", encoding="utf-8") as f:
         f.write(html)
+    if pb.build_manifest is not None:
+        pb.build_manifest.add_system_output(tag_dst_path)
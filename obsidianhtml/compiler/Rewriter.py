@@ -0,0 +1,66 @@
+"""
+Rewrites of the rendered html that used to be done with one str.replace() or re.sub() per link/placeholder.
+Each function below walks the html only once, and decides per match what it should be replaced with.
+"""
+
+import regex as re
+
+LINK_PATTERN = re.compile(r'<a href="([^"]*)"(>?)')
+SLOT_PATTERN = re.compile(r"\{([A-Za-z_]+)\}|<code>\{_obsidian_pattern_tag_([^}]*)\}</code>|<p>\{_obsidian_html_query:(.*?) \}</p>")
+QUERY_PATTERN = re.compile(r"<p>\{_obsidian_html_query:(.*?) \}</p>")
+
+
+def tag_links(html, html_url_prefix, external_blank=False):
+    """Tags anchor links, external links and links to non-existent notes with a class, so they can be decorated differently."""
+    not_created = f"{html_url_prefix}/not_created.html"
+    external_blank_html = 'target="_blank" ' if external_blank else ""
+
+    def rewrite(m):
+        link, closed = m.group(1), m.group(2)
+        if link == "":
+            return m.group(0)
+
+        # anchor links
+        if link[0] == "#":
+            return f'<a href="{link}" class="anchor-link"{closed}'
+
+        # not internal or internal and not .html file
+        name = link.split("/")[-1]
+        if (link[0] not in ("/", ".")) or ("." in name and ".html" not in name):
+            return f'<a href="{link}" {external_blank_html}class="external-link"{closed}'
+
+        # not created links
+        if link == not_created and closed:
+            return f'<a href="{link}" class="nonexistent-link">'
+
+        return m.group(0)
+
+    return LINK_PATTERN.sub(rewrite, html)
+
+
+def fill_slots(html, slots, inline_tags=None, query=None):
+    """Replaces placeholders in the html in a single pass:
+
+    - {name}: replaced with slots[name], unknown names are left alone
+    - <code>{_obsidian_pattern_tag_tag}</code>: replaced with inline_tags[tag], unknown tags are left alone
+    - <p>{_obsidian_html_query:listing }</p>: replaced with query(listing), if query is given
+    """
+    if inline_tags is None:
+        inline_tags = {}
+
+    def rewrite(m):
+        name, tag, listing = m.group(1), m.group(2), m.group(3)
+        if name is not None:
+            return slots.get(name, m.group(0))
+        if tag is not None:
+            return inline_tags.get(tag, m.group(0))
+        if query is not None:
+            return query(listing)
+        return m.group(0)
+
+    return SLOT_PATTERN.sub(rewrite, html)
+
+
+def find_queries(html):
+    """Returns the listings of the embedded search queries in the html, in the same form as fill_slots() passes them to query()."""
+    return QUERY_PATTERN.findall(html)
@@ -1,5 +1,9 @@
+import json
+
 from ..lib import CreateStaticFilesFolders, OpenIncludedFile, OpenIncludedFileBinary, get_html_url_prefix
 from ..features.SidePane import get_side_pane_id_by_content_selector, get_content_name_by_pane_id
+from ..features.Search import uses_snippet_store, get_query_stopwords, get_search_data_file, SNIPPET_BUCKET_SIZE
+from .Rewriter import fill_slots
 
 
 def ExportStaticFiles(pb):
@@ -24,6 +28,7 @@ def ExportStaticFiles(pb):
         copy_file_list.append(["imported/3d-force-graph.v1.70.10.min.js", "3d-force-graph.js"])
         css_files_list.append(["graph/graph.css", "graph.css"])
         copy_file_list.append(["graph/graph.svg", "graph.svg"])
+        copy_file_list.append(["graph/graph_worker.js", "graph_worker.js"])
         # copy_file_list.append(['graph/default_grapher_2d.js', 'default_grapher_2d.js'])
         # copy_file_list.append(['graph/default_grapher_3d.js', 'default_grapher_3d.js'])
 
@@ -119,8 +124,14 @@ def ExportStaticFiles(pb):
                 .replace("{toc_pane_div}", toc_pane_div)
                 .replace("{dir_index_pane_div}", dir_index_pane_div)
                 .replace("{gzip_hash}", pb.gzip_hash)
+                .replace("{live_reload}", str(int(pb.gc("toggles/features/live_reload/enabled"))))
                 .replace("{url_mode}", url_mode)
                 .replace("{try_preload}", str(int(pb.gc("toggles/features/search/try_preload"))))
+                .replace("{prebuilt_index}", str(int(pb.gc("toggles/features/search/prebuilt_index/enabled"))))
+                .replace("{snippet_store}", str(int(uses_snippet_store(pb.gc))))
+                .replace("{snippet_bucket_size}", str(SNIPPET_BUCKET_SIZE))
+                .replace("{search_stopwords}", json.dumps(get_query_stopwords(pb.gc)))
+                .replace("{search_data_file}", get_search_data_file(pb.gc))
             )
             contents = (
                 contents.replace("__accent_color__", pb.gc("toggles/features/styling/accent_color", cached=True))
@@ -185,6 +196,11 @@ def ExportStaticFiles(pb):
             dynamic_imports += 'const URL_MODE = "relative";\n'
         else:
             dynamic_imports += 'const URL_MODE = "absolute";\n'
+        dynamic_imports += f'const GRAPH_DATA_SHARDED = {str(bool(pb.gc("toggles/features/graph/sharded_data", cached=True))).lower()};\n'
+        layout_dimensions = pb.gc("toggles/features/graph/precompute_layout/dimensions", cached=True) if pb.gc("toggles/features/graph/precompute_layout/enabled", cached=True) else 0
+        dynamic_imports += f"const GRAPH_LAYOUT_DIMENSIONS = {layout_dimensions};\n"
+        dynamic_imports += f'const GRAPH_LEVEL_OF_DETAIL = {json.dumps(pb.gc("toggles/features/graph/level_of_detail", cached=True))};\n'
+        dynamic_imports += f'const GRAPH_SIMULATION_IN_WORKER = {str(bool(pb.gc("toggles/features/graph/simulation_in_worker", cached=True))).lower()};\n'
         dynamic_imports += "\n"
 
         grapher_list = "var graphers = [\n\t" + ",\n\t".join(grapher_list) + "\n]\n"
@@ -206,6 +222,44 @@ def ExportStaticFiles(pb):
             f.write(graph_js)
 
 
+class PageRecord:
+    """The result of rendering a note to html, kept in memory until the graph is complete.
+    The page is only templated and written in the second pass, when the side panes, backlinks, etc. can be filled in.
+    """
+
+    def __init__(self, node_id, node_name, html_url_prefix, page_depth, content):
+        self.node_id = node_id
+        self.node_name = node_name
+        self.html_url_prefix = html_url_prefix
+        self.page_depth = page_depth
+        self.content = content
+
+    def populate_template(self, pb):
+        """Returns the page wrapped in the html template, with the placeholders of the second pass still in place."""
+        # The content can contain placeholders of the page as well (e.g. not_created.md), they are filled in with a single pass over the content
+        content = fill_slots(self.content, {"node_name": self.node_name, "pinnedNode": self.node_id, "html_url_prefix": self.html_url_prefix, "page_depth": str(self.page_depth)})
+        if "{{navbar_links}}" in content:
+            content = content.replace("{{navbar_links}}", "\n".join(pb.navbar_links))
+
+        return PopulateTemplate(
+            pb,
+            self.node_id,
+            pb.dynamic_inclusions,
+            pb.html_template,
+            content=content,
+            html_url_prefix=self.html_url_prefix,
+            node_name=self.node_name,
+            page_depth=self.page_depth,
+        )
+
+    def to_dict(self):
+        return {"node_id": self.node_id, "node_name": self.node_name, "html_url_prefix": self.html_url_prefix, "page_depth": self.page_depth, "content": self.content}
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(**record)
+
+
 def PopulateTemplate(
     pb,
     node_id,
@@ -216,11 +270,70 @@ def PopulateTemplate(
     title="",
     dynamic_includes=None,
     container_wrapper_class_list=None,
+    node_name=None,
+    page_depth=None,
 ):
-    # Cache
+    """Fills in the template. node_name and page_depth are filled in when given, otherwise {node_name} and {page_depth} are left in place.
+    Everything that is the same for every page is filled in once per build, see CompileTemplate().
+    """
+    compiled = CompileTemplate(pb, dynamic_inclusions, template, html_url_prefix=html_url_prefix, dynamic_includes=dynamic_includes)
+
+    # Misc
+    if title == "":
+        title = pb.gc("site_name", cached=True)
+
+    if container_wrapper_class_list is None:
+        container_wrapper_class_list = []
+    if pb.gc("toggles/no_tabs", cached=True):
+        container_wrapper_class_list.append("single_tab_page")
+
+    slots = {"node_id": node_id, "title": title, "container_wrapper_class_list": " ".join(container_wrapper_class_list), "content": content}
+    if node_name is not None:
+        slots["node_name"] = node_name
+    if page_depth is not None:
+        slots["page_depth"] = str(page_depth)
+    return compiled.render(slots)
+
+
+class CompiledTemplate:
+    """A template of which everything that is the same for every page has been filled in, split into literal segments and slots.
+
+    self.parts alternates between literal segments and slot names: [segment, slot, segment, slot, ..., segment].
+    """
+
+    # Slots are marked with this character while compiling, it does not occur in templates
+    MARKER = "\x00"
+
+    def __init__(self, html):
+        self.parts = html.split(self.MARKER)
+
+    @classmethod
+    def slot(cls, name):
+        return f"{cls.MARKER}{name}{cls.MARKER}"
+
+    def render(self, slots):
+        """Returns the html with the slots filled in, slots that are missing from slots are left as {name}"""
+        parts = self.parts.copy()
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+            parts[i] = slots[name] if name in slots else "{" + name + "}"
+        return "".join(parts)
+
+
+def CompileTemplate(pb, dynamic_inclusions, template, html_url_prefix=None, dynamic_includes=None):
+    """Returns the CompiledTemplate of the template, with the header, buttons, inclusions, html url prefix and navbar filled in.
+    The node id, title, wrapper classes, content, node name and page depth are left as slots.
+    Templates are compiled once per build (per html url prefix, when urls are relative).
+    """
     if html_url_prefix is None:
         html_url_prefix = pb.gc("html_url_prefix")
 
+    key = (template, dynamic_inclusions, html_url_prefix, dynamic_includes, pb.dynamic_footer_inclusions, pb.configured_html_prefix, tuple(pb.navbar_links))
+    if key in pb.compiled_templates:
+        return pb.compiled_templates[key]
+
+    slot = CompiledTemplate.slot
+
     # Major components
     # header
     ht = pb.gc("toggles/features/styling/header_template")
@@ -264,8 +377,10 @@ def PopulateTemplate(
         # dynamic_inclusions += '<script src="https://polyfill.io/v3/polyfill.min.js?features=es6"></script>' + "\n"
 
     if pb.ConfigManager.feature_is_enabled("search", cached=True):
-        dynamic_inclusions += '<script src="' + html_url_prefix + '/obs.html/static/flexsearch.bundle.js"></script>' + "\n"
-        dynamic_inclusions += '<script src="' + html_url_prefix + '/obs.html/static/pako.js"></script>' + "\n"
+        # with a prebuilt index, the search data does not have to be unzipped nor indexed in the browser
+        if not pb.gc("toggles/features/search/prebuilt_index/enabled", cached=True):
+            dynamic_inclusions += '<script src="' + html_url_prefix + '/obs.html/static/flexsearch.bundle.js"></script>' + "\n"
+            dynamic_inclusions += '<script src="' + html_url_prefix + '/obs.html/static/pako.js"></script>' + "\n"
         dynamic_inclusions += '<script src="' + html_url_prefix + '/obs.html/static/search.js"></script>' + "\n"
         # dynamic_inclusions += '<link rel="stylesheet" href="'+html_url_prefix+'/obs.html/static/search.css" />' + "\n"
 
@@ -333,36 +448,26 @@ def PopulateTemplate(
     else:
         template = template.replace("{search_html}", "")
 
-    if pb.ConfigManager.feature_is_enabled("search", cached=True):
-        template = template.replace("{search_html}", OpenIncludedFile("search/search.html"))
-    else:
-        template = template.replace("{search_html}", "")
-
-    # Misc
-    if title == "":
-        title = pb.gc("site_name", cached=True)
-
-    if container_wrapper_class_list is None:
-        container_wrapper_class_list = []
-    if pb.gc("toggles/no_tabs", cached=True):
-        container_wrapper_class_list.append("single_tab_page")
-
     # Replace placeholders
     template = (
-        template.replace("{node_id}", node_id)
-        .replace("{title}", title)
+        template.replace("{node_id}", slot("node_id"))
+        .replace("{title}", slot("title"))
         .replace("{dynamic_includes}", dynamic_inclusions)
         .replace("{dynamic_footer_includes}", pb.dynamic_footer_inclusions)
         .replace("{footer_js_inclusions}", footer_js_inclusions)
         .replace("{html_url_prefix}", html_url_prefix)
         .replace("{configured_html_url_prefix}", pb.configured_html_prefix)
-        .replace("{container_wrapper_class_list}", " ".join(container_wrapper_class_list))
+        .replace("{container_wrapper_class_list}", slot("container_wrapper_class_list"))
         .replace("{no_tabs}", str(int(pb.gc("toggles/no_tabs", cached=True))))
-        .replace("{pinnedNode}", node_id)
+        .replace("{pinnedNode}", slot("node_id"))
         .replace("{{navbar_links}}", "\n".join(pb.navbar_links))
-        .replace("{content}", content)
+        .replace("{content}", slot("content"))
+        .replace("{node_name}", slot("node_name"))
+        .replace("{page_depth}", slot("page_depth"))
     )
 
-    return template
+    compiled = CompiledTemplate(template)
+    pb.compiled_templates[key] = compiled
+    return compiled
     # Adding value replacement in content should be done in crawl_markdown_notes_and_convert_to_html,
     # Between the md.StripCodeSections() and md.RestoreCodeSections() statements, otherwise codeblocks can be altered.
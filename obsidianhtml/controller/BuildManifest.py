@@ -0,0 +1,326 @@
+"""
+This file contains the bookkeeping for incremental builds (see config value incremental_build).
+
+For every note that is converted, the manifest records a hash of the note, the links and inclusions that were found in it,
+the output files that were written, and everything else that the conversion hands back to the main process (see ParallelConvert).
+On the next build, notes whose input did not change reuse that record instead of being converted again.
+Only the notes that changed, the notes that include them, and the notes that link to them are converted again.
+
+The second pass (backlinks, side panes, graph ids, etc.) still runs for every page, but it starts from the cached page record
+of the first pass (see Templating.PageRecord), and pages whose output does not change are not written again.
+
+Every file that a build writes for a note/page (including the attachments that it copies) and the system pages (tag pages) are
+recorded as outputs. Outputs of the previous build that are not claimed by this build are removed, together with the folders
+that become empty, so that the output folders match those of a full build.
+
+Anything that can change the output of notes that did not change themselves (config, templates, the list of files, the tags)
+is hashed into a fingerprint. When the fingerprint changes, a full build is done.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import multiprocessing
+
+from pathlib import Path
+
+from ..lib import OpenIncludedFile
+from ..compiler.Templating import PageRecord
+from ..modules.lib import verbose_enough
+
+
+def load_build_manifest(pb, previous=None):
+    """Returns the BuildManifest to use for this build, or None when incremental builds are disabled.
+    previous is the BuildManifest of the previous build, if it is still in memory.
+    """
+    if not pb.gc("incremental_build"):
+        return None
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise Exception("Config value incremental_build is not supported on this platform.")
+    if pb.gc("max_note_depth") != -1:
+        raise Exception("Config value incremental_build can not be combined with max_note_depth, set max_note_depth to -1 or disable incremental_build.")
+    if pb.gc("toggles/features/dataview/enabled"):
+        raise Exception("Config value incremental_build can not be combined with the dataview feature, disable one of the two.")
+    if len(pb.gc("toggles/features/post_processing")) > 0:
+        raise Exception("Config value incremental_build can not be combined with post_processing modules, disable one of the two.")
+
+    manifest = BuildManifest(pb)
+    manifest.load(previous)
+    return manifest
+
+
+def hash_bytes(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class BuildManifest:
+    def __init__(self, pb):
+        self.pb = pb
+
+        # The manifest describes the contents of the output folders, so every output folder gets its own manifest
+        output_id = hash_bytes(pb.paths["html_output_folder"].as_posix().encode("utf-8"))
+        self.folder = pb.paths["appdir"].joinpath("build_cache", output_id)
+        self.manifest_path = self.folder.joinpath("manifest.json")
+        self.pages_folder = self.folder.joinpath("pages")
+
+        self.previous = {"notes": {}, "pages": {}, "system": {}, "hashes": {}}
+        self.current = {"fingerprint": None, "notes": {}, "pages": {}, "system": {}, "hashes": {}}
+
+        self.full_build = True
+        self.dirty_notes = None
+        self.og_key_lookup = None
+        self.counters = {"notes_converted": 0, "notes_reused": 0, "pages_rendered": 0, "pages_reused": 0}
+
+    # LOAD / SAVE
+    # ===============================================================================================
+    def load(self, previous_manifest=None):
+        pb = self.pb
+        self.current["fingerprint"] = self.get_fingerprint()
+
+        if self.manifest_path.exists():
+            if previous_manifest is not None and previous_manifest.folder == self.folder:
+                previous = previous_manifest.current
+            else:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    previous = json.load(f)
+            if previous.get("fingerprint") == self.current["fingerprint"]:
+                self.previous = previous
+                self.full_build = False
+
+            # Remove the manifest until the build is done, so that an interrupted build is followed by a full build
+            self.manifest_path.unlink()
+
+        if self.full_build:
+            if verbose_enough("info", pb.verbosity):
+                print("> INCREMENTAL BUILD: the previous build can not be reused (first build, or config, templates, files or tags changed), doing a full build")
+            self.clean_output_folders()
+        elif verbose_enough("info", pb.verbosity):
+            print("> INCREMENTAL BUILD: only converting notes that changed since the previous build")
+
+    def save(self):
+        pb = self.pb
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(self.current, f)
+
+        if verbose_enough("info", pb.verbosity):
+            c = self.counters
+            print(f"> INCREMENTAL BUILD: converted {c['notes_converted']} notes (reused {c['notes_reused']}), rendered {c['pages_rendered']} pages (reused {c['pages_reused']})")
+
+    def clean_output_folders(self):
+        """A full build starts from empty output folders, same as the prepare_output_folders module does for normal builds."""
+        pb = self.pb
+        folders = [pb.paths["html_output_folder"]]
+        if pb.gc("toggles/compile_md"):
+            folders.append(pb.paths["md_folder"])
+        for folder in folders + [self.pages_folder]:
+            if folder.exists():
+                shutil.rmtree(folder)
+            folder.mkdir(parents=True, exist_ok=True)
+
+    def get_fingerprint(self):
+        """Hash of everything that the output of a note depends on, apart from the note itself."""
+        pb = self.pb
+        config = {key: value for key, value in pb.config.items() if key not in ("verbosity", "workers", "resolution_cache_size")}
+        tags = {key: sorted(str(tag) for tag in (metadata.get("tags") or [])) for key, metadata in pb.metadata.items()}
+        templates = [str(getattr(pb, name) or "") for name in ("html_template", "graph_template", "graph_full_page_template", "dynamic_inclusions")]
+
+        fingerprint = {
+            "version": OpenIncludedFile("version"),
+            "config": config,
+            "templates": templates,
+            "files": sorted(pb.index.files.keys()),
+            "tags": tags,
+        }
+        return hash_bytes(json.dumps(fingerprint, sort_keys=True, default=str).encode("utf-8"))
+
+    # HASHING
+    # ===============================================================================================
+    def hash_file(self, path):
+        """Returns the hash of the file contents. The hash of the previous build is reused when the size and modification time did not change."""
+        path_str = path.as_posix()
+        if path_str in self.current["hashes"]:
+            return self.current["hashes"][path_str][2]
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        previous = self.previous["hashes"].get(path_str)
+        if previous is not None and previous[0] == stat.st_mtime_ns and previous[1] == stat.st_size:
+            digest = previous[2]
+        else:
+            with open(path, "rb") as f:
+                digest = hash_bytes(f.read())
+
+        self.current["hashes"][path_str] = [stat.st_mtime_ns, stat.st_size, digest]
+        return digest
+
+    def file_changed(self, path):
+        digest = self.hash_file(path)
+        previous = self.previous["hashes"].get(path.as_posix())
+        return previous is None or previous[2] != digest
+
+    def should_copy(self, fo, mode):
+        """Files that were copied by the previous build only need to be copied again when they changed."""
+        if mode == "ntm":
+            src, dst = fo.path["note"]["file_absolute_path"], fo.path["markdown"]["file_absolute_path"]
+        else:
+            src, dst = fo.path["markdown"]["file_absolute_path"], fo.path["html"]["file_absolute_path"]
+        return self.file_changed(src) or self.full_build or not os.path.lexists(dst)
+
+    # NOTE -> MARKDOWN
+    # ===============================================================================================
+    def compile_dirty_notes(self):
+        """Determines which notes have to be converted: notes that changed, and the notes that include or link to them."""
+        files = self.pb.index.files
+        previous_notes = self.previous["notes"]
+
+        changed = set()
+        for key, fo in files.items():
+            if not fo.metadata["is_parsable_note"] or "note" not in fo.path:
+                continue
+            record = previous_notes.get(key)
+            if record is None or record["hash"] != self.hash_file(fo.path["note"]["file_absolute_path"]) or not all(os.path.exists(x) for x in record["outputs"]):
+                changed.add(key)
+
+        # Inclusions are recorded recursively, so this covers notes that include a note that includes a changed note.
+        dirty = set(changed)
+        for key, record in previous_notes.items():
+            if key in changed:
+                continue
+            if any(x in changed for x in record["includes"]) or any(x in changed for x in record["links"]):
+                dirty.add(key)
+
+        self.dirty_notes = dirty
+
+    def note_is_dirty(self, key):
+        if self.full_build:
+            return True
+        if self.dirty_notes is None:
+            self.compile_dirty_notes()
+        return key in self.dirty_notes
+
+    def get_note_record(self, key):
+        self.counters["notes_reused"] += 1
+        return self.previous["notes"][key]["result"]
+
+    def set_note_record(self, result, converted):
+        """Stores the result of the conversion of a note, as returned by ParallelConvert._convert_note_worker()."""
+        fo = self.pb.index.files[result["key"]]
+        if converted:
+            self.counters["notes_converted"] += 1
+
+        # All notes of which the metadata was requested during the conversion are included in the note (or the note itself)
+        og_keys = self.get_og_key_lookup()
+        includes = [og_keys[x] for x in result["metadata"].keys() if x in og_keys and og_keys[x] != result["key"]]
+
+        self.current["notes"][result["key"]] = {
+            "hash": self.hash_file(fo.path["note"]["file_absolute_path"]),
+            "links": [x for x in result["links"] if x is not False],
+            "includes": includes,
+            "outputs": [fo.path["markdown"]["file_absolute_path"].as_posix()] + self.get_copy_outputs(result["copies"]),
+            "result": result,
+        }
+
+    def get_copy_outputs(self, copies):
+        """Returns the destinations of the file copies that a note/page requested, see FileObject.copy_file()."""
+        files = self.pb.index.files
+        return [files[key].path["markdown" if mode == "ntm" else "html"]["file_absolute_path"].as_posix() for key, mode in copies]
+
+    def get_og_key_lookup(self):
+        """pb.metadata is keyed by the original relative path of the note, this translates those keys to keys of pb.index.files."""
+        if self.og_key_lookup is None:
+            self.og_key_lookup = {}
+            for key, fo in self.pb.index.files.items():
+                if "note" in fo.path:
+                    self.og_key_lookup[fo.path["note"]["og_file_relative_path"].as_posix()] = key
+        return self.og_key_lookup
+
+    # MARKDOWN -> HTML
+    # ===============================================================================================
+    def page_is_dirty(self, key):
+        if self.full_build:
+            return True
+        fo = self.pb.index.files[key]
+        record = self.previous["pages"].get(key)
+        if record is None:
+            return True
+        if record["hash"] != self.hash_file(fo.path["markdown"]["file_absolute_path"]):
+            return True
+        return not (os.path.exists(record["outputs"][0]) and self.get_first_pass_path(key).exists())
+
+    def get_page_record(self, key):
+        self.counters["pages_reused"] += 1
+        return self.previous["pages"][key]["result"]
+
+    def set_page_record(self, result, rendered):
+        """Stores the result of rendering a page, as returned by ParallelConvert._convert_markdown_page_worker().
+        When the page was rendered, its page record is cached, so that the second pass can be redone in the next build.
+        """
+        key = result["key"]
+        fo = self.pb.index.files[key]
+        if rendered:
+            self.counters["pages_rendered"] += 1
+            self.pages_folder.mkdir(parents=True, exist_ok=True)
+            with open(self.get_first_pass_path(key), "w", encoding="utf-8") as f:
+                json.dump(fo.page_record.to_dict(), f)
+
+        self.current["pages"][key] = {
+            "hash": self.hash_file(fo.path["markdown"]["file_absolute_path"]),
+            "outputs": [fo.path["html"]["file_absolute_path"].as_posix()] + self.get_copy_outputs(result["copies"]),
+            "result": result,
+        }
+
+    def get_first_pass_path(self, key):
+        return self.pages_folder.joinpath(hash_bytes(key.encode("utf-8")) + ".json")
+
+    def load_page_record(self, key):
+        """Returns the PageRecord that was cached when the page was last rendered."""
+        with open(self.get_first_pass_path(key), "r", encoding="utf-8") as f:
+            return PageRecord.from_dict(json.load(f))
+
+    def write_page(self, path, html):
+        """Writes the result of the second pass, leaving pages that did not change untouched."""
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                if f.read() == html:
+                    return
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(html)
+
+    # SYSTEM PAGES
+    # ===============================================================================================
+    def add_system_output(self, path):
+        """Records a file that is written for the vault as a whole (e.g. a tag page), so that it is removed when a later build does not write it."""
+        path_str = Path(path).as_posix()
+        self.current["system"][path_str] = {"outputs": [path_str]}
+
+    # CLEAN UP
+    # ===============================================================================================
+    def remove_stale_outputs(self, section):
+        """Removes the outputs of the previous build that no note/page of this build claims, and the folders that become empty."""
+        claimed = set()
+        for record in self.current[section].values():
+            claimed.update(record["outputs"])
+
+        for key, record in self.previous.get(section, {}).items():
+            for output in record["outputs"]:
+                if output not in claimed and os.path.lexists(output):
+                    os.remove(output)
+                    self.remove_empty_folders(Path(output).parent)
+            if section == "pages" and key not in self.current[section] and self.get_first_pass_path(key).exists():
+                self.get_first_pass_path(key).unlink()
+
+    def remove_empty_folders(self, folder):
+        """Removes the folder and its parents as long as they are empty, stopping at the output folders."""
+        pb = self.pb
+        roots = [pb.paths["html_output_folder"].resolve(), pb.paths["md_folder"].resolve()]
+        folder = folder.resolve()
+        while folder not in roots and any(folder.is_relative_to(root) for root in roots):
+            if any(folder.iterdir()):
+                return
+            folder.rmdir()
+            folder = folder.parent
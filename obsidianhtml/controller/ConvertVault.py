@@ -1,10 +1,10 @@
+import os
 import sys
+import shutil
 import frontmatter
 import gzip
 import yaml
 
-import regex as re  # regex string finding/replacing
-
 from urllib.parse import unquote
 from pathlib import Path
 
@@ -13,24 +13,79 @@ from .. import md2html
 from ..lib import CreateStaticFilesFolders, WriteFileLog, simpleHash, get_html_url_prefix, retain_reference, OpenIncludedFile, slugify
 
 from ..compiler.Templating import PopulateTemplate
+from ..compiler.Rewriter import fill_slots, find_queries
 from ..core.PicknickBasket import PicknickBasket
 from ..core.FileObject import FileObject
 from ..core.Index import Index
 
 from ..features.RssFeed import RssFeed
 from ..features.CreateIndexFromTags import CreateIndexFromTags
-from ..features.EmbeddedSearch import EmbeddedSearch
+from ..features.EmbeddedSearch import EmbeddedSearch, GetIndexFolder
+from ..features.Search import ContentCompactor, uses_snippet_store, SEARCH_DATA_FILE, COMPACT_SEARCH_DATA_FILE
 from ..features.SidePane import get_side_pane_html
+from ..features.GraphLayout import compute_graph_layout
 from ..features import post_processing
 
 from ..compiler.HTML import compile_navbar_links, create_folder_navigation_view, create_foldable_tag_lists, recurseTagList
 from ..compiler.Templating import ExportStaticFiles
 
+from .ParallelConvert import get_worker_count, convert_notes_to_markdown_parallel, convert_markdown_notes_to_html_parallel
+from .BuildManifest import load_build_manifest
+
 from ..modules import controller as module_controller
 from ..modules.lib import verbose_enough
 
 
-def ConvertVault(config_yaml_location=""):
+def ConvertVault(config_yaml_location="", previous_manifest=None):
+    """Converts the vault. Returns the PicknickBasket of the build.
+    previous_manifest can be set to the BuildManifest of the previous build (pb.build_manifest) to skip reading it from disk.
+    """
+    # Set config, run the modules, and load the input files into the file tree
+    # ---------------------------------------------------------
+    pb = load_vault()
+    convert_vault(pb, previous_manifest=previous_manifest)
+    return pb
+
+
+def convert_vault(pb, previous_manifest=None):
+    """Converts the vault that was loaded with load_vault(). `obsidianhtml watch` calls this again with the same PicknickBasket,
+    after resetting it with pb.reset_build_state().
+    """
+    # Load the manifest of the previous build when building incrementally
+    pb.build_manifest = load_build_manifest(pb, previous=previous_manifest)
+
+    # Convert
+    # ---------------------------------------------------------
+    convert_obsidian_notes_to_markdown(pb)
+    convert_markdown_to_html(pb)
+    compile_rss_feed(pb)
+    export_user_files(pb)
+    run_post_processing(pb)
+    precompress_output(pb)
+
+    if pb.build_manifest is not None:
+        pb.build_manifest.save()
+
+    if verbose_enough("debug", pb.verbosity):
+        print("\n> LINK RESOLUTION CACHES")
+        for line in pb.FileFinder.get_cache_stats():
+            print(f"\t{line}")
+
+    # Wrap up
+    # ---------------------------------------------------------
+    if pb.gc("toggles/compile_md") or pb.gc("toggles/compile_html"):
+        if verbose_enough("info", pb.verbosity):
+            print("\nYou can find your output at:")
+            if pb.gc("toggles/compile_md"):
+                print(f"\tmd: {pb.paths['md_folder']}")
+            if pb.gc("toggles/compile_html"):
+                print(f"\thtml: {pb.paths['html_output_folder']}")
+
+
+def load_vault():
+    """Loads the config, runs the modules that prepare the build (get_file_list, parse_metadata, etc), and loads the input files into the file tree.
+    Returns the PicknickBasket.
+    """
     # Set config
     # ---------------------------------------------------------
     pb = PicknickBasket()
@@ -79,23 +134,7 @@ def ConvertVault(config_yaml_location=""):
     # ---------------------------------------------------------
     Index(pb)
 
-    # Convert
-    # ---------------------------------------------------------
-    convert_obsidian_notes_to_markdown(pb)
-    convert_markdown_to_html(pb)
-    compile_rss_feed(pb)
-    export_user_files(pb)
-    run_post_processing(pb)
-
-    # Wrap up
-    # ---------------------------------------------------------
-    if pb.gc("toggles/compile_md") or pb.gc("toggles/compile_html"):
-        if verbose_enough("info", pb.verbosity):
-            print("\nYou can find your output at:")
-            if pb.gc("toggles/compile_md"):
-                print(f"\tmd: {pb.paths['md_folder']}")
-            if pb.gc("toggles/compile_html"):
-                print(f"\thtml: {pb.paths['html_output_folder']}")
+    return pb
 
 
 def convert_obsidian_notes_to_markdown(pb):
@@ -121,6 +160,20 @@ def convert_obsidian_notes_to_markdown(pb):
         if pb.gc("toggles/force_filename_to_lowercase", cached=True):
             rel_entry_path_str = rel_entry_path_str.lower()
 
+        # Spread conversion over multiple processes when configured.
+        # Max note depth depends on the order in which the notes are crawled, so this is only supported in the main process.
+        # Incremental builds always use this code path, as it keeps track of the results of every note.
+        workers = get_worker_count(pb)
+        if (workers > 1 and pb.gc("max_note_depth") == -1) or pb.build_manifest is not None:
+            entrypoints = [rel_entry_path_str]
+            if pb.gc("toggles/features/create_index_from_tags/enabled") and not pb.gc("toggles/features/create_index_from_tags/use_as_homepage"):
+                entrypoints.append(pb.gc("toggles/features/create_index_from_tags/rel_output_path"))
+
+            if verbose_enough("info", pb.verbosity) and workers > 1:
+                print(f"\t> CONVERTING WITH {workers} WORKERS")
+            convert_notes_to_markdown_parallel(pb, entrypoints, process_all=pb.gc("toggles/process_all", cached=True), workers=workers)
+            return
+
         # Start conversion
         entrypoint_file_object = pb.index.files[rel_entry_path_str]
         pb.init_state(action="n2m", loop_type="note", current_fo=entrypoint_file_object, subroutine="crawl_obsidian_notes_and_convert_to_markdown")
@@ -170,57 +223,59 @@ def convert_markdown_to_html(pb):
 
     # add in the not_created page
     # -----------------------------------------------------------
-    rel_path="not_created.md"
-    abs_path = pb.paths["md_folder"].joinpath(rel_path)
-    contents = OpenIncludedFile("html/templates/not_created.md")
-    with open(abs_path, 'w') as f:
-        f.write(contents)
-
-    fo = FileObject(pb)
-    fo.init_markdown_path(abs_path)
-    fo.compile_metadata(abs_path)
-    pb.index.add_file_object_to_file_tree(rel_path, fo)
-    pb.FileFinder.invalidate_cache()
+    fo = add_not_created_page(pb)
 
 
     # Conversion: md -> html
     # -----------------------------------------------------------
-    # Start conversion from the entrypoint
-    entrypoint_file_object = pb.index.files[rel_entry_path_str]
-    pb.init_state(action="m2h", loop_type="md_note", current_fo=entrypoint_file_object, subroutine="crawl_markdown_notes_and_convert_to_html")
-    crawl_markdown_notes_and_convert_to_html(entrypoint_file_object, pb)
-    pb.reset_state()
-
-    # Run other pages that otherwise might not be hit
-    ## tags page
-    if pb.gc("toggles/features/create_index_from_tags/enabled") and not pb.gc("toggles/features/create_index_from_tags/use_as_homepage"):
-        entrypoint_file_object = pb.index.files[pb.gc("toggles/features/create_index_from_tags/rel_output_path")]
+    workers = get_worker_count(pb)
+    if workers > 1 or pb.build_manifest is not None:
+        # Render the pages in worker processes, starting at the same entrypoints as the serial crawl below
+        entrypoints = [(rel_entry_path_str, False)]
+        if pb.gc("toggles/features/create_index_from_tags/enabled") and not pb.gc("toggles/features/create_index_from_tags/use_as_homepage"):
+            entrypoints.append((pb.gc("toggles/features/create_index_from_tags/rel_output_path"), "tags_page_html"))
+        entrypoints.append(("not_created.md", False))
+
+        if verbose_enough("info", pb.verbosity) and workers > 1:
+            print(f"\t> CONVERTING WITH {workers} WORKERS")
+        convert_markdown_notes_to_html_parallel(pb, entrypoints, process_all=pb.gc("toggles/process_all", cached=True), workers=workers)
+    else:
+        # Start conversion from the entrypoint
+        entrypoint_file_object = pb.index.files[rel_entry_path_str]
         pb.init_state(action="m2h", loop_type="md_note", current_fo=entrypoint_file_object, subroutine="crawl_markdown_notes_and_convert_to_html")
-        crawl_markdown_notes_and_convert_to_html(entrypoint_file_object, pb, capture_in_jar="tags_page_html")
+        crawl_markdown_notes_and_convert_to_html(entrypoint_file_object, pb)
         pb.reset_state()
 
-    ## not_created
-    entrypoint_file_object = pb.index.files["not_created.md"]
-    crawl_markdown_notes_and_convert_to_html(fo, pb)
-
-    # Keep going until all other files are processed
-    if pb.gc("toggles/process_all") is True:
-        if verbose_enough("info", pb.verbosity):
-            print("\t> FEATURE: PROCESS ALL")
-        unparsed = [x for x in pb.index.files.values() if x.processed_mth is False]
-        i = 0
-        l = len(unparsed)
-        for fo in unparsed:
-            i += 1
-            if pb.gc("toggles/verbose_printout", cached=True) is True:
-                print(f"\t\t{i}/{l} - " + str(fo.path["markdown"]["file_absolute_path"]))
-
-            pb.init_state(action="m2h_process_all", loop_type="md_note", current_fo=fo, subroutine="crawl_markdown_notes_and_convert_to_html")
-            crawl_markdown_notes_and_convert_to_html(fo, pb, log_level=2)
+        # Run other pages that otherwise might not be hit
+        ## tags page
+        if pb.gc("toggles/features/create_index_from_tags/enabled") and not pb.gc("toggles/features/create_index_from_tags/use_as_homepage"):
+            entrypoint_file_object = pb.index.files[pb.gc("toggles/features/create_index_from_tags/rel_output_path")]
+            pb.init_state(action="m2h", loop_type="md_note", current_fo=entrypoint_file_object, subroutine="crawl_markdown_notes_and_convert_to_html")
+            crawl_markdown_notes_and_convert_to_html(entrypoint_file_object, pb, capture_in_jar="tags_page_html")
             pb.reset_state()
 
-        if verbose_enough("info", pb.verbosity):
-            print("\t< FEATURE: PROCESS ALL: Done")
+        ## not_created
+        entrypoint_file_object = pb.index.files["not_created.md"]
+        crawl_markdown_notes_and_convert_to_html(fo, pb)
+
+        # Keep going until all other files are processed
+        if pb.gc("toggles/process_all") is True:
+            if verbose_enough("info", pb.verbosity):
+                print("\t> FEATURE: PROCESS ALL")
+            unparsed = [x for x in pb.index.files.values() if x.processed_mth is False]
+            i = 0
+            l = len(unparsed)
+            for fo in unparsed:
+                i += 1
+                if pb.gc("toggles/verbose_printout", cached=True) is True:
+                    print(f"\t\t{i}/{l} - " + str(fo.path["markdown"]["file_absolute_path"]))
+
+                pb.init_state(action="m2h_process_all", loop_type="md_note", current_fo=fo, subroutine="crawl_markdown_notes_and_convert_to_html")
+                crawl_markdown_notes_and_convert_to_html(fo, pb, log_level=2)
+                pb.reset_state()
+
+            if verbose_enough("info", pb.verbosity):
+                print("\t< FEATURE: PROCESS ALL: Done")
 
     # [??] Second pass
     # ------------------------------------------
@@ -230,200 +285,112 @@ def convert_markdown_to_html(pb):
     # Create reusable blocks
     create_folder_navigation_view(pb)
 
-    # Make lookup so that we can easily find the url of a node
-    pb.index.network_tree.compile_node_lookup()
-
     # Prep some data outside of the loop
     pb.index.compile_html_relpath_lookup_table()
 
     esearch = None
+    embedded_search_cache = {}
     if pb.gc("toggles/features/embedded_search/enabled", cached=True):
-        esearch = EmbeddedSearch(json_data=pb.search.OutputJson())
+        esearch = EmbeddedSearch(GetIndexFolder(pb.paths["html_output_folder"].as_posix()), json_data=pb.search.OutputJson())
 
-    # prepare lookup to translate slugified folder names to their original
-    folder_og_name_lut = {}
-    for file in pb.index.files.keys():
-        file_path = pb.index.files[file].path["markdown"]["file_relative_path"]
-        for el in file_path.as_posix().split("/")[:-1]:
-            slug_el = slugify(el)
-            if slug_el not in folder_og_name_lut:
-                folder_og_name_lut[slug_el] = el
+    def render_embedded_search(listing):
+        # queries that were not found up front (e.g. in side panes) are run when they are encountered
+        if listing not in embedded_search_cache:
+            embedded_search_cache[listing] = render_embedded_search_html(listing, esearch.search_many([listing.split("|-|")[1]]))
+        return embedded_search_cache[listing]
 
-    if verbose_enough("info", pb.verbosity):
-        print("\t> SECOND PASS HTML")
+    def render_embedded_search_html(listing, results):
+        # split listing into qualifier and user_query
+        qual, user_query = listing.split("|-|")
 
-    for fo in pb.index.files.values():
-        if not fo.metadata["is_note"]:
-            continue
+        # found query
+        print(qual, user_query)
 
-        # get paths / html prefix
-        dst_abs_path = fo.path["html"]["file_absolute_path"]
-        dst_rel_path_str = fo.path["html"]["file_relative_path"].as_posix()
-        html_url_prefix = get_html_url_prefix(pb, rel_path_str=dst_rel_path_str)
-        page_depth = len(dst_rel_path_str.split("/")) - 1
-
-        # get html content
-        try:
-            with open(dst_abs_path, "r", encoding="utf-8") as f:
-                html = f.read()
-        except:
-            continue
+        # search
+        res = results[user_query]
 
-        # Get node_id
-        m = re.search(r"(?<=\{_obsidian_html_node_id_pattern_:)(.*?)(?=\})", html)
-        if m is None:
-            continue
-        node_id = m.group(0)
-        node = pb.index.network_tree.node_lookup[node_id]
-        html = re.sub("\{_obsidian_html_node_id_pattern_:" + re.escape(node_id) + "}", "", html)
-
-        # Get tags
-        tags = md2html.get_tags(node)
-
-        # Fill in side pane content
-        left_pane = get_side_pane_html(pb, "left_pane", node)
-        html = html.replace("{left_pane}", left_pane)
-
-        right_pane = get_side_pane_html(pb, "right_pane", node)
-        html = html.replace("{right_pane}", right_pane)
-
-        # Compile backlinks list
-        if pb.gc("toggles/features/backlinks/enabled", cached=True):
-            html = md2html.insert_backlinks(pb, html, node_id, page_depth)
-
-        # Insert tags footer
-        html = md2html.insert_tags_footer(pb, html, tags, fo.md.metadata)
-
-        # add breadcrumbs
-        # ------------------------------------------------------------------------
-        if pb.gc("toggles/features/breadcrumbs/enabled", cached=True):
-            html_url_prefix = pb.gc("html_url_prefix", cached=True)
-
-            if node["url"] == f"{html_url_prefix}/index.html":
-                # Don't create breadcrumbs for the homepage
-                snippet = ""
-
-            else:
-                # loop through all/links/along/the_way.html
-
-                # set first element to be home
-                parts = [f'<a href="{html_url_prefix}/" style="color: rgb(var(--normal-text-color));">Home</a>']
-
-                subpaths = node["url"].replace(".html", "").split("/")[1:]
-
-                if pb.gc("toggles/force_filename_to_lowercase", cached=True):
-                    subpaths = [x.lower() for x in subpaths]
-
-                if html_url_prefix:
-                    # remove the parts that are part of the prefix
-                    prefix_amount = len(html_url_prefix.split("/")) - 1
-                    subpaths = subpaths[prefix_amount:]
-
-                previous_url = ""
-                for i, subpath in enumerate(subpaths):
-                    subpath = unquote(subpath)
-                    if subpath in pb.index.network_tree.node_lookup:
-                        lnode = pb.index.network_tree.node_lookup[subpath]
-                    elif subpath in pb.index.network_tree.node_lookup_slug:
-                        lnode = pb.index.network_tree.node_lookup_slug[subpath]
-                    else:
-                        # try finding folder with same name in markdown folder
-                        # to get proper capitalization, even if we use slugify
-                        name = unquote(subpaths[i])
-                        if name in folder_og_name_lut:
-                            name = folder_og_name_lut[name]
-
-                        parts.append(f'<span style="color: #666;">{name}</span>')
-                        previous_url = ""
-                        continue
-
-                    url = lnode["url"]
-                    name = lnode["name"]
-
-                    # in the case of folder notes, we have the folder and note name being the
-                    # same, we don't want to print this twice in the breadcrumbs
-                    if url != previous_url:
-                        parts.append(f'<a href="{url}" ___COLOR___>{name}</a>')
-                    previous_url = url
-
-                # set all links to be normal text color except for the last link
-                parts[-1] = parts[-1].replace("___COLOR___", "")
-                for i, link in enumerate(parts):
-                    parts[i] = link.replace("___COLOR___", 'style="color: var(--normal-text-color);"')
-
-                # combine parts into snippet
-                snippet = " / ".join(parts)
-                snippet = f"""
-                <div style="width:100%; text-align: right;display: block;margin: 0.5rem;">
-                    <div style="flex:1;display: none;"></div>
-                    <div class="breadcrumbs" style="flex:1 ;padding: 0.5rem; width: fit-content;display: inline;border-radius: 0.2rem;">
-                        {snippet}
-                    </div>
-                </div>"""
+        # compile html output
+        output = ""
+        if qual == "list":
+            output = '<div class="query"><ul>\n\t' + "\n\t".join([f'<li><a href="/{x["path"]}">{x["title"]}</a></li>' for x in res]) + "\n</ul></div>"
 
-            html = re.sub("\{_obsidian_html_breadcrumbs_pattern_\}", snippet, html)
+        else:
+            output = '<div class="query">'
+            for doc in res:
+                # setup doc
+                output += f'\n\t<div class="match-document">\n\t\t<div class="match-document-title">\n\t\t\t<a href="/{doc["path"]}">{doc["title"]}</a>\n\t\t</div>\n\t\t<div class="matches">'
+
+                # Add path matches
+                if doc["matches"]["path"]:
+                    output += '\n\t\t\t<div class="match-row">\n\t\t\t\t' + doc["matches"]["path"] + "\n\t\t\t</div>"
+
+                # Add content mathes
+                for match in doc["matches"]["content"]:
+                    output += f'\n\t\t\t<div class="match-row">\n\t\t\t\t{match}\n\t\t\t</div>'
+
+                # Add tags
+                if len(doc["matches"]["tags"]) > 0:
+                    output += '\n\t\t\t<div class="tag-box">'
+                    for match, tag in doc["matches"]["tags"]:
+                        output += f'\n\t\t\t\t<div class="match-row tag">\n\t\t\t\t\t<a href="/obs.html/tags/{tag}/index.html">{match}</a>\n\t\t\t\t</div>'
+                    output += "\n\t\t\t</div>"
+
+                if len(doc["matches"]["tags_keyword"]) > 0:
+                    output += '\n\t\t\t<div class="tag-box">'
+                    for match, tag in doc["matches"]["tags_keyword"]:
+                        output += f'\n\t\t\t\t<div class="match-row tag keyword">\n\t\t\t\t\t<a href="/obs.html/tags/{tag}/index.html">{match}</a>\n\t\t\t\t</div>'
+                    output += "\n\t\t\t</div>"
+
+                # close doc divs
+                output += "\n\t\t</div>\n\t</div>"
+            # close query div
+            output += "\n</div>"
+        return output
+
+    if esearch is not None:
+        # Run every query in the vault once, in a single searcher session. The html is cached per (qualifier, query), so that
+        # pages that embed the same query share the result.
+        listings = set()
+        for fo in pb.index.files.values():
+            if fo.page_record is not None:
+                listings.update(find_queries(fo.page_record.content))
+        listings = sorted(listings)
+        results = esearch.search_many(set(listing.split("|-|")[1] for listing in listings))
+        for listing in listings:
+            embedded_search_cache[listing] = render_embedded_search_html(listing, results)
 
-        # add embedded search results
-        if pb.gc("toggles/features/embedded_search/enabled", cached=True):
-            query_blocks = re.findall(r"(?<=<p>{_obsidian_html_query:)(.*?)(?=\ }</p>)", html)
-            for listing in query_blocks:
-                # split listing into qualifier and user_query
-                qual, user_query = listing.split("|-|")
+    # prepare lookup to translate slugified folder names to their original
+    folder_og_name_lut = get_folder_og_name_lut(pb)
 
-                # found query
-                print(qual, user_query)
+    if verbose_enough("info", pb.verbosity):
+        print("\t> SECOND PASS HTML")
 
-                # search
-                res = esearch.search(user_query)
+    # add embedded search results
+    query = None
+    if pb.gc("toggles/features/embedded_search/enabled", cached=True):
+        query = render_embedded_search
 
-                # compile html output
-                output = ""
-                if qual == "list":
-                    output = '<div class="query"><ul>\n\t' + "\n\t".join([f'<li><a href="/{x["path"]}">{x["title"]}</a></li>' for x in res]) + "\n</ul></div>"
+    for key, fo in pb.index.files.items():
+        if not fo.metadata["is_note"]:
+            continue
 
-                else:
-                    output = '<div class="query">'
-                    for doc in res:
-                        # setup doc
-                        output += f'\n\t<div class="match-document">\n\t\t<div class="match-document-title">\n\t\t\t<a href="/{doc["path"]}">{doc["title"]}</a>\n\t\t</div>\n\t\t<div class="matches">'
-
-                        # Add path matches
-                        if doc["matches"]["path"]:
-                            output += '\n\t\t\t<div class="match-row">\n\t\t\t\t' + doc["matches"]["path"] + "\n\t\t\t</div>"
-
-                        # Add content mathes
-                        for match in doc["matches"]["content"]:
-                            output += f'\n\t\t\t<div class="match-row">\n\t\t\t\t{match}\n\t\t\t</div>'
-
-                        # Add tags
-                        if len(doc["matches"]["tags"]) > 0:
-                            output += '\n\t\t\t<div class="tag-box">'
-                            for match, tag in doc["matches"]["tags"]:
-                                output += f'\n\t\t\t\t<div class="match-row tag">\n\t\t\t\t\t<a href="/obs.html/tags/{tag}/index.html">{match}</a>\n\t\t\t\t</div>'
-                            output += "\n\t\t\t</div>"
-
-                        if len(doc["matches"]["tags_keyword"]) > 0:
-                            output += '\n\t\t\t<div class="tag-box">'
-                            for match, tag in doc["matches"]["tags_keyword"]:
-                                output += f'\n\t\t\t\t<div class="match-row tag keyword">\n\t\t\t\t\t<a href="/obs.html/tags/{tag}/index.html">{match}</a>\n\t\t\t\t</div>'
-                            output += "\n\t\t\t</div>"
-
-                        # close doc divs
-                        output += "\n\t\t</div>\n\t</div>"
-                    # close query div
-                    output += "\n</div>"
-
-                # replace query block with html
-                try:
-                    safe_str = re.escape("<p>{_obsidian_html_query:" + listing + " }</p>")
-                    html = re.sub(safe_str, output, html)
-                except:
-                    print(listing)
-                    raise
+        html = render_page(pb, fo, folder_og_name_lut, query=query)
+        if html is None:
+            continue
+
+        dst_abs_path = fo.path["html"]["file_absolute_path"]
 
         # write result
-        with open(dst_abs_path, "w", encoding="utf-8") as f:
-            f.write(html)
+        dst_abs_path.parent.mkdir(parents=True, exist_ok=True)
+        if pb.build_manifest is not None:
+            pb.build_manifest.write_page(dst_abs_path, html)
+        else:
+            with open(dst_abs_path, "w", encoding="utf-8") as f:
+                f.write(html)
+
+    # The records are kept until all pages are written, so that side panes always see the first pass of a page
+    for fo in pb.index.files.values():
+        fo.page_record = None
 
     if verbose_enough("info", pb.verbosity):
         print("\t< SECOND PASS HTML: Done")
@@ -433,6 +400,8 @@ def convert_markdown_to_html(pb):
     # Create tag pages
     recurseTagList(pb.tagtree, "", pb, level=0)
     create_foldable_tag_lists(pb)
+    if pb.build_manifest is not None:
+        pb.build_manifest.remove_stale_outputs("system")
 
     # Create graph fullpage
     if pb.gc("toggles/features/graph/enabled", cached=True):
@@ -450,23 +419,51 @@ def convert_markdown_to_html(pb):
         # add crosslinks to graph data
         pb.index.network_tree.AddCrosslinks()
 
+        # Position the nodes, so that the graphers don't have to run the force simulation in the browser
+        if pb.gc("toggles/features/graph/enabled", cached=True) and pb.gc("toggles/features/graph/precompute_layout/enabled", cached=True):
+            compute_graph_layout(pb)
+
         # Write node json to static folder
         CreateStaticFilesFolders(pb.paths["html_output_folder"])
-        with open(pb.paths["html_output_folder"].joinpath("obs.html").joinpath("data/graph.json"), "w", encoding="utf-8") as f:
-            f.write(pb.index.network_tree.OutputJson())
+        pb.index.network_tree.WriteJson(pb.paths["html_output_folder"].joinpath("obs.html").joinpath("data/graph.json"))
+
+        # Write the neighborhood of every node, so that the graphs on the note pages don't have to load all of graph.json
+        if pb.gc("toggles/features/graph/enabled", cached=True) and pb.gc("toggles/features/graph/sharded_data", cached=True):
+            pb.index.network_tree.WriteGraphShards(pb.paths["html_output_folder"].joinpath("obs.html/data/graph"))
 
     if pb.capabilities_needed["search_data"]:
         # Compress search json and write to static folder
-        gzip_path = pb.paths["html_output_folder"].joinpath("obs.html").joinpath("data/search.json.gzip")
+        gzip_path = pb.paths["html_output_folder"].joinpath("obs.html").joinpath("data", SEARCH_DATA_FILE)
         gzip_path.parent.mkdir(parents=True, exist_ok=True)
         gzip_content = pb.search.OutputJson()
         # pb.gzip_hash = simpleHash(gzip_content.decode("utf-8"))
-        pb.gzip_hash = simpleHash(gzip_content)
 
         with gzip.open(gzip_path, "wb", compresslevel=5) as f:
             # f.write(gzip_content)
             f.write(gzip_content.encode("utf-8"))
 
+        # The compacted search data is only loaded by search.js, search.json.gzip keeps the full content for `obsidianhtml search`
+        compact_gzip_path = gzip_path.parent.joinpath(COMPACT_SEARCH_DATA_FILE)
+        compact_gzip_path.unlink(missing_ok=True)
+        compactor = ContentCompactor.from_config(pb.gc)
+        if compactor is not None:
+            gzip_content = pb.search.OutputJson(compactor)
+            with gzip.open(compact_gzip_path, "wb", compresslevel=5) as f:
+                f.write(gzip_content.encode("utf-8"))
+
+        # Write the snippet store and the prebuilt search index, of which the browser only downloads the parts that it needs
+        search_folder = pb.paths["html_output_folder"].joinpath("obs.html/data/search")
+        if search_folder.exists():
+            shutil.rmtree(search_folder)
+        snippets_hash = ""
+        if uses_snippet_store(pb.gc):
+            snippets_hash = pb.search.WriteSnippets(search_folder)
+        if pb.gc("toggles/features/search/enabled", cached=True) and pb.gc("toggles/features/search/prebuilt_index/enabled", cached=True):
+            pb.search.WriteIndexShards(search_folder, pb.gc("toggles/features/search/prebuilt_index/prefix_length", cached=True), compactor)
+
+        # the hash is used to reload the search data in the browser when it changed, this includes the snippets when not all content is in the search data
+        pb.gzip_hash = simpleHash(gzip_content + snippets_hash)
+
     # Add Extra stuff to the output directories
     ExportStaticFiles(pb)
 
@@ -474,6 +471,142 @@ def convert_markdown_to_html(pb):
         print("< COMPILING HTML FROM MARKDOWN CODE: Done")
 
 
+def add_not_created_page(pb):
+    """Writes the page that links to notes that were not converted point to, and adds it to the index. Returns its FileObject."""
+    rel_path="not_created.md"
+    abs_path = pb.paths["md_folder"].joinpath(rel_path)
+    contents = OpenIncludedFile("html/templates/not_created.md")
+    with open(abs_path, 'w') as f:
+        f.write(contents)
+
+    fo = FileObject(pb)
+    fo.init_markdown_path(abs_path)
+    fo.compile_metadata(abs_path)
+    pb.index.add_file_object_to_file_tree(rel_path, fo)
+    return fo
+
+
+def render_page(pb, fo, folder_og_name_lut, query=None):
+    """The second pass of a page: wraps the page record of the first pass in the html template, and fills in the graph id, backlinks, tags,
+    breadcrumbs, side panes and embedded search results (with query, see fill_slots()).
+    Returns the html, or None when the page was not rendered in the first pass.
+    """
+    # get paths / html prefix
+    dst_rel_path_str = fo.path["html"]["file_relative_path"].as_posix()
+    html_url_prefix = get_html_url_prefix(pb, rel_path_str=dst_rel_path_str)
+    page_depth = len(dst_rel_path_str.split("/")) - 1
+
+    # get html content, pages that were not rendered in the first pass have no record
+    record = fo.page_record
+    if record is None:
+        return None
+    html = record.populate_template(pb)
+    node = pb.index.network_tree.node_lookup[record.node_id]
+
+    # Slots that are filled in below, in a single pass over the page
+    slots = {}
+
+    # Fill in the graph id of the node, this is only known when all pages have been added to the graph
+    slots["_obsidian_html_node_nid_pattern_"] = str(node["nid"])
+
+    # Get tags
+    tags = md2html.get_tags(node)
+
+    # Compile backlinks list
+    if pb.gc("toggles/features/backlinks/enabled", cached=True):
+        slots["_obsidian_html_backlinks_pattern_"] = md2html.get_backlinks_html(pb, record.node_id, page_depth)
+
+    # Compile tags footer
+    slots["_obsidian_html_tags_footer_pattern_"], inline_tags = md2html.get_tags_footer_html(pb, tags, fo.md.metadata)
+
+    # add breadcrumbs
+    # ------------------------------------------------------------------------
+    if pb.gc("toggles/features/breadcrumbs/enabled", cached=True):
+        html_url_prefix = pb.gc("html_url_prefix", cached=True)
+
+        if node["url"] == f"{html_url_prefix}/index.html":
+            # Don't create breadcrumbs for the homepage
+            snippet = ""
+
+        else:
+            # loop through all/links/along/the_way.html
+
+            # set first element to be home
+            parts = [f'<a href="{html_url_prefix}/" style="color: rgb(var(--normal-text-color));">Home</a>']
+
+            subpaths = node["url"].replace(".html", "").split("/")[1:]
+
+            if pb.gc("toggles/force_filename_to_lowercase", cached=True):
+                subpaths = [x.lower() for x in subpaths]
+
+            if html_url_prefix:
+                # remove the parts that are part of the prefix
+                prefix_amount = len(html_url_prefix.split("/")) - 1
+                subpaths = subpaths[prefix_amount:]
+
+            previous_url = ""
+            for i, subpath in enumerate(subpaths):
+                subpath = unquote(subpath)
+                if subpath in pb.index.network_tree.node_lookup:
+                    lnode = pb.index.network_tree.node_lookup[subpath]
+                elif subpath in pb.index.network_tree.node_lookup_slug:
+                    lnode = pb.index.network_tree.node_lookup_slug[subpath]
+                else:
+                    # try finding folder with same name in markdown folder
+                    # to get proper capitalization, even if we use slugify
+                    name = unquote(subpaths[i])
+                    if name in folder_og_name_lut:
+                        name = folder_og_name_lut[name]
+
+                    parts.append(f'<span style="color: #666;">{name}</span>')
+                    previous_url = ""
+                    continue
+
+                url = lnode["url"]
+                name = lnode["name"]
+
+                # in the case of folder notes, we have the folder and note name being the
+                # same, we don't want to print this twice in the breadcrumbs
+                if url != previous_url:
+                    parts.append(f'<a href="{url}" ___COLOR___>{name}</a>')
+                previous_url = url
+
+            # set all links to be normal text color except for the last link
+            parts[-1] = parts[-1].replace("___COLOR___", "")
+            for i, link in enumerate(parts):
+                parts[i] = link.replace("___COLOR___", 'style="color: var(--normal-text-color);"')
+
+            # combine parts into snippet
+            snippet = " / ".join(parts)
+            snippet = f"""
+                <div style="width:100%; text-align: right;display: block;margin: 0.5rem;">
+                    <div style="flex:1;display: none;"></div>
+                    <div class="breadcrumbs" style="flex:1 ;padding: 0.5rem; width: fit-content;display: inline;border-radius: 0.2rem;">
+                        {snippet}
+                    </div>
+                </div>"""
+
+        slots["_obsidian_html_breadcrumbs_pattern_"] = snippet
+
+    # Fill in side pane content, the placeholders in the side panes are filled in as if they are part of the page
+    for pane_id in ("left_pane", "right_pane"):
+        slots[pane_id] = fill_slots(get_side_pane_html(pb, pane_id, node), slots, inline_tags=inline_tags, query=query)
+
+    return fill_slots(html, slots, inline_tags=inline_tags, query=query)
+
+
+def get_folder_og_name_lut(pb):
+    """Returns a lookup to translate slugified folder names to their original, used for the breadcrumbs"""
+    folder_og_name_lut = {}
+    for file in pb.index.files.keys():
+        file_path = pb.index.files[file].path["markdown"]["file_relative_path"]
+        for el in file_path.as_posix().split("/")[:-1]:
+            slug_el = slugify(el)
+            if slug_el not in folder_og_name_lut:
+                folder_og_name_lut[slug_el] = el
+    return folder_og_name_lut
+
+
 def compile_rss_feed(pb):
     if not pb.gc("toggles/features/rss/enabled"):
         return
@@ -523,38 +656,60 @@ def export_user_files(pb):
         print("< EXPORTING USER FILES: Done")
 
 
-# @extra_info()
-def crawl_obsidian_notes_and_convert_to_markdown(fo: "FileObject", pb, log_level=1, iteration=0):
-    """This functions converts an obsidian note to a markdown file and calls itself on any local note links it finds in the page."""
-
-    # Don't parse if not parsable
-    if not fo.metadata["is_parsable_note"]:
+def precompress_output(pb):
+    """Writes a gzipped copy (<file>.gz) next to the text files in the html output folder, see config value precompress_output.
+    Copies are only written when they are older than their file, and copies of which the file was removed are removed as well.
+    """
+    if not (pb.gc("toggles/compile_html") and pb.gc("precompress_output/enabled")):
         return
 
-    if pb.gc("toggles/stdout_current_file", cached=True):
-        print(fo.path["note"]["file_absolute_path"].as_posix().encode("cp1252", errors="ignore"))
+    suffixes = tuple("." + x.lower() for x in pb.gc("precompress_output/suffixes"))
+    min_size = pb.gc("precompress_output/min_size")
 
-    # Convert note to markdown
-    # ------------------------------------------------------------------
-    # Create an object that handles a lot of the logic of parsing the page paths, content, etc
-    md = fo.load_markdown_page("note")
+    if verbose_enough("info", pb.verbosity):
+        print("> PRECOMPRESSING OUTPUT")
+
+    written = 0
+    for root, dirs, files in os.walk(pb.paths["html_output_folder"]):
+        names = set(files)
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith(".gz"):
+                # only remove copies that this function could have written
+                if name[:-3].lower().endswith(suffixes) and name[:-3] not in names:
+                    os.remove(path)
+                continue
+            if not name.lower().endswith(suffixes):
+                continue
+
+            stat = os.stat(path)
+            gz_path = path + ".gz"
+            if stat.st_size < min_size:
+                if os.path.exists(gz_path):
+                    os.remove(gz_path)
+                continue
+            if os.path.exists(gz_path) and os.stat(gz_path).st_mtime_ns >= stat.st_mtime_ns:
+                continue
+
+            with open(path, "rb") as f:
+                content = f.read()
+            with open(gz_path, "wb") as f:
+                f.write(gzip.compress(content, compresslevel=9, mtime=0))
+            written += 1
 
-    # The bulk of the conversion process happens here
-    md.ConvertObsidianPageToMarkdownPage()
+    if verbose_enough("info", pb.verbosity):
+        print(f"< PRECOMPRESSING OUTPUT: Done ({written} files compressed)")
 
-    # The frontmatter was stripped from the obsidian note prior to conversion
-    # Add yaml frontmatter back in
-    md.page = (frontmatter.dumps(frontmatter.Post("", **md.metadata))) + "\n" + md.page
 
-    # Save file
-    # ------------------------------------------------------------------
-    # Create folder if necessary
-    dst_path = fo.path["markdown"]["file_absolute_path"]
-    dst_path.parent.mkdir(parents=True, exist_ok=True)
+# @extra_info()
+def crawl_obsidian_notes_and_convert_to_markdown(fo: "FileObject", pb, log_level=1, iteration=0):
+    """This functions converts an obsidian note to a markdown file and calls itself on any local note links it finds in the page."""
 
-    # Write markdown to file
-    with open(dst_path, "w", encoding="utf-8") as f:
-        f.write(md.page)
+    # Convert note to markdown and write it to the markdown folder
+    # ------------------------------------------------------------------
+    md = convert_obsidian_note_to_markdown_and_export(fo, pb)
+    if md is None:
+        return
 
     # Recurse for every link in the current page
     # ------------------------------------------------------------------
@@ -564,7 +719,7 @@ def crawl_obsidian_notes_and_convert_to_markdown(fo: "FileObject", pb, log_level
         return
 
     # Don't follow links when the user tells us not to
-    if "obs.html.tags" in md.metadata.keys() and "leaf_note" in md.metadata["obs.html.tags"]:
+    if is_leaf_note(md):
         return
 
     for link_fo in md.links:
@@ -591,6 +746,47 @@ def crawl_obsidian_notes_and_convert_to_markdown(fo: "FileObject", pb, log_level
         pb.reset_state()
 
 
+def convert_obsidian_note_to_markdown_and_export(fo: "FileObject", pb):
+    """Converts a single obsidian note to a markdown file and writes it to the markdown folder.
+    Returns the MarkdownPage object, or None when the note is not parsable."""
+
+    # Don't parse if not parsable
+    if not fo.metadata["is_parsable_note"]:
+        return None
+
+    if pb.gc("toggles/stdout_current_file", cached=True):
+        print(fo.path["note"]["file_absolute_path"].as_posix().encode("cp1252", errors="ignore"))
+
+    # Convert note to markdown
+    # ------------------------------------------------------------------
+    # Create an object that handles a lot of the logic of parsing the page paths, content, etc
+    md = fo.load_markdown_page("note")
+
+    # The bulk of the conversion process happens here
+    md.ConvertObsidianPageToMarkdownPage()
+
+    # The frontmatter was stripped from the obsidian note prior to conversion
+    # Add yaml frontmatter back in
+    md.page = (frontmatter.dumps(frontmatter.Post("", **md.metadata))) + "\n" + md.page
+
+    # Save file
+    # ------------------------------------------------------------------
+    # Create folder if necessary
+    dst_path = fo.path["markdown"]["file_absolute_path"]
+    dst_path.parent.mkdir(parents=True, exist_ok=True)
+
+    # Write markdown to file
+    with open(dst_path, "w", encoding="utf-8") as f:
+        f.write(md.page)
+
+    return md
+
+
+def is_leaf_note(md):
+    """Leaf notes are converted, but the links inside of them are not followed."""
+    return "obs.html.tags" in md.metadata.keys() and "leaf_note" in md.metadata["obs.html.tags"]
+
+
 # @extra_info()
 def crawl_markdown_notes_and_convert_to_html(fo: "FileObject", pb, backlink_node=None, log_level=1, capture_in_jar=False):
     """This functions converts a markdown page to an html file and calls itself on any local markdown links it finds in the page."""
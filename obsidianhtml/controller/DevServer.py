@@ -0,0 +1,230 @@
+"""
+This file contains the dev server (`obsidianhtml dev`), which previews a vault without converting it first.
+
+On start, only the vault is indexed (the modules that list the files and parse the metadata, and Index). Notes are converted
+when they are requested for the first time, and the resulting html is kept in memory. The next request of the page only
+converts it again when the note, or a note that it includes, changed since. So the time until the first page shows up
+does not depend on the size of the vault.
+
+Everything that needs all notes to be converted is not available in dev mode: search, graph data, tag pages, the rss feed
+and post processing. Backlinks only list the notes that were rendered since the server started.
+"""
+
+import os
+import sys
+import shutil
+import threading
+import traceback
+from urllib.parse import urlparse, unquote
+
+from ..compiler.HTML import compile_navbar_links, create_folder_navigation_view
+from ..compiler.Templating import ExportStaticFiles
+from ..modules.lib import verbose_enough
+from .. import md2html
+
+from .ConvertVault import load_vault, add_not_created_page, render_page, get_folder_og_name_lut, convert_obsidian_note_to_markdown_and_export
+from .Serve import PooledHTTPServer, FileCache, get_handler_class
+
+
+class LazyRenderer:
+    """Renders the pages of the vault on request, and keeps them in memory until one of the files they were made from changes."""
+
+    def __init__(self, pb):
+        self.pb = pb
+        self.lock = threading.Lock()
+        # html relative path --> ({source path: (path of the copy that was read, mtime of the source when the page was rendered)}, html)
+        self.pages = {}
+
+        # The vault is read from a copy when copy_vault_to_tempdir is enabled, changed files are copied over before rendering
+        self.vault_folder = pb.paths["obsidian_folder"]
+        self.original_vault_folder = pb.paths.get("original_obsidian_folder", self.vault_folder)
+
+        self.prepare()
+
+    def prepare(self):
+        """Does what ConvertVault does before and in between converting the notes, as far as it does not need the notes to be converted."""
+        pb = self.pb
+        pb.render_on_request = True
+
+        compile_navbar_links(pb)
+        if pb.gc("toggles/compile_md"):
+            pb.paths["md_folder"].mkdir(parents=True, exist_ok=True)
+        add_not_created_page(pb)
+
+        create_folder_navigation_view(pb)
+        pb.index.compile_html_relpath_lookup_table()
+        self.folder_og_name_lut = get_folder_og_name_lut(pb)
+
+        ExportStaticFiles(pb)
+
+    def get_page(self, rel_path):
+        """Returns the html of the note with the given html path (relative to the html output folder), or None when there is no such note."""
+        fo = self.pb.index.fo_by_html_relpath.get(rel_path)
+        if fo is None or not fo.metadata["is_note"]:
+            return None
+
+        with self.lock:
+            cached = self.pages.get(rel_path)
+            if cached is not None and not self.update_sources(cached[0]):
+                return cached[1]
+
+            sources, html = self.render(fo)
+            self.pages[rel_path] = (sources, html)
+            return html
+
+    def copy_file(self, rel_path):
+        """Copies the file (that is not a note) with the given html path to the html output folder, when it is not there yet."""
+        fo = self.pb.index.fo_by_html_relpath.get(rel_path)
+        if fo is None or fo.metadata["is_note"] or fo.path["html"]["file_absolute_path"].exists():
+            return
+
+        with self.lock:
+            if self.pb.gc("toggles/compile_md", cached=True) and "note" in fo.path:
+                fo.copy_file("ntm")
+            fo.copy_file("mth")
+
+    def render(self, fo):
+        """Converts the note to html. Returns the mtimes of the files the page was made from, and the html."""
+        pb = self.pb
+
+        # note --> markdown
+        fo.processed_ntm = False
+        fo.processed_mth = False
+        includes = []
+        if pb.gc("toggles/compile_md", cached=True) and "note" in fo.path:
+            source = fo.path["note"]["file_absolute_path"]
+            pb.init_state(action="n2m", loop_type="note", current_fo=fo, subroutine="convert_obsidian_note_to_markdown_and_export")
+            md = convert_obsidian_note_to_markdown_and_export(fo, pb)
+            pb.reset_state()
+            if md is not None:
+                includes = [x for x in md.metadata.get("obs.html.data", {}).get("inclusion_references", []) if x in pb.index.files and "note" in pb.index.files[x].path]
+
+            # the markdown of included notes is read when adding the page to the graph
+            for key in includes:
+                pb.init_state(action="n2m", loop_type="note", current_fo=pb.index.files[key], subroutine="convert_obsidian_note_to_markdown_and_export")
+                convert_obsidian_note_to_markdown_and_export(pb.index.files[key], pb)
+                pb.reset_state()
+        else:
+            source = fo.path["markdown"]["file_absolute_path"]
+
+        # markdown --> html
+        pb.init_state(action="m2h", loop_type="md_note", current_fo=fo, subroutine="convert_markdown_page_to_html_and_export")
+        md2html.convert_markdown_page_to_html_and_export(fo, pb)
+        pb.reset_state()
+
+        html = render_page(pb, fo, self.folder_og_name_lut)
+        fo.page_record = None
+        if html is None:
+            html = ""
+
+        # the search data is not written in dev mode, don't let it grow with every render
+        pb.search.data.clear()
+
+        sources = {}
+        for path in [source] + [pb.index.files[x].path["note"]["file_absolute_path"] for x in includes]:
+            original = self.get_original_path(path)
+            sources[original] = (path, get_mtime(original))
+        return sources, html
+
+    def update_sources(self, sources):
+        """Returns whether any of the sources changed since the page was rendered, and copies the changed ones to the vault copy."""
+        changed = False
+        for original, (path, mtime) in sources.items():
+            if get_mtime(original) == mtime:
+                continue
+            changed = True
+            if path != original and original.exists():
+                shutil.copy2(original, path)
+        return changed
+
+    def get_original_path(self, path):
+        if self.vault_folder == self.original_vault_folder or not path.is_relative_to(self.vault_folder):
+            return path
+        return self.original_vault_folder.joinpath(path.relative_to(self.vault_folder))
+
+
+def get_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def DevServer(port=8888, workers=16):
+    """Indexes the vault, then serves it, rendering every note when it is requested. See LazyRenderer."""
+    # Get port/workers from commandline args if provided
+    for i, v in enumerate(sys.argv):
+        if v == "--port":
+            if len(sys.argv) < (i + 2):
+                print("No port given for dev.\n  Use `obsidianhtml dev --port 8654` to provide input.")
+                exit(1)
+            port = sys.argv[i + 1]
+
+        if v == "--workers":
+            if len(sys.argv) < (i + 2) or not sys.argv[i + 1].isdigit() or int(sys.argv[i + 1]) < 1:
+                print("No valid number of workers given for dev.\n  Use `obsidianhtml dev --workers 16` to provide input.")
+                exit(1)
+            workers = int(sys.argv[i + 1])
+
+    pb = load_vault()
+    if not pb.gc("toggles/compile_html"):
+        print("Config value toggles/compile_html should be enabled to use obsidianhtml dev.")
+        exit(1)
+    if pb.gc("toggles/relative_path_html"):
+        print("Config value toggles/relative_path_html is not supported by obsidianhtml dev, disable it in the config to use obsidianhtml dev.")
+        exit(1)
+
+    renderer = LazyRenderer(pb)
+    directory = pb.paths["html_output_folder"].as_posix()
+    html_url_prefix = pb.gc("html_url_prefix").rstrip("/")
+
+    # Notes are rendered by the renderer, everything else comes from the output folder (other files of the vault are copied there when they are requested)
+    class DevHandler(get_handler_class(directory, file_cache=FileCache(64 * 1024 * 1024))):
+        def do_GET(self):
+            if not self.send_page(head_only=False):
+                super().do_GET()
+
+        def do_HEAD(self):
+            if not self.send_page(head_only=True):
+                super().do_HEAD()
+
+        def send_page(self, head_only):
+            """Sends the note that the url points to. Returns False when the url does not point to a note."""
+            rel_path = unquote(urlparse(self.path).path)
+            if html_url_prefix != "":
+                if rel_path != html_url_prefix and not rel_path.startswith(html_url_prefix + "/"):
+                    return False
+                rel_path = rel_path[len(html_url_prefix) :]
+            rel_path = rel_path.lstrip("/")
+            if rel_path == "" or rel_path.endswith("/"):
+                rel_path += "index.html"
+
+            try:
+                html = renderer.get_page(rel_path)
+            except Exception as e:
+                traceback.print_exc()
+                self.send_error(500, f"Rendering {rel_path} failed: {e!r}")
+                return True
+            if html is None:
+                renderer.copy_file(rel_path)
+                return False
+
+            data = html.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            if not head_only:
+                self.wfile.write(data)
+            return True
+
+    print(f"OBSHTML: Started dev server at http://localhost:{port}{html_url_prefix}/ with {workers} workers (Ctrl+C to exit)", flush=True)
+    httpd = PooledHTTPServer(("", int(port)), DevHandler, workers)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        if verbose_enough("info", pb.verbosity):
+            print("\nOBSHTML: Stopped dev server", flush=True)
+    finally:
+        httpd.server_close()
@@ -0,0 +1,333 @@
+"""
+This file contains the code to spread the conversion of notes over a pool of worker processes.
+
+The workers are forked from the main process, so they inherit the fully loaded PicknickBasket (config, index, metadata, etc).
+Every worker converts the notes it is handed and writes the output files, but it does not change any state that the
+main process relies on. Instead, it returns its side effects (links found, metadata changes, files to copy),
+which are then merged back into the PicknickBasket by the main process, in the same order every run.
+"""
+
+import os
+import multiprocessing
+
+from ..features.Search import SearchHead
+from ..compiler.Templating import PageRecord
+from ..modules.lib import verbose_enough
+
+# Set in the main process right before the pool is created, the forked workers inherit it.
+_pb = None
+_keys_by_fo = None
+
+
+class TrackedMetadata(dict):
+    """Drop-in replacement for pb.metadata that records which entries are handed out.
+    MarkdownPage gets its metadata dict from pb.metadata and alters it in-place, this way we know which entries to send back.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.accessed = {}
+
+    def __getitem__(self, key):
+        self.accessed[key] = True
+        return super().__getitem__(key)
+
+    def pop_accessed(self):
+        accessed = {key: dict.__getitem__(self, key) for key in self.accessed}
+        self.accessed = {}
+        return accessed
+
+
+class DeferredSearchHead(SearchHead):
+    """Records the search entries that a page adds, so that the main process can add them in the correct order."""
+
+    def add_entry(self, entry, unique=False):
+        self.data.append((entry, unique))
+
+
+def get_worker_count(pb):
+    """Returns the number of processes to use, 1 means that no pool should be used."""
+    workers = pb.gc("workers", cached=True)
+    if not isinstance(workers, int) or workers < 0:
+        raise Exception(f"Config value workers should be a positive integer or 0, got: {workers}")
+    if workers == 0:
+        workers = os.cpu_count() or 1
+    if workers > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        if verbose_enough("warning", pb.verbosity):
+            print("\tWARNING: workers > 1 is not supported on this platform, falling back to converting notes in the main process.")
+        return 1
+    return workers
+
+
+def get_file_key(fo):
+    return _keys_by_fo[id(fo)]
+
+
+def start_pool(pb, workers):
+    """Creates the pool. Must be called after all the state that the workers need is loaded into pb."""
+    global _pb, _keys_by_fo
+    _pb = pb
+    _keys_by_fo = {id(fo): key for key, fo in pb.index.files.items()}
+    return multiprocessing.get_context("fork").Pool(workers, initializer=_init_worker)
+
+
+def _init_worker():
+    _pb.metadata = TrackedMetadata(_pb.metadata)
+    _pb.deferred_file_copies = []
+
+
+def _collect_deferred_file_copies(pb):
+    copies = [(get_file_key(fo), mode) for fo, mode in pb.deferred_file_copies]
+    pb.deferred_file_copies = []
+    return copies
+
+
+# NOTE -> MARKDOWN
+# ===============================================================================================
+def _convert_note_worker(key):
+    from .ConvertVault import convert_obsidian_note_to_markdown_and_export, is_leaf_note
+
+    pb = _pb
+    fo = pb.index.files[key]
+
+    pb.init_state(action="n2m", loop_type="note", current_fo=fo, subroutine="convert_obsidian_note_to_markdown_and_export")
+    md = convert_obsidian_note_to_markdown_and_export(fo, pb)
+    pb.reset_state()
+
+    result = {"key": key, "links": [], "leaf_note": False}
+    if md is not None:
+        result["links"] = [(get_file_key(lo) if lo is not False else False) for lo in md.links]
+        result["leaf_note"] = is_leaf_note(md)
+    result["metadata"] = pb.metadata.pop_accessed()
+    result["copies"] = _collect_deferred_file_copies(pb)
+    return result
+
+
+def convert_notes_to_markdown_parallel(pb, entrypoints, process_all, workers):
+    """Converts the same set of notes as the recursive crawl_obsidian_notes_and_convert_to_markdown() would, but
+    converts them in waves: all notes that are found in the previous wave are converted in parallel in the next wave.
+    """
+    files = pb.index.files
+    manifest = pb.build_manifest
+    pool = start_pool(pb, workers)
+    try:
+        converted = set()
+        file_copies = {}
+
+        def run_wave(keys):
+            # With incremental builds, notes that did not change reuse the result of the previous build
+            todo = keys if manifest is None else [key for key in keys if manifest.note_is_dirty(key)]
+            fresh = {}
+            if len(todo) > 0:
+                for result in pool.map(_convert_note_worker, todo, chunksize=max(1, len(todo) // (workers * 4))):
+                    fresh[result["key"]] = result
+            results = [(fresh[key] if key in fresh else manifest.get_note_record(key)) for key in keys]
+
+            for result in results:
+                converted.add(id(files[result["key"]]))
+                for key, metadata in result["metadata"].items():
+                    if key not in pb.metadata:
+                        pb.metadata[key] = metadata
+                    else:
+                        merge_metadata(pb.metadata[key], metadata)
+                for copy in result["copies"]:
+                    file_copies[tuple(copy)] = True
+                if manifest is not None:
+                    manifest.set_note_record(result, converted=(result["key"] in fresh))
+            return results
+
+        # Crawl the link tree, starting at the entrypoints
+        wave = [key for key in entrypoints if files[key].metadata["is_parsable_note"]]
+        while len(wave) > 0:
+            next_wave = []
+            for result in run_wave(wave):
+                if result["leaf_note"]:
+                    continue
+                for key in result["links"]:
+                    if key is False or files[key].processed_ntm is True:
+                        continue
+                    files[key].processed_ntm = True
+                    if files[key].metadata["is_parsable_note"]:
+                        next_wave.append(key)
+            wave = next_wave
+
+        # Convert all notes that were not reached via the entrypoints
+        if process_all:
+            wave = []
+            for key, fo in files.items():
+                if fo.processed_ntm is True or id(fo) in converted or not fo.metadata["is_parsable_note"]:
+                    continue
+                converted.add(id(fo))
+                wave.append(key)
+            if verbose_enough("info", pb.verbosity):
+                print(f"\t\tconverting {len(wave)} notes with {workers} workers")
+            run_wave(wave)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Copy the attachments that the workers encountered, every file only once
+    for key, mode in file_copies.keys():
+        if manifest is None or manifest.should_copy(files[key], mode):
+            files[key].copy_file(mode)
+
+    if manifest is not None:
+        manifest.remove_stale_outputs("notes")
+
+
+def merge_metadata(target, update):
+    """Merge the metadata changes made by a worker into the metadata of the main process.
+    Conversion only ever adds to the metadata (tags, inclusion references), so lists are unioned and dicts are merged.
+    """
+    for key, value in update.items():
+        if key not in target:
+            target[key] = value
+        elif isinstance(target[key], list) and isinstance(value, list):
+            for item in value:
+                if item not in target[key]:
+                    target[key].append(item)
+        elif isinstance(target[key], dict) and isinstance(value, dict):
+            merge_metadata(target[key], value)
+        else:
+            target[key] = value
+
+
+# MARKDOWN -> HTML
+# ===============================================================================================
+def _convert_markdown_page_worker(task):
+    from .. import md2html
+
+    key, capture_in_jar = task
+    pb = _pb
+    fo = pb.index.files[key]
+    pb.search = DeferredSearchHead()
+
+    pb.init_state(action="m2h", loop_type="md_note", current_fo=fo, subroutine="convert_markdown_page_to_html_and_export")
+    node, md_links = md2html.convert_markdown_page_to_html_and_export(fo, pb, capture_in_jar=capture_in_jar)
+    pb.reset_state()
+
+    pb.metadata.pop_accessed()
+
+    return {
+        "key": key,
+        "page_record": fo.page_record.to_dict(),
+        "links": [get_file_key(lo) for lo in md_links],
+        "search": pb.search.data,
+        "jar": pb.jars.pop(capture_in_jar, None) if capture_in_jar else None,
+        "copies": _collect_deferred_file_copies(pb),
+    }
+
+
+def convert_markdown_notes_to_html_parallel(pb, entrypoints, process_all, workers):
+    """Renders all pages that crawl_markdown_notes_and_convert_to_html() would render in a pool of worker processes.
+
+    The workers only render the html pages. Everything that ends up in shared output (graph.json, search data, tag pages) is
+    compiled afterwards in the main process, by walking through the pages in the same order as the serial crawl would.
+    This keeps node ids and the order of the graph, search and tag data identical to a serial build.
+
+    entrypoints is a list of (key, capture_in_jar) tuples, in the order in which they would be crawled.
+    """
+    files = pb.index.files
+    manifest = pb.build_manifest
+    records = {}
+    file_copies = {}
+
+    pool = start_pool(pb, workers)
+    try:
+
+        def run_wave(tasks):
+            # With incremental builds, pages that did not change reuse the result of the previous build
+            todo = tasks if manifest is None else [task for task in tasks if manifest.page_is_dirty(task[0])]
+            fresh = {}
+            if len(todo) > 0:
+                for result in pool.map(_convert_markdown_page_worker, todo, chunksize=max(1, len(todo) // (workers * 4))):
+                    fresh[result["key"]] = result
+            results = [(fresh[key] if key in fresh else manifest.get_page_record(key)) for key, _ in tasks]
+
+            for result in results:
+                fo = files[result["key"]]
+                if result["key"] in fresh:
+                    fo.page_record = PageRecord.from_dict(result.pop("page_record"))
+                else:
+                    fo.page_record = manifest.load_page_record(result["key"])
+                records[id(fo)] = result
+                for copy in result["copies"]:
+                    file_copies[tuple(copy)] = True
+                if manifest is not None:
+                    manifest.set_page_record(result, rendered=(result["key"] in fresh))
+            return results
+
+        def queue(wave, key, capture_in_jar=False):
+            fo = files[key]
+            if id(fo) in queued or not fo.metadata["is_parsable_note"]:
+                return
+            queued.add(id(fo))
+            wave.append((key, capture_in_jar))
+
+        # Render all pages that can be reached from the entrypoints
+        queued = set()
+        wave = []
+        for key, capture_in_jar in entrypoints:
+            queue(wave, key, capture_in_jar)
+        while len(wave) > 0:
+            next_wave = []
+            for result in run_wave(wave):
+                for key in result["links"]:
+                    if files[key].is_valid_note("markdown"):
+                        queue(next_wave, key)
+            wave = next_wave
+
+        # Render all other pages
+        if process_all:
+            wave = []
+            for key in files.keys():
+                queue(wave, key)
+            if verbose_enough("info", pb.verbosity):
+                print(f"\t\trendering {len(wave)} notes with {workers} workers")
+            run_wave(wave)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Copy the attachments that the workers encountered, every file only once
+    for key, mode in file_copies.keys():
+        if manifest is None or manifest.should_copy(files[key], mode):
+            files[key].copy_file(mode)
+
+    if manifest is not None:
+        manifest.remove_stale_outputs("pages")
+
+    # Compile the graph, search and tag data in the order of the serial crawl
+    for key, capture_in_jar in entrypoints:
+        _merge_markdown_page(pb, files[key], records, capture_in_jar=capture_in_jar)
+
+    if process_all:
+        unparsed = [x for x in files.values() if x.processed_mth is False]
+        for fo in unparsed:
+            _merge_markdown_page(pb, fo, records)
+
+
+def _merge_markdown_page(pb, fo, records, backlink_node=None, capture_in_jar=False):
+    """Mirrors crawl_markdown_notes_and_convert_to_html(), but takes the rendering results from records instead of rendering the page."""
+    from .. import md2html
+
+    if not fo.metadata["is_parsable_note"]:
+        return
+
+    node, md = md2html.add_markdown_page_to_network_tree(fo, pb, backlink_node)
+    if fo.processed_mth is True:
+        return
+    fo.processed_mth = True
+
+    record = records[id(fo)]
+    for entry, unique in record["search"]:
+        pb.search.add_entry(entry, unique)
+    md.AddToTagtree(pb.tagtree, fo.path["html"]["file_relative_path"].as_posix())
+    if capture_in_jar:
+        pb.jars[capture_in_jar] = record["jar"]
+
+    for key in record["links"]:
+        link_fo = pb.index.files[key]
+        if not link_fo.is_valid_note("markdown"):
+            continue
+        _merge_markdown_page(pb, link_fo, records, backlink_node=node, capture_in_jar=False)
@@ -1,15 +1,402 @@
+import io
 import os
 import sys
+import json
+import time
+import threading
 import http.server
-import socketserver
+import email.utils
 from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Defer tools
 from contextlib import ExitStack
 from functools import partial
 
 
-def ServeDir(port=8888, directory="./"):
+class PooledHTTPServer(http.server.HTTPServer):
+    """Handles connections on a fixed number of worker threads, so that a slow client or a large download does not block other requests.
+    Connections that come in while all workers are busy wait until a worker is free.
+    """
+
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, RequestHandlerClass, workers):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="obshtml_serve")
+        self.detached = set()
+        self.detached_lock = threading.Lock()
+        super().__init__(server_address, RequestHandlerClass)
+
+    def detach(self, request):
+        """Keeps the connection open after the request was handled, whoever it was handed to is responsible for closing it"""
+        with self.detached_lock:
+            self.detached.add(request)
+
+    def shutdown_request(self, request):
+        with self.detached_lock:
+            if request in self.detached:
+                self.detached.remove(request)
+                return
+        super().shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Files larger than this are always read from disk
+MAX_CACHED_FILE_SIZE = 1024 * 1024
+
+
+class FileCache:
+    """Least recently used file contents, up to max_size bytes in total.
+    Entries are stored with the (mtime, size) of the file, and are only used while the file still has the same (mtime, size).
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path, stat_key):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry[0] != stat_key:
+                return None
+            self.entries.move_to_end(path)
+            return entry[1]
+
+    def put(self, path, stat_key, data):
+        if len(data) > min(self.max_size, MAX_CACHED_FILE_SIZE):
+            return
+        with self.lock:
+            previous = self.entries.pop(path, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            self.entries[path] = (stat_key, data)
+            self.size += len(data)
+            while self.size > self.max_size:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+def accepts_gzip(accept_encoding):
+    """Whether the Accept-Encoding header allows gzip (and does not exclude it with q=0)"""
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            q = params.strip()
+            return not (q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"))
+    return False
+
+
+# Browsers subscribe to <html_url_prefix>/obs.html/live_reload, see config value toggles/features/live_reload
+LIVE_RELOAD_PATH = "/obs.html/live_reload"
+# Subscribers are sent a comment every so many seconds, so that closed connections are noticed
+LIVE_RELOAD_PING_INTERVAL = 15
+
+
+class LiveReload:
+    """Tells the browsers that subscribed to LIVE_RELOAD_PATH (server-sent events) which files changed after a build.
+
+    While there are subscribers, the served folder is scanned every interval seconds. When files changed and stopped changing
+    (the build is done), a "change" event is sent with the url paths of the files that changed, e.g. ["/notes/note.html", ...].
+    The connections of the subscribers are not handled by the workers of the server, but by the thread of this class.
+    """
+
+    def __init__(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        self.clients = []
+        self.lock = threading.Lock()
+        self.thread = None
+        self.snapshot = None
+
+    def subscribe(self, sock):
+        with self.lock:
+            self.clients.append(sock)
+            if self.thread is None:
+                self.snapshot = self.take_snapshot()
+                self.thread = threading.Thread(target=self.run, name="obshtml_live_reload", daemon=True)
+                self.thread.start()
+
+    def unsubscribe(self, sock):
+        with self.lock:
+            if sock in self.clients:
+                self.clients.remove(sock)
+        sock.close()
+
+    def take_snapshot(self):
+        snapshot = {}
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def run(self):
+        last_ping = time.time()
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if len(self.clients) == 0:
+                    # the next subscriber starts a new thread, with a new snapshot
+                    self.thread = None
+                    return
+
+            changes = self.take_snapshot()
+            if changes == self.snapshot:
+                if time.time() - last_ping > LIVE_RELOAD_PING_INTERVAL:
+                    self.publish(": ping\n\n")
+                    last_ping = time.time()
+                continue
+
+            # wait until the build stops writing
+            while True:
+                time.sleep(self.interval)
+                settled = self.take_snapshot()
+                if settled == changes:
+                    break
+                changes = settled
+
+            changed_paths = set(x[0] for x in set(changes.items()) ^ set(self.snapshot.items()))
+            self.snapshot = changes
+
+            # the .gz copies change along with their file
+            urls = set()
+            for path in changed_paths:
+                if path.endswith(".gz") and path[:-3] in changes:
+                    path = path[:-3]
+                urls.add("/" + Path(path).relative_to(self.directory).as_posix())
+            self.publish(f"event: change\ndata: {json.dumps(sorted(urls))}\n\n")
+
+    def publish(self, message):
+        data = message.encode("utf-8")
+        with self.lock:
+            clients = list(self.clients)
+        for sock in clients:
+            try:
+                sock.sendall(data)
+            except OSError:
+                self.unsubscribe(sock)
+
+
+def parse_range(header, size):
+    """Parses a Range header of a file of size bytes. Returns the first and last byte (inclusive) of the range,
+    None when the header should be ignored (other units, multiple ranges, invalid syntax), or False when the range is past the end of the file.
+    """
+    unit, _, value = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in value:
+        return None
+    first, sep, last = value.strip().partition("-")
+    if sep == "" or not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+        return None
+
+    # suffix range: the last <last> bytes
+    if first == "":
+        if last == "":
+            return None
+        if int(last) == 0 or size == 0:
+            return False
+        return (max(0, size - int(last)), size - 1)
+
+    first = int(first)
+    if last != "" and int(last) < first:
+        return None
+    if first >= size:
+        return False
+    return (first, min(int(last), size - 1) if last != "" else size - 1)
+
+
+def get_handler_class(directory, keep_alive=5.0, file_cache=None, live_reload=None):
+    """Returns the request handler that serves the files in directory, see ServeDir()"""
+
+    # We do this trickery so that we can set Handler.directory without having the init method overwrite our setting.
+    # (Handler.init() is called somewhere out of our control)
+    class BetterHandler(http.server.SimpleHTTPRequestHandler):
+        # With keep-alive, the browser reuses the connection for the assets of a page. Idle connections are closed after keep_alive
+        # seconds, as they hold on to a worker.
+        if keep_alive > 0:
+            protocol_version = "HTTP/1.1"
+            timeout = keep_alive
+
+        def __init__(self, *args, **kwargs):
+            if self.directory is None:
+                self.directory = os.getcwd()
+
+            self.directory = os.fspath(self.directory)
+            super(http.server.SimpleHTTPRequestHandler, self).__init__(*args, **kwargs)
+
+        def send_head(self):
+            """Sends the headers of a file and returns a file object with its contents, like SimpleHTTPRequestHandler.send_head(), but:
+
+            - the gzipped copy of the file (<file>.gz, see config value precompress_output) is sent when the client accepts it
+            - the response has an ETag and Last-Modified header, and requests of which the copy is still valid get a 304 response
+            - small files are kept in memory
+            - a single byte range can be requested with a Range header, for seeking in videos etc
+
+            The part of the file that do_GET() should send is stored in self.file_range.
+            """
+            self.file_range = (0, None)
+            path = self.translate_path(self.path)
+            if self.path.split("?", 1)[0].split("#", 1)[0].endswith("/") or not os.path.isfile(path):
+                # directories (redirects, index.html, listings) and missing files
+                return super().send_head()
+
+            ctype = self.guess_type(path)
+            stat = os.stat(path)
+            headers = {"Content-Type": ctype}
+
+            # Use the precompressed copy written by the build, unless it is older than the file
+            gz_path = path + ".gz"
+            if os.path.isfile(gz_path):
+                headers["Vary"] = "Accept-Encoding"
+                gz_stat = os.stat(gz_path)
+                # ranges are only served from the file itself
+                if gz_stat.st_mtime_ns >= stat.st_mtime_ns and "Range" not in self.headers and accepts_gzip(self.headers.get("Accept-Encoding", "")):
+                    path, stat = gz_path, gz_stat
+                    headers["Content-Encoding"] = "gzip"
+
+            # The browser has to check with us before using its copy, so that a rebuild is picked up right away
+            headers["ETag"] = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            headers["Last-Modified"] = self.date_time_string(stat.st_mtime)
+            headers["Cache-Control"] = "no-cache"
+            headers["Accept-Ranges"] = "bytes"
+
+            if self.is_not_modified(headers["ETag"], stat.st_mtime):
+                self.send_response(304)
+                for key, value in headers.items():
+                    if key != "Content-Type":
+                        self.send_header(key, value)
+                self.end_headers()
+                return None
+
+            stat_key = (stat.st_mtime_ns, stat.st_size)
+            data = file_cache.get(path, stat_key) if file_cache is not None else None
+            if data is None and file_cache is not None and stat.st_size <= MAX_CACHED_FILE_SIZE:
+                try:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                except OSError:
+                    self.send_error(http.HTTPStatus.NOT_FOUND, "File not found")
+                    return None
+                file_cache.put(path, stat_key, data)
+
+            if data is not None:
+                f = io.BytesIO(data)
+                length = len(data)
+            else:
+                try:
+                    f = open(path, "rb")
+                except OSError:
+                    self.send_error(http.HTTPStatus.NOT_FOUND, "File not found")
+                    return None
+                length = os.fstat(f.fileno()).st_size
+
+            # Only send the requested range, unless If-Range says that the client's copy of the file is outdated
+            byte_range = None
+            if "Range" in self.headers and self.headers.get("If-Range", headers["ETag"]) in (headers["ETag"], headers["Last-Modified"]):
+                byte_range = parse_range(self.headers["Range"], length)
+            if byte_range is False:
+                f.close()
+                self.send_response(http.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{length}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+
+            if byte_range is None:
+                self.send_response(200)
+            else:
+                first, last = byte_range
+                self.send_response(http.HTTPStatus.PARTIAL_CONTENT)
+                headers["Content-Range"] = f"bytes {first}-{last}/{length}"
+                length = last - first + 1
+                if data is not None:
+                    f = io.BytesIO(data[first : last + 1])
+                else:
+                    self.file_range = (first, length)
+
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(length))
+            self.end_headers()
+            return f
+
+        def do_GET(self):
+            """Files on disk are sent with socket.sendfile(), which lets the kernel copy the file to the socket (os.sendfile) where it is available"""
+            if live_reload is not None and self.path.split("?", 1)[0].endswith(LIVE_RELOAD_PATH):
+                return self.subscribe_live_reload()
+
+            f = self.send_head()
+            if f is None:
+                return
+            try:
+                if isinstance(f, io.BytesIO):
+                    self.copyfile(f, self.wfile)
+                else:
+                    offset, count = self.file_range
+                    self.connection.sendfile(f, offset, count)
+            finally:
+                f.close()
+
+        def subscribe_live_reload(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            # reconnect quickly when the server is restarted
+            self.wfile.write(b"retry: 2000\n\n")
+
+            # the connection is handed over to live_reload, so that it does not hold on to a worker
+            self.close_connection = True
+            self.connection.settimeout(5)
+            self.server.detach(self.connection)
+            live_reload.subscribe(self.connection)
+
+        def is_not_modified(self, etag, mtime):
+            if "If-None-Match" in self.headers:
+                tags = [x.strip() for x in self.headers["If-None-Match"].split(",")]
+                return etag in tags or "*" in tags
+            if "If-Modified-Since" in self.headers:
+                try:
+                    since = email.utils.parsedate_to_datetime(self.headers["If-Modified-Since"])
+                except (TypeError, ValueError, IndexError, OverflowError):
+                    return False
+                if since is None or since.tzinfo is None:
+                    return False
+                return int(mtime) <= since.timestamp()
+            return False
+
+    Handler = BetterHandler
+    Handler.directory = Path(directory).resolve().as_posix()
+    Handler.extensions_map.update(
+        {
+            ".js": "application/javascript",
+        }
+    )
+    return Handler
+
+
+def ServeDir(port=8888, directory="./", workers=16, keep_alive=5.0, cache_size=64, live_reload_interval=1.0):
     # Get directory/port from commandline args if provided
     if len(sys.argv) > 2:
         if sys.argv[1] == "serve":
@@ -26,35 +413,47 @@ def ServeDir(port=8888, directory="./"):
                         exit(1)
                     port = sys.argv[i + 1]
 
+                if v == "--workers":
+                    if len(sys.argv) < (i + 2) or not sys.argv[i + 1].isdigit() or int(sys.argv[i + 1]) < 1:
+                        print("No valid number of workers given for serve.\n  Use `obsidianhtml serve --workers 16` to provide input.")
+                        exit(1)
+                    workers = int(sys.argv[i + 1])
+
+                if v == "--keep-alive":
+                    try:
+                        keep_alive = float(sys.argv[i + 1])
+                    except (IndexError, ValueError):
+                        print("No valid keep-alive timeout given for serve.\n  Use `obsidianhtml serve --keep-alive 5` to provide input, or `--keep-alive 0` to disable keep-alive.")
+                        exit(1)
+
+                if v == "--cache-size":
+                    if len(sys.argv) < (i + 2) or not sys.argv[i + 1].isdigit():
+                        print("No valid cache size given for serve.\n  Use `obsidianhtml serve --cache-size 64` to keep up to 64 MB of files in memory, or `--cache-size 0` to disable the cache.")
+                        exit(1)
+                    cache_size = int(sys.argv[i + 1])
+
+                if v == "--live-reload":
+                    try:
+                        live_reload_interval = float(sys.argv[i + 1])
+                    except (IndexError, ValueError):
+                        print("No valid live reload interval given for serve.\n  Use `obsidianhtml serve --live-reload 1` to check for changed files every second, or `--live-reload 0` to disable live reloading.")
+                        exit(1)
+
     if not Path(directory).resolve().exists():
         print(f"Configured directory of {directory} does not exist.")
         exit(1)
 
-    # We do this trickery so that we can set Handler.directory without having the init method overwrite our setting.
-    # (Handler.init() is called somewhere out of our control)
-    class BetterHandler(http.server.SimpleHTTPRequestHandler):
-        def __init__(self, *args, **kwargs):
-            if self.directory is None:
-                self.directory = os.getcwd()
-
-            self.directory = os.fspath(self.directory)
-            super(http.server.SimpleHTTPRequestHandler, self).__init__(*args, **kwargs)
-
     # configure server
-    Handler = BetterHandler
-    Handler.directory = Path(directory).resolve().as_posix()
-    Handler.extensions_map.update(
-        {
-            ".js": "application/javascript",
-        }
-    )
+    file_cache = FileCache(cache_size * 1024 * 1024) if cache_size > 0 else None
+    live_reload = LiveReload(Path(directory).resolve().as_posix(), live_reload_interval) if live_reload_interval > 0 else None
+    Handler = get_handler_class(directory, keep_alive=keep_alive, file_cache=file_cache, live_reload=live_reload)
 
     # start server
     print(
-        f"OBSHTML: Started webserver at http://localhost:{port}/ hosting from {Path(directory).resolve().as_posix()} (Ctrl+C to exit)",
+        f"OBSHTML: Started webserver at http://localhost:{port}/ hosting from {Path(directory).resolve().as_posix()} with {workers} workers (Ctrl+C to exit)",
         flush=True,
     )
-    httpd = socketserver.TCPServer(("", int(port)), Handler)
+    httpd = PooledHTTPServer(("", int(port)), Handler, workers)
 
     with ExitStack() as stack:
         stack.callback(partial(httpd.server_close))
@@ -0,0 +1,223 @@
+import os
+import sys
+import copy
+import time
+import shutil
+
+from pathlib import Path
+
+from ..lib import CreateStaticFilesFolders
+from ..core.ConfigManager import Config
+from ..compiler.HTML import create_foldable_tag_lists_html
+from ..features.SidePane import get_html_page_content
+from ..features.add_toc_when_missing import gc_add_toc_when_missing
+from ..features.CreateIndexFromDirStructure import CreateIndexFromDirStructure
+from ..modules.builtin.parse_metadata import ParseMetadataModule
+
+from .ConvertVault import load_vault, convert_vault
+
+
+class WarmVault:
+    """Keeps the vault loaded in between builds.
+
+    When only the content of notes changed, the next build reuses the PicknickBasket of the previous build (with the Index and the
+    link resolution caches of FileFinder): the changed notes are copied to the vault copy, the results of the previous build are
+    reset, and the build manifest only converts the dirty notes again. All other changes (files that were added or removed, changed
+    attachments, config or templates, or changed metadata, which can change which files are included) load the vault from scratch.
+    """
+
+    def __init__(self):
+        self.pb = None
+        self.broken = True  # set while building, a build that failed halfway is followed by a cold build
+        self.cold_build()
+
+    def rebuild(self, changed_paths):
+        """Builds the vault again. Returns whether the loaded vault could be reused."""
+        keys = self.get_changed_notes(changed_paths)
+        if keys is None:
+            self.cold_build()
+            return False
+        self.warm_build(keys)
+        return True
+
+    def cold_build(self):
+        previous_manifest = self.pb.build_manifest if self.pb is not None else None
+        self.broken = True
+        clear_build_caches()
+
+        pb = load_vault()
+        self.pb = pb
+
+        # The build alters the config, paths, metadata and file tree, keep the state as it is after loading for the next build
+        self.config = copy.deepcopy(pb.config)
+        self.paths = dict(pb.paths)
+        self.metadata = copy.deepcopy(pb.metadata)
+        self.files = dict(pb.index.files)
+
+        # The source of every file (in the vault that is watched) --> key of the file
+        self.keys_by_source = {}
+        for key, fo in self.files.items():
+            self.keys_by_source[self.get_original_path(self.get_source_path(fo)).as_posix()] = key
+
+        convert_vault(pb, previous_manifest=previous_manifest)
+        self.broken = False
+
+    def warm_build(self, keys):
+        pb = self.pb
+        self.broken = True
+        clear_build_caches()
+
+        # Copy the changed notes to the vault copy
+        for key in keys:
+            fo = self.files[key]
+            source = self.get_source_path(fo)
+            original = self.get_original_path(source)
+            if original != source:
+                shutil.copyfile(original, source)
+            fo.compile_metadata(source)
+
+        # Drop the files that the previous build added (e.g. not_created.md), the build adds them again
+        files = pb.index.files
+        added = [key for key, fo in files.items() if self.files.get(key) is not fo]
+        files.clear()
+        files.update(self.files)
+        pb.FileFinder.remove_paths(added)
+        pb.FileFinder.invalidate_paths(keys)
+
+        pb.config = copy.deepcopy(self.config)
+        pb.paths = dict(self.paths)
+        pb.metadata = copy.deepcopy(self.metadata)
+        pb.reset_build_state()
+
+        convert_vault(pb, previous_manifest=pb.build_manifest)
+        self.broken = False
+
+    def get_changed_notes(self, changed_paths):
+        """Returns the keys of the notes that changed, or None when the changes can not be handled by a warm build."""
+        pb = self.pb
+        if self.broken or pb.build_manifest is None:
+            return None
+
+        keys = []
+        for path in changed_paths:
+            key = self.keys_by_source.get(Path(path).as_posix())
+            if key is None or not os.path.exists(path) or not self.files[key].metadata["is_parsable_note"]:
+                return None
+
+            metadata_key = Path(path).relative_to(pb.paths["original_input_folder"]).as_posix()
+            if metadata_key not in self.metadata:
+                return None
+            if normalize_metadata(ParseMetadataModule.read_metadata(path)) != normalize_metadata(self.metadata[metadata_key]):
+                return None
+            keys.append(key)
+        return keys
+
+    def get_source_path(self, fo):
+        if "note" in fo.path:
+            return fo.path["note"]["file_absolute_path"]
+        return fo.path["markdown"]["file_absolute_path"]
+
+    def get_original_path(self, path):
+        """The vault is read from a copy when copy_vault_to_tempdir is enabled, this returns the path of the file in the vault itself."""
+        vault_folder = self.paths["obsidian_folder"]
+        original_vault_folder = self.paths.get("original_obsidian_folder", vault_folder)
+        if vault_folder == original_vault_folder or not path.is_relative_to(vault_folder):
+            return path
+        return original_vault_folder.joinpath(path.relative_to(vault_folder))
+
+
+def normalize_metadata(metadata):
+    return {**metadata, "tags": sorted(str(tag) for tag in metadata.get("tags") or [])}
+
+
+def Watch(interval=1.0, debounce=0.5):
+    """Converts the vault, then keeps watching the input folder, and does an incremental build whenever files change."""
+    # Get interval/debounce from commandline args if provided
+    for i, v in enumerate(sys.argv):
+        if v in ("--interval", "--debounce"):
+            if len(sys.argv) < (i + 2):
+                print(f"No value given for {v}.\n  Use `obsidianhtml watch {v} 0.5` to provide input.")
+                exit(1)
+            try:
+                value = float(sys.argv[i + 1])
+            except ValueError:
+                print(f"Value of {v} should be a number of seconds, got {sys.argv[i + 1]}.")
+                exit(1)
+            if v == "--interval":
+                interval = value
+            else:
+                debounce = value
+
+    vault = WarmVault()
+    snapshot = take_snapshot(vault.pb)
+
+    print(f"\nOBSHTML: Watching {vault.pb.paths['original_input_folder'].as_posix()} for changes (Ctrl+C to exit)", flush=True)
+    try:
+        while True:
+            time.sleep(interval)
+            changes = take_snapshot(vault.pb)
+            if changes == snapshot:
+                continue
+
+            # Editors often save a file in multiple steps, wait until the input folder stops changing
+            while True:
+                time.sleep(debounce)
+                settled = take_snapshot(vault.pb)
+                if settled == changes:
+                    break
+                changes = settled
+
+            changed_paths = sorted(set(x[0] for x in set(changes.items()) ^ set(snapshot.items())))
+            print(f"\nOBSHTML: {len(changed_paths)} file(s) changed, rebuilding", flush=True)
+            snapshot = changes
+
+            start = time.time()
+            try:
+                warm = vault.rebuild(changed_paths)
+            except (Exception, SystemExit) as e:
+                # Keep watching, a half-saved note should not end the session. The next build will pick up where this one failed.
+                print(f"OBSHTML: Build failed: {e!r}", flush=True)
+                continue
+            print(f"OBSHTML: Rebuilt in {time.time() - start:.2f}s ({'reused' if warm else 'reloaded'} the vault)", flush=True)
+    except KeyboardInterrupt:
+        print("\nOBSHTML: Stopped watching", flush=True)
+
+
+def take_snapshot(pb):
+    """Returns the size and modification time of every file in the input folder, skipping hidden folders (.obsidian, .git, etc) and the output folders."""
+    input_folder = pb.paths["original_input_folder"]
+    skip = [pb.paths["html_output_folder"].as_posix()]
+    if pb.gc("toggles/compile_md"):
+        skip.append(pb.paths["md_folder"].as_posix())
+
+    snapshot = {}
+    for root, dirs, files in os.walk(input_folder):
+        dirs[:] = [x for x in dirs if not x.startswith(".") and os.path.join(root, x) not in skip]
+        for name in files:
+            if name.startswith("."):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def clear_build_caches():
+    """Some functions cache their results for the duration of a build. Clear them so that the next build starts fresh,
+    and so that the objects of previous builds can be garbage collected.
+    """
+    for func in (
+        CreateStaticFilesFolders,
+        create_foldable_tag_lists_html,
+        get_html_page_content,
+        gc_add_toc_when_missing,
+        Config._get_config_cached,
+        Config._feature_is_enabled_cached,
+        Config.ShowIcon,
+        CreateIndexFromDirStructure.check_has_folder_note,
+        CreateIndexFromDirStructure.BuildProtoIndex,
+    ):
+        func.cache_clear()
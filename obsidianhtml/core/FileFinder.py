@@ -1,22 +1,133 @@
-from functools import cache
-import uuid
+from collections import OrderedDict
 
 from ..lib import bisect
 
+MISSING = object()
+
+
+class ResolutionCache:
+    """Least recently used cache for the results of FileFinder.
+
+    Every entry records which suffixes (see FileFinder.update_suffix_index) were looked up to compute it.
+    When a file is added, only the entries that looked up one of the suffixes of the new path are invalidated.
+    """
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # key --> (value, lookups)
+        self.dependents = {}  # lookup --> set of keys
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key, MISSING)
+        if entry is MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, lookups):
+        self.remove(key)
+        self.entries[key] = (value, lookups)
+        for lookup in lookups:
+            if lookup not in self.dependents:
+                self.dependents[lookup] = set()
+            self.dependents[lookup].add(key)
+
+        if len(self.entries) > self.maxsize:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key):
+        entry = self.entries.pop(key, MISSING)
+        if entry is MISSING:
+            return False
+        for lookup in entry[1]:
+            keys = self.dependents[lookup]
+            keys.discard(key)
+            if len(keys) == 0:
+                del self.dependents[lookup]
+        return True
+
+    def invalidate(self, lookups):
+        for lookup in lookups:
+            for key in list(self.dependents.get(lookup, ())):
+                if self.remove(key):
+                    self.invalidations += 1
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.dependents = {}
+
+    def get_stats(self):
+        return f"{self.name}: {len(self.entries)}/{self.maxsize} entries, {self.hits} hits, {self.misses} misses, {self.evictions} evictions, {self.invalidations} invalidations"
+
 
 class FileFinder:
     def __init__(self):
-        self.cache_id=1
+        # suffix index, see update_suffix_index()
+        self.indexed_files = None
+        self.indexed_paths = set()
+        self.suffix_index = {}
+
+        # resolution caches, see cached()
+        self.caches = None
+        self.lookups = None
+
+    def init_caches(self, pb):
+        if self.caches is not None:
+            return
+        size = pb.gc("resolution_cache_size", cached=True)
+        if not isinstance(size, int) or size < 1:
+            raise Exception(f"Config value resolution_cache_size should be a positive integer, got: {size}")
+        self.caches = {name: ResolutionCache(name, size) for name in ("GetObsidianFilePath", "FindFile", "GetNodeId")}
 
     def invalidate_cache(self):
-        self.cache_id=uuid.uuid1()
+        """Empties the resolution caches. Not needed when files are added, see update_suffix_index()."""
+        if self.caches is not None:
+            for resolution_cache in self.caches.values():
+                resolution_cache.clear()
+
+    def get_cache_stats(self):
+        if self.caches is None:
+            return []
+        return [x.get_stats() for x in self.caches.values()]
+
+    def cached(self, pb, name, key, compute):
+        """Returns the cached result for key, or computes it and caches it together with the suffixes that were looked up while computing it."""
+        self.init_caches(pb)
+        self.update_suffix_index(pb.index.files)
+
+        resolution_cache = self.caches[name]
+        result = resolution_cache.get(key, MISSING)
+        if result is not MISSING:
+            return result
+
+        self.lookups = set()
+        try:
+            result = compute()
+            resolution_cache.put(key, result, self.lookups)
+        finally:
+            self.lookups = None
+        return result
+
+    def record_lookup(self, link):
+        if self.lookups is not None:
+            self.lookups.add(link)
 
     def GetObsidianFilePath(self, link, pb):
         self.files = pb.index.files
-        return self._GetObsidianFilePath(link, pb.gc("html_url_prefix"), pb.gc("toggles/force_filename_to_lowercase", cached=True), cache_id=self.cache_id)
+        html_url_prefix = pb.gc("html_url_prefix")
+        force_filename_to_lowercase = pb.gc("toggles/force_filename_to_lowercase", cached=True)
+        key = (link, html_url_prefix, force_filename_to_lowercase)
+        return self.cached(pb, "GetObsidianFilePath", key, lambda: self._GetObsidianFilePath(*key))
 
-    @cache
-    def _GetObsidianFilePath(self, link, html_url_prefix, force_filename_to_lowercase, cache_id):
+    def _GetObsidianFilePath(self, link, html_url_prefix, force_filename_to_lowercase):
         # a link can look like this: folder/note#chapter|alias
         # then link=folder/note, alias=alias, header=chapter
         # the link will be converted to a path that is relative to the root dir.
@@ -40,23 +151,23 @@ class FileFinder:
             return output
 
         # Find file. Values will be False when file is not found.
-        output["rtr_path_str"], output["fo"] = self._FindFile(simple_path, html_url_prefix, force_filename_to_lowercase, cache_id=self.cache_id)
+        output["rtr_path_str"], output["fo"] = self._FindFile(simple_path, html_url_prefix, force_filename_to_lowercase)
 
         if output["fo"] is False and simple_path.startswith("/"):
-            output["rtr_path_str"], output["fo"] = self._FindFile(simple_path[1:], html_url_prefix, force_filename_to_lowercase, cache_id=self.cache_id)
+            output["rtr_path_str"], output["fo"] = self._FindFile(simple_path[1:], html_url_prefix, force_filename_to_lowercase)
 
         if output["fo"] is False and not simple_path.startswith("/"):
-            output["rtr_path_str"], output["fo"] = self._FindFile("/" + simple_path, html_url_prefix, force_filename_to_lowercase, cache_id=self.cache_id)
+            output["rtr_path_str"], output["fo"] = self._FindFile("/" + simple_path, html_url_prefix, force_filename_to_lowercase)
 
         return output
 
     # will return (False, False) if not found, (str:url, fo:file_object) when found
     def FindFile(self, link, pb):
         self.files = pb.index.files
-        return self._FindFile(link, pb.gc("html_url_prefix"), pb.gc("toggles/force_filename_to_lowercase", cached=True), cache_id=self.cache_id)
+        key = (link, pb.gc("html_url_prefix"), pb.gc("toggles/force_filename_to_lowercase", cached=True))
+        return self.cached(pb, "FindFile", key, lambda: self._FindFile(*key))
 
-    @cache
-    def _FindFile(self, link, html_url_prefix, force_filename_to_lowercase, cache_id):
+    def _FindFile(self, link, html_url_prefix, force_filename_to_lowercase):
         files = self.files
         olink = link
         search = False
@@ -100,6 +211,7 @@ class FileFinder:
                 print("f", link)
 
             # return immediately if exact link is found in the array
+            self.record_lookup(link)
             if link in files.keys():
                 return (link, files[link])
 
@@ -144,48 +256,71 @@ class FileFinder:
         return result
 
     def GetMatches(self, files, link, cached=True):
+        """Returns all paths in files of which the tail parts are equal to link, e.g. 'folder/note.md' matches 'a/folder/note.md'.
+        The paths are returned in the order of files.
+        """
         self.files = files
-        return self._GetMatches(link, cache_id=self.cache_id)
-
-    @cache
-    def _GetMatches(self, link, cache_id):
-        files = self.files
-        search = False
-        prevtrue = False
-        # if 'Test Pages/textfile.txt' in link:
-        #     search = True
+        self.update_suffix_index(files)
+        self.record_lookup(link)
+        return list(self.suffix_index.get(link, []))
+
+    def update_suffix_index(self, files):
+        """Adds the paths that were added to files since the last call to the suffix index.
+        During a build, files are only ever added to pb.index.files (e.g. not_created.md), so comparing the number of files is enough to know
+        whether the index is up to date. Paths that are removed between builds are removed with remove_paths().
+        """
+        if files is not self.indexed_files:
+            self.indexed_files = files
+            self.indexed_paths = set()
+            self.suffix_index = {}
+            self.invalidate_cache()
+
+        if len(self.indexed_paths) == len(files):
+            return
 
-        # find all links that match the tail part
-        url_parts = link.split("/")
-        matches = []
         for rel_path in files.keys():
-            parts = rel_path.split("/")
-            if len(url_parts) > len(parts):
+            if rel_path in self.indexed_paths:
                 continue
-
-            match = True
-            for i in range(1, len(url_parts) + 1):
-                if url_parts[-i] != parts[-i]:
-                    match = False
-
-                    if prevtrue:
-                        print("false", f'"{url_parts[-i]}" "{parts[-i]}"')
-                        prevtrue = False
-                    break
-                else:
-                    if search:
-                        print("true", parts[-i])
-                        prevtrue = True
-            if match:
-                matches.append(rel_path)
-        return matches
+            self.indexed_paths.add(rel_path)
+
+            # index the path under every tail: note.md, folder/note.md, root/folder/note.md
+            suffixes = get_suffixes(rel_path)
+            for suffix in suffixes:
+                if suffix not in self.suffix_index:
+                    self.suffix_index[suffix] = []
+                self.suffix_index[suffix].append(rel_path)
+
+            # only the results that looked up one of these suffixes can change
+            if self.caches is not None:
+                for resolution_cache in self.caches.values():
+                    resolution_cache.invalidate(suffixes)
+
+    def remove_paths(self, rel_paths):
+        """Removes paths that were removed from pb.index.files from the suffix index, and invalidates the results that looked them up."""
+        for rel_path in rel_paths:
+            if rel_path not in self.indexed_paths:
+                continue
+            self.indexed_paths.remove(rel_path)
+            for suffix in get_suffixes(rel_path):
+                self.suffix_index[suffix].remove(rel_path)
+                if len(self.suffix_index[suffix]) == 0:
+                    del self.suffix_index[suffix]
+        self.invalidate_paths(rel_paths)
+
+    def invalidate_paths(self, rel_paths):
+        """Invalidates the results that looked up one of the suffixes of the paths, e.g. because their FileObject was replaced."""
+        if self.caches is None:
+            return
+        for rel_path in rel_paths:
+            for resolution_cache in self.caches.values():
+                resolution_cache.invalidate(get_suffixes(rel_path))
 
     def GetNodeId(self, pb, link):
         self.files = pb.index.files
-        return self._GetNodeId(link, pb.gc("toggles/force_filename_to_lowercase", cached=True), cache_id=self.cache_id)
+        key = (link, pb.gc("toggles/force_filename_to_lowercase", cached=True))
+        return self.cached(pb, "GetNodeId", key, lambda: self._GetNodeId(*key))
 
-    @cache
-    def _GetNodeId(self, link, force_filename_to_lowercase, cache_id):
+    def _GetNodeId(self, link, force_filename_to_lowercase):
         files = self.files
 
         # set link to lowercase
@@ -221,3 +356,9 @@ class FileFinder:
             return node_id
 
         raise Exception(f"No unique node id found for {link}")
+
+
+def get_suffixes(rel_path):
+    """Returns every tail of the path: note.md, folder/note.md, root/folder/note.md"""
+    parts = rel_path.split("/")
+    return ["/".join(parts[-i:]) for i in range(1, len(parts) + 1)]
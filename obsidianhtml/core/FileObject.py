@@ -45,6 +45,7 @@ class FileObject:
 
     processed_ntm = False  # whether the note has already been processed in the note --> markdown flow
     processed_mth = False  # whether the note has already been processed in the markdown --> html flow
+    page_record = None  # PageRecord with the rendered page, kept until the page is written in the second pass
 
     def __init__(self, pb):
         self.pb = pb
@@ -57,6 +58,14 @@ class FileObject:
         # So the default values need to be set here.
         self.metadata["is_entrypoint"] = False
 
+    def reset_build_state(self):
+        """Forgets what the previous build did with the file, so that the next build can reuse this FileObject (see Watch)."""
+        self.md = None
+        self.node = None
+        self.processed_ntm = False
+        self.processed_mth = False
+        self.page_record = None
+
     def load_markdown_page(self, input_type):
         self.md = MarkdownPage(self, input_type)
         return self.md
@@ -276,6 +285,11 @@ class FileObject:
         self.link["html"]["relative"] = prefix + "/" + self.path["html"]["file_relative_path"].as_posix()
 
     def copy_file(self, mode):
+        # when converting in a worker process, the copy is handed back to the main process instead
+        if self.pb.deferred_file_copies is not None:
+            self.pb.deferred_file_copies.append((self, mode))
+            return
+
         if mode == "ntm":
             src_file_path = self.path["note"]["file_absolute_path"]
             dst_file_path = self.path["markdown"]["file_absolute_path"]
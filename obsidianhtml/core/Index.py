@@ -23,6 +23,12 @@ class Index:
         self.init_file_tree()
         self.import_files_into_file_tree()
 
+    def reset_build_state(self):
+        """Forgets the results of the previous build, the files stay loaded (see Watch)."""
+        self.network_tree = NetworkTree(self)
+        for fo in self.files.values():
+            fo.reset_build_state()
+
     def init_file_tree(self):
         """This method sets up everything needed for the file tree. It does not yet load the files into the file tree"""
         self.files = {}  # contains every file exactly once (currently twice in the case of the index file)
@@ -1,4 +1,5 @@
 import json
+import shutil
 from datetime import date
 from ..lib import slugify_path
 
@@ -19,12 +20,17 @@ class NetworkTree:
         self.pb = index.pb
 
         self.tree = {"nodes": [], "links": []}
-        self.node_lookup = {}
+        self.node_lookup = {}  # id --> node, kept up to date by add_node()
         self.node_lookup_slug = {}
+        self.link_lookup = {}  # (source, target) --> link, kept up to date by AddLink()
+        self.backlink_lookup = {}  # target --> links to the target, in the order in which they were added
 
         self.node_graph = None
         self.node_graph_lookup = None
 
+        self.metadata_fields = None  # see get_metadata_fields()
+        self.metadata_fields_compiled = False
+
     # TYPES
     # ===============================================================================================
     def NewNode(self):
@@ -44,8 +50,8 @@ class NetworkTree:
         # Get simple dict template
         node = pb.index.network_tree.NewNode()
 
-        # add all metadata to node, so we can access it later when we need to, once compilation of html is complete
-        node["metadata"] = md.metadata.copy()
+        # add metadata to node, so we can access it later when we need to, once compilation of html is complete
+        node["metadata"] = self.project_metadata(md.metadata)
 
         # Use filename as node id, unless 'graph_name' is set in the yaml frontmatter
         node["id"] = pb.FileFinder.GetNodeId(pb, md.fo.path["markdown"]["file_relative_path"].as_posix())
@@ -72,18 +78,20 @@ class NetworkTree:
         if self.pb.verbose:
             print("Received node", node_obj)
         # Skip if already present
-        for node in self.tree["nodes"]:
-            if node["id"] == node_obj["id"]:
-                node["metadata"] = node_obj["metadata"].copy()
-                if self.pb.verbose:
-                    print("Node already present")
-                return
+        node = self.node_lookup.get(node_obj["id"])
+        if node is not None:
+            node["metadata"] = node_obj["metadata"]
+            if self.pb.verbose:
+                print("Node already present")
+            return
 
         # Add node
         self.nid_inc += 1
         node_obj["nid"] = self.nid_inc
 
         self.tree["nodes"].append(node_obj)
+        self.node_lookup[node_obj["id"]] = node_obj
+        self.node_lookup_slug[slugify_path(node_obj["id"])] = node_obj
         if self.pb.verbose:
             print("Node added")
 
@@ -91,29 +99,92 @@ class NetworkTree:
         if self.pb.verbose:
             print("Received link", link_obj)
         # Skip if already present
-        for link in self.tree["links"]:
-            if link["source"] == link_obj["source"] and link["target"] == link_obj["target"]:
-                if self.pb.verbose:
-                    print("Link already present")
-                return
+        key = (link_obj["source"], link_obj["target"])
+        if key in self.link_lookup:
+            if self.pb.verbose:
+                print("Link already present")
+            return
 
         # Add link
         self.tree["links"].append(link_obj)
+        self.link_lookup[key] = link_obj
+        if link_obj["target"] not in self.backlink_lookup:
+            self.backlink_lookup[link_obj["target"]] = []
+        self.backlink_lookup[link_obj["target"]].append(link_obj)
         if self.pb.verbose:
             print("Link added")
 
     def OutputJson(self):
         """the graph.json"""
-        tree = StringifyDateRecurse(self.tree.copy())
-        return json.dumps(tree)
+        return GraphJsonEncoder().encode(self.tree)
+
+    def WriteJson(self, path):
+        """Writes the graph.json to path, one node/link at a time, instead of building the whole string in memory first.
+        The output is the same as that of OutputJson().
+        """
+        encoder = GraphJsonEncoder()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{")
+            for i, (key, items) in enumerate(self.tree.items()):
+                f.write(f"{', ' if i > 0 else ''}{encoder.encode(key)}: [")
+                for j, item in enumerate(items):
+                    if j > 0:
+                        f.write(", ")
+                    f.write(encoder.encode(item))
+                f.write("]")
+            f.write("}")
 
     # METHODS
     # ===============================================================================================
+    def get_metadata_fields(self):
+        """Returns the set of metadata keys to keep in the nodes, or None to keep all of them (see config value graph_metadata_fields).
+        The tags, the obs.html settings of the note (e.g. disable_dir_nav, see load_dirtree_footer.js) and the keys that the rss feature
+        selects on are always kept, because they are read back from the nodes.
+        """
+        if self.metadata_fields_compiled:
+            return self.metadata_fields
+
+        pb = self.pb
+        fields = pb.gc("graph_metadata_fields")
+        if not isinstance(fields, list):
+            raise Exception(f"Config value graph_metadata_fields should be a list of metadata keys, got: {fields}")
+        self.metadata_fields_compiled = True
+        if "*" in fields:
+            return None
+
+        fields = set(fields)
+        fields.add("tags")
+        fields.add("obs.html")
+        if pb.gc("toggles/features/rss/enabled"):
+            selectors = [pb.gc("toggles/features/rss/items/selector/match_keys"), pb.gc("toggles/features/rss/items/selector/exclude_keys")]
+            for name in ("description", "title", "publish_date"):
+                selectors += pb.gc(f"toggles/features/rss/items/{name}/selectors")
+            for selector in selectors:
+                if selector and selector[0] in ("yaml", "yaml_strip"):
+                    fields.add(selector[1].split(":")[0])
+
+        self.metadata_fields = fields
+        return fields
+
+    def project_metadata(self, metadata):
+        """Returns a copy of the metadata of a note, with only the keys that are configured to end up in the graph.json"""
+        fields = self.get_metadata_fields()
+        if fields is None:
+            return metadata.copy()
+        return {key: value for key, value in metadata.items() if key in fields}
+
     def compile_node_lookup(self):
+        """add_node() keeps the lookups up to date, this is only needed when nodes are added to self.tree directly"""
+        self.node_lookup = {}
+        self.node_lookup_slug = {}
         for n in self.tree["nodes"]:
             self.node_lookup[n["id"]] = n
             self.node_lookup_slug[slugify_path(n["id"])] = n
 
+    def get_backlinks(self, node_id):
+        """Returns the links that point to the node, in the same order as in the graph.json"""
+        return self.backlink_lookup.get(node_id, [])
+
     def AddCrosslinks(self):
         for link in self.tree["links"]:
             src = self.node_lookup[link["source"]]
@@ -128,6 +199,47 @@ class NetworkTree:
         for node in self.tree["nodes"]:
             node["links"] = list(dict.fromkeys(node["links"]))
 
+    def WriteGraphShards(self, folder):
+        """Writes a node table (nodes.json, node id --> nid) and the neighborhood of every node (<nid>.json) to folder.
+        The graphs on the note pages only load the neighborhood of the note, instead of the full graph.json.
+        Must be called after AddCrosslinks().
+        """
+        if folder.exists():
+            shutil.rmtree(folder)
+        folder.mkdir(parents=True, exist_ok=True)
+
+        with open(folder.joinpath("nodes.json"), "w", encoding="utf-8") as f:
+            f.write(json.dumps({node["id"]: node["nid"] for node in self.tree["nodes"]}))
+
+        for node in self.tree["nodes"]:
+            with open(folder.joinpath(f'{node["nid"]}.json'), "w", encoding="utf-8") as f:
+                f.write(json.dumps(self.get_neighborhood(node)))
+
+    def get_neighborhood(self, node):
+        """Returns the node, the nodes it links to or is linked from, and the links between them, in the format of graph.json.
+        Nodes are stripped down to what the graphers use.
+        """
+        neighbors = [x for x in node["links"] if x != node["id"]]
+
+        links = []
+        if (node["id"], node["id"]) in self.link_lookup:
+            links.append(self.link_lookup[(node["id"], node["id"])])
+        for neighbor in neighbors:
+            for key in ((node["id"], neighbor), (neighbor, node["id"])):
+                if key in self.link_lookup:
+                    links.append(self.link_lookup[key])
+
+        nodes = [self.get_shard_node(node, neighbors)]
+        for neighbor in neighbors:
+            nodes.append(self.get_shard_node(self.node_lookup[neighbor], [node["id"]]))
+
+        return {"nodes": nodes, "links": links}
+
+    def get_shard_node(self, node, links):
+        shard_node = {key: node[key] for key in ("id", "nid", "group", "name", "url", "rtr_url", "x", "y", "z") if key in node}
+        shard_node["links"] = links
+        return shard_node
+
     def CompileNoteGraphDataStructure(self):
         d = {"id": "", "title": "", "linkTo": None, "referencedBy": None}
         note_lookup = {}
@@ -141,36 +253,25 @@ class NetworkTree:
             note_graph.append(di)
             note_lookup[node["id"]] = di
 
+        # links are unique per (source, target), see AddLink(), so no duplicates can end up in linkTo/referencedBy
         for link in self.tree["links"]:
             src = note_lookup[link["source"]]
             dst = note_lookup[link["target"]]
-            if src["id"] not in dst["referencedBy"]:
-                dst["referencedBy"].append(src["id"])
-            if dst["id"] not in src["linkTo"]:
-                src["linkTo"].append(dst["id"])
+            dst["referencedBy"].append(src["id"])
+            src["linkTo"].append(dst["id"])
 
         self.node_graph = note_graph
         self.node_graph_lookup = note_lookup
 
     def OutputNodeGraphJson(self):
         """the graph.json"""
-        node_graph = StringifyDateRecurse(self.node_graph.copy())
-        return json.dumps(node_graph)
-
-
-def StringifyDateRecurse(tree):
-    """We can't convert a date type to json, so we have to manually convert any dates in the tree to isoformatted date strings"""
-    if isinstance(tree, dict):
-        for key, value in tree.items():
-            if isinstance(value, date):
-                tree[key] = value.isoformat()
-            elif isinstance(value, list) or isinstance(value, dict):
-                tree[key] = StringifyDateRecurse(value)
-    if isinstance(tree, list):
-        for key, value in enumerate(tree):
-            if isinstance(value, date):
-                tree[key] = value.isoformat()
-            elif isinstance(value, list) or isinstance(value, dict):
-                tree[key] = StringifyDateRecurse(value)
-
-    return tree
+        return GraphJsonEncoder().encode(self.node_graph)
+
+
+class GraphJsonEncoder(json.JSONEncoder):
+    """Json encoder that writes dates (and datetimes) in the frontmatter as isoformatted date strings"""
+
+    def default(self, o):
+        if isinstance(o, date):
+            return o.isoformat()
+        return super().default(o)
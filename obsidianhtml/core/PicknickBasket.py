@@ -23,6 +23,9 @@ class PicknickBasket:
     jars = None  # dict with contents to store for later, see it as a cache
     user_config_dict = None  # fill with a dict to circumvent loading input yaml
     module_data_folder = None  # integration with new control flow based on modules
+    deferred_file_copies = None  # set to a list to have FileObject.copy_file() queue copies instead of executing them (used by worker processes)
+    build_manifest = None  # BuildManifest of the previous build, only set when incremental_build is enabled
+    render_on_request = False  # set by `obsidianhtml dev`, where files are only written when they are requested (see DevServer)
 
     def __init__(self):
         self.tagtree = {"notes": [], "subtags": {}}
@@ -33,6 +36,7 @@ class PicknickBasket:
         self.FileFinder = FileFinder()
         self.ConfigManager = Config(self)
         self.plugin_settings = {"embedded_note_titles": {}}  # <- does nothing at the moment, should be factored out
+        self.compiled_templates = {}  # see Templating.CompileTemplate()
 
         # State should be updated whenever we start a new type of operation.
         # When doing an operation by looping through notes, set loop_type to 'note', for links within a note 'note_link', if not in a loop-type operation, set to None.
@@ -41,6 +45,14 @@ class PicknickBasket:
         self.state = {}
         self.reset_state()
 
+    def reset_build_state(self):
+        """Forgets the results of the previous build, so that the next build can reuse the loaded vault (see Watch)."""
+        self.tagtree = {"notes": [], "subtags": {}}
+        self.jars = {}
+        self.search = SearchHead()
+        self.treeobj = None
+        self.index.reset_build_state()
+
     def reset_state(self):
         self.state["action"] = "Unknown"
         self.state["main_function"] = None
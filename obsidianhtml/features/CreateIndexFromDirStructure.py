@@ -22,6 +22,7 @@ class CreateIndexFromDirStructure:
         self.exclude_subfolders = pb.gc("toggles/features/create_index_from_dir_structure/exclude_subfolders")
         self.exclude_files = pb.gc("toggles/features/create_index_from_dir_structure/exclude_files")
         self.build_exclude_list()
+        self.compile_pending_pages()
 
         self.tree = self.get_tree(path)
         self.tree = self.build_tree_recurse(self.tree)
@@ -78,10 +79,29 @@ class CreateIndexFromDirStructure:
         # move back to OG cwd
         os.chdir(owd)
 
+    def compile_pending_pages(self):
+        """Pages are only written at the end of the second pass, so the tree is built from the files on disk plus the pages that are still to be written.
+        In dev mode, all files are still to be written.
+        """
+        self.pending_children = {}
+        root = self.root.resolve()
+        for fo in self.pb.index.files.values():
+            if fo.page_record is None and not self.pb.render_on_request:
+                continue
+            path = fo.path["html"]["file_absolute_path"].resolve()
+            while path != root and path.is_relative_to(root):
+                self.pending_children.setdefault(path.parent.as_posix(), set()).add(path)
+                path = path.parent
+
+    def path_exists(self, path):
+        path = Path(path).resolve()
+        return path.exists() or path in self.pending_children.get(path.parent.as_posix(), ())
+
     def build_tree_recurse(self, tree):
         verbose = self.verbose
 
-        for path in Path(tree["path"]).resolve().glob("*"):
+        tree_path = Path(tree["path"]).resolve()
+        for path in set(tree_path.glob("*")) | self.pending_children.get(tree_path.as_posix(), set()):
             # Exclude configured subfolders
             _continue = False
             for folder in self.exclude_subfolders_str:
@@ -95,7 +115,7 @@ class CreateIndexFromDirStructure:
                 continue
 
             # for dir: create a subtree
-            if path.is_dir():
+            if path.is_dir() or path.as_posix() in self.pending_children:
                 new_branch = self.build_tree_recurse(self.get_tree(path))
                 tree["folders"].append(new_branch)
                 continue
@@ -182,7 +202,7 @@ class CreateIndexFromDirStructure:
             name = f"{settings['naming']}.html"
 
         abs_path = note_folder_abs_path.joinpath(name)
-        return (abs_path.exists(), abs_path)
+        return (self.path_exists(abs_path), abs_path)
 
     def check_is_folder_note(self, note_abs_path):
         settings = self.pb.gc("toggles/features/folder_notes", cached=True)
@@ -206,7 +226,7 @@ class CreateIndexFromDirStructure:
                     return True
             elif settings["placement"] == "outside folder":
                 folder_path = note_abs_path.parent.joinpath(note_stem).resolve()
-                return folder_path.exists()
+                return self.path_exists(folder_path)
 
         raise Exception("Unexpected escape from elif fence in check_is_folder_note()")
 
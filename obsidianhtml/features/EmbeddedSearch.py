@@ -2,9 +2,13 @@ import os
 import sys
 import json
 import gzip
-import shutil
+import hashlib
+import threading
+import http.server
+import socketserver
 
 from pathlib import Path
+from urllib.parse import urlparse, parse_qs
 
 from whoosh import index
 from whoosh.qparser import MultifieldParser, OrGroup
@@ -13,9 +17,9 @@ from whoosh import fields
 from ..lib import print_global_help_and_exit, get_obshtml_appdir_folder_path
 
 
-def InitWhoosh(index_dir):
-    schema = fields.Schema(
-        id=fields.ID(stored=True),
+def GetSchema():
+    return fields.Schema(
+        id=fields.ID(stored=True, unique=True),
         path=fields.TEXT(stored=True),
         file=fields.TEXT(stored=True),
         title=fields.TEXT(stored=True),
@@ -24,21 +28,60 @@ def InitWhoosh(index_dir):
         tags_keyword=fields.KEYWORD(stored=True),
     )
 
-    if not os.path.exists(index_dir):
-        Path(index_dir).resolve().mkdir(parents=True, exist_ok=True)
 
+def GetIndexFolder(key):
+    """Every vault (or search data file) gets its own index in the appdir, so that the index can be reused by the next build,
+    and so that builds of different vaults don't overwrite each other's index.
+    """
+    index_id = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return get_obshtml_appdir_folder_path().joinpath("search_index", index_id)
+
+
+def InitWhoosh(index_dir):
+    """Opens the index in index_dir, or creates it when it does not exist yet (or was created with another schema)"""
+    schema = GetSchema()
+    index_dir = Path(index_dir).resolve()
+    index_dir.mkdir(parents=True, exist_ok=True)
+
+    if index.exists_in(index_dir):
+        ix = index.open_dir(index_dir)
+        if ix.schema.names() == schema.names():
+            return (ix, schema)
+
+    # the new index is empty, so it no longer matches the search data that the old index was loaded with (see EmbeddedSearch)
+    index_dir.joinpath("search_data_hash").unlink(missing_ok=True)
     ix = index.create_in(index_dir, schema)
-    ix = index.open_dir(index_dir)
-    writer = ix.writer()
+    return (ix, schema)
+
 
-    return (ix, schema, writer)
+def HashDocument(doc):
+    return hashlib.sha1(json.dumps(doc, sort_keys=True).encode("utf-8")).hexdigest()
 
 
-def LoadSearchDataIntoWhoosh(writer, search_data):
-    # add data to whoosh
-    for i, doc in enumerate(search_data):
+def LoadSearchDataIntoWhoosh(ix, search_data):
+    """Updates the index to match search_data. Documents are keyed by their hash, so only documents that were added, changed or
+    removed since the last update are written.
+    """
+    docs = {HashDocument(doc): doc for doc in search_data}
+
+    with ix.searcher() as searcher:
+        # The lexicon still holds the ids of deleted documents until their segment is merged, so check that the document is live
+        indexed = set(x.decode("utf-8") for x in searcher.lexicon("id"))
+        indexed = set(x for x in indexed if searcher.document_number(id=x) is not None)
+
+    removed = indexed - docs.keys()
+    added = [x for x in docs.keys() if x not in indexed]
+    if len(removed) == 0 and len(added) == 0:
+        return search_data
+
+    # wait for other processes that are updating the same index
+    writer = ix.writer(timeout=60)
+    for doc_id in removed:
+        writer.delete_by_term("id", doc_id)
+    for doc_id in added:
+        doc = docs[doc_id]
         subset = {
-            "id": str(i),
+            "id": doc_id,
             "path": doc["path"],
             "file": doc["file"],
             "title": doc["title"],
@@ -53,21 +96,16 @@ def LoadSearchDataIntoWhoosh(writer, search_data):
 
 
 def GetSearchData(path_str):
+    if path_str.endswith(".gzip"):
+        with gzip.open(path_str, "rt", encoding="utf-8") as f:
+            return json.loads(f.read())
     with open(path_str, "r", encoding="utf-8") as f:
         return json.loads(f.read())
 
 
-def UnzipSearchData(zip_path):
-    appdir = get_obshtml_appdir_folder_path()
-    appdir.mkdir(parents=True, exist_ok=True)
-    searchdata_path = appdir.joinpath("search.json")
-
-    # unzip
-    with gzip.open(zip_path, "rb") as f_in:
-        with open(searchdata_path, "wb") as f_out:
-            shutil.copyfileobj(f_in, f_out)
-
-    return searchdata_path
+def HashFile(path_str):
+    with open(path_str, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
 
 
 def ConvertObsidianQueryToWhooshQuery(user_query):
@@ -128,32 +166,53 @@ def PostProcessParse(qp, obj, normalize=True, debug=False):
 
 
 class EmbeddedSearch:
-    def __init__(self, json_data=None, search_data_path=None):
-        index_dir = "/tmp/obs/index"
+    """Searches the search data with Whoosh. The index is kept in index_dir, and is only updated when the search data changed."""
+
+    def __init__(self, index_dir, json_data=None, search_data_path=None):
         search_data = None
+        search_data_path_str = None
 
+        if json_data is None and search_data_path is None:
+            raise Exception("EmbeddedSearch requires either json_data or search_data_path.")
         if search_data_path is not None:
-            search_data_unzipped_path_str = search_data_path.resolve().as_posix()
-            search_data = GetSearchData(search_data_unzipped_path_str)
+            search_data_path_str = search_data_path.resolve().as_posix()
+            search_data_hash = HashFile(search_data_path_str)
         if json_data is not None:
-            search_data = json.loads(json_data)
+            search_data_hash = hashlib.sha1(json_data.encode("utf-8")).hexdigest()
 
         # create setup whoosh search
-        self.ix, self.schema, self.writer = InitWhoosh(index_dir)
+        self.ix, self.schema = InitWhoosh(index_dir)
 
-        # load docs
-        LoadSearchDataIntoWhoosh(self.writer, search_data)
+        # load docs, unless the index was last updated with the same search data
+        hash_path = Path(index_dir).joinpath("search_data_hash")
+        if hash_path.exists() and hash_path.read_text() == search_data_hash:
+            return
 
-    def search(self, user_query):
-        output = []
+        if search_data_path_str is not None:
+            search_data = GetSearchData(search_data_path_str)
+        if json_data is not None:
+            search_data = json.loads(json_data)
+        LoadSearchDataIntoWhoosh(self.ix, search_data)
+        hash_path.write_text(search_data_hash)
 
-        # convert user query to a format that we can use
-        clean_query = ConvertObsidianQueryToWhooshQuery(user_query)
+    def search(self, user_query):
+        return self.search_many([user_query])[user_query]
 
+    def search_many(self, user_queries):
+        """Runs the queries in a single searcher session, returns {user_query: results}"""
         # create query parser
         fields = ["content", "title", "path", "file", "tags", "tags_keyword"]
         qp = MultifieldParser(fields, schema=self.ix.schema, group=OrGroup)
 
+        with self.ix.searcher() as searcher:
+            return {user_query: self.run_query(searcher, qp, user_query) for user_query in user_queries}
+
+    def run_query(self, searcher, qp, user_query):
+        output = []
+
+        # convert user query to a format that we can use
+        clean_query = ConvertObsidianQueryToWhooshQuery(user_query)
+
         # parse query into query object
         qo = RemoveKeywordPhrasesFromCleanQuery(qp, clean_query)
 
@@ -161,29 +220,28 @@ class EmbeddedSearch:
             # parse function expectedly failed, don't return any search results
             return []
 
-        with self.ix.searcher() as searcher:
-            results = searcher.search(qo, limit=20)
-            print("-" * 35, len(results), "-" * 35)
-
-            for doc in results:
-                output.append(
-                    {
-                        "id": doc["id"],
-                        "title": doc["title"],
-                        "path": doc["path"],
-                        "file": doc["file"],
-                        "content": doc["content"],
-                        "tags": doc["tags"],
-                        "matches": {
-                            "content": [x for x in doc.highlights("content", top=5).split("...") if x != ""],
-                            "tags": SplitTags(doc.highlights("tags", top=10)),
-                            "tags_keyword": SplitTags(doc.highlights("tags_keyword", top=10)),
-                            "path": doc.highlights("path"),
-                        },
-                    }
-                )
-
-            return output
+        results = searcher.search(qo, limit=20)
+        print("-" * 35, len(results), "-" * 35)
+
+        for doc in results:
+            output.append(
+                {
+                    "id": doc["id"],
+                    "title": doc["title"],
+                    "path": doc["path"],
+                    "file": doc["file"],
+                    "content": doc["content"],
+                    "tags": doc["tags"],
+                    "matches": {
+                        "content": [x for x in doc.highlights("content", top=5).split("...") if x != ""],
+                        "tags": SplitTags(doc.highlights("tags", top=10)),
+                        "tags_keyword": SplitTags(doc.highlights("tags_keyword", top=10)),
+                        "path": doc.highlights("path"),
+                    },
+                }
+            )
+
+        return output
 
 
 def SplitTags(tags_string):
@@ -224,13 +282,134 @@ def SplitTags(tags_string):
     return chunks
 
 
+class SearchService:
+    """Keeps the index of a search data file open for `obsidianhtml search --serve`, and reloads it when the search data file changes
+    (e.g. because the vault was built again, which changes pb.gzip_hash along with the file).
+    """
+
+    def __init__(self, search_data_path):
+        self.search_data_path = search_data_path
+        self.index_dir = GetIndexFolder(search_data_path.as_posix())
+        self.lock = threading.Lock()
+        self.stat = None
+        self.esearch = None
+        self.reload()
+
+    def get_stat(self):
+        stat = os.stat(self.search_data_path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def reload(self):
+        # the stat is taken first, so that a change during the reload causes another reload
+        stat = self.get_stat()
+        self.esearch = EmbeddedSearch(self.index_dir, search_data_path=self.search_data_path)
+        self.stat = stat
+
+    def get_search(self):
+        """Returns the EmbeddedSearch to use, reloading it first when the search data file changed"""
+        with self.lock:
+            try:
+                if self.get_stat() != self.stat:
+                    print(f"OBSHTML: {self.search_data_path} changed, reloading", flush=True)
+                    self.reload()
+            except Exception as e:
+                # the file is probably still being written by a build, keep using the previous index and try again on the next request
+                print(f"OBSHTML: Reloading the search data failed, using the previous index: {e!r}", flush=True)
+            return self.esearch
+
+
+def ServeEmbeddedSearch(service, port=8889, socket_path=None):
+    """Answers queries over http, on a local port or on a unix socket. Every request is handled in its own thread.
+
+    - GET /search?q=<query>[&q=<query>...]
+    - POST /search with body {"queries": [<query>, ...]}
+
+    Both return {"results": {<query>: [<result>, ...]}}, the results are the same as those of EmbeddedSearch.search().
+    """
+
+    class SearchHandler(http.server.BaseHTTPRequestHandler):
+        # keep the connection open, clients tend to send many queries in a row
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/search":
+                return self.send_json(404, {"error": "Unknown path, use /search?q=<query>"})
+            self.search(parse_qs(url.query).get("q", []))
+
+        def do_POST(self):
+            # read the body first, otherwise it is taken for the next request on the connection
+            try:
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            except ValueError:
+                # without the length of the body, the next request can not be found either
+                self.close_connection = True
+                return self.send_json(400, {"error": "Invalid Content-Length"})
+            if urlparse(self.path).path != "/search":
+                return self.send_json(404, {"error": "Unknown path, use /search"})
+            try:
+                body = json.loads(body)
+                queries = body["queries"]
+                if not isinstance(queries, list) or not all(isinstance(x, str) for x in queries):
+                    raise TypeError("queries should be a list of strings")
+            except (ValueError, KeyError, TypeError):
+                return self.send_json(400, {"error": 'Body should be json of the form {"queries": [<query>, ...]}'})
+            self.search(queries)
+
+        def search(self, queries):
+            if len(queries) == 0:
+                return self.send_json(400, {"error": "No query given"})
+            self.send_json(200, {"results": service.get_search().search_many(queries)})
+
+        def send_json(self, status, data):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self):
+            # unix sockets have no client address
+            return self.client_address[0] if self.client_address else socket_path
+
+    if socket_path is not None:
+
+        class UnixSearchServer(socketserver.ThreadingUnixStreamServer):
+            daemon_threads = True
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixSearchServer(socket_path, SearchHandler)
+        print(f"OBSHTML: Serving search queries on unix socket {socket_path} (Ctrl+C to exit)", flush=True)
+    else:
+        server = http.server.ThreadingHTTPServer(("localhost", int(port)), SearchHandler)
+        print(f"OBSHTML: Serving search queries at http://localhost:{port}/search?q=<query> (Ctrl+C to exit)", flush=True)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nOBSHTML: Stopped serving search queries", flush=True)
+    finally:
+        server.server_close()
+        if socket_path is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
 def CliEmbeddedSearch():
     # input
     query_string = None
     search_json_gzip_path = None
     search_data_path = None
+    serve_address = None
 
     for i, v in enumerate(sys.argv):
+        if v == "--serve":
+            if len(sys.argv) < (i + 2):
+                print("No port or socket path given.\n  Use `obsidianhtml search --serve 8889` or `obsidianhtml search --serve /tmp/obshtml_search.sock` to provide input.")
+                print_global_help_and_exit(1)
+            serve_address = sys.argv[i + 1]
+
         if v == "-q":
             if len(sys.argv) < (i + 2):
                 print('No query string given.\n  Use `obsidianhtml search -q "test"` to provide input.')
@@ -249,24 +428,31 @@ def CliEmbeddedSearch():
                 print_global_help_and_exit(1)
             search_data_path = sys.argv[i + 1]
 
-    if search_data_path is not None:
-        print(f"Searching notes @ {search_data_path}")
-        search_data_path = Path(search_data_path).resolve()
-    elif search_json_gzip_path is not None:
-        print(f"Searching notes @ {search_json_gzip_path}")
-        search_data_path = UnzipSearchData(search_json_gzip_path)
-        print(f"Unzipped search.json.gzip to {search_data_path}")
+    if search_data_path is None and search_json_gzip_path is not None:
+        search_data_path = search_json_gzip_path
 
     if search_data_path is None:
         print("Error: no search data configured. Quitting. Use -d to provide a path to a search.json file, or -z to provide a path to a search.json.gzip file.")
         print_global_help_and_exit(1)
 
+    if serve_address is not None:
+        search_data_path = Path(search_data_path).resolve()
+        print(f"Searching notes @ {search_data_path}")
+        service = SearchService(search_data_path)
+        if serve_address.isdigit():
+            ServeEmbeddedSearch(service, port=serve_address)
+        else:
+            ServeEmbeddedSearch(service, socket_path=serve_address)
+        return
+
     if query_string is None:
         print('No query string given.\n  Use `obsidianhtml search -q "test"` to provide input.')
         print_global_help_and_exit(1)
 
-    # Init search
-    esearch = EmbeddedSearch(search_data_path)
+    # Init search, the index of previous searches on the same file is reused
+    print(f"Searching notes @ {search_data_path}")
+    search_data_path = Path(search_data_path).resolve()
+    esearch = EmbeddedSearch(GetIndexFolder(search_data_path.as_posix()), search_data_path=search_data_path)
 
     # Search
     print(f"Query: '{query_string}'")
@@ -0,0 +1,171 @@
+"""
+This file contains the build time layout of the graph (see config value toggles/features/graph/precompute_layout).
+
+The graphers run a force simulation in the browser to position the nodes, which takes a while for large vaults, and
+ends up different on every load. Here, the same simulation is run once at build time, and the resulting positions are
+written to the nodes (x, y and z), so that the graphers can show the settled graph right away.
+
+The forces mirror the defaults of force-graph/d3-force (link, many-body with the configured coalesce_force, and center),
+so the layout looks the same as the one the browser would produce.
+The many-body force is computed exactly for small graphs. For large graphs, the nodes are binned in a grid, and every node
+is pushed away by the center of mass of every cell instead of by every other node (similar to Barnes-Hut, but flat).
+"""
+
+# numpy is only imported when the layout is computed, see compute_graph_layout()
+np = None
+
+from ..modules.lib import verbose_enough
+
+# Same as the defaults of d3-force
+LINK_DISTANCE = 30
+VELOCITY_DECAY = 0.4
+ALPHA_MIN = 0.001
+
+# Graphs with more nodes than this use the grid approximation for the many-body force
+EXACT_MANY_BODY_MAX_NODES = 1000
+# Maximum number of grid cells, bounds the time per iteration to nodes x MAX_CELLS
+MAX_CELLS = 1024
+# Number of nodes of which the forces are computed at the same time, bounds the memory use to CHUNK_SIZE x nodes/cells
+CHUNK_SIZE = 256
+
+
+def compute_graph_layout(pb):
+    """Sets x, y (and z) on every node in the network tree. Must be called after AddCrosslinks()."""
+    global np
+    try:
+        import numpy as np
+    except ImportError:
+        raise Exception("Config value toggles/features/graph/precompute_layout/enabled requires numpy. Install it with `pip install numpy`, or disable the setting.")
+
+    dimensions = pb.gc("toggles/features/graph/precompute_layout/dimensions")
+    iterations = pb.gc("toggles/features/graph/precompute_layout/iterations")
+    if dimensions not in (2, 3):
+        raise Exception(f"Config value toggles/features/graph/precompute_layout/dimensions should be 2 or 3, got: {dimensions}")
+    if not isinstance(iterations, int) or iterations < 1:
+        raise Exception(f"Config value toggles/features/graph/precompute_layout/iterations should be a positive integer, got: {iterations}")
+    strength = float(pb.gc("toggles/features/graph/coalesce_force"))
+
+    tree = pb.index.network_tree.tree
+    nodes = tree["nodes"]
+    if len(nodes) == 0:
+        return
+
+    if verbose_enough("info", pb.verbosity):
+        print(f"\t> Computing the layout of the graph ({len(nodes)} nodes, {iterations} iterations)")
+
+    index = {node["id"]: i for i, node in enumerate(nodes)}
+    sources = np.array([index[link["source"]] for link in tree["links"]], dtype=np.int64)
+    targets = np.array([index[link["target"]] for link in tree["links"]], dtype=np.int64)
+
+    positions = initial_positions(len(nodes), dimensions)
+    velocities = np.zeros_like(positions)
+    link_force = LinkForce(len(nodes), sources, targets)
+
+    alpha = 1.0
+    alpha_decay = 1 - ALPHA_MIN ** (1 / iterations)
+    for _ in range(iterations):
+        alpha += (0 - alpha) * alpha_decay
+
+        link_force.apply(positions, velocities, alpha)
+        apply_many_body_force(positions, velocities, strength * alpha)
+
+        velocities *= 1 - VELOCITY_DECAY
+        positions += velocities
+
+        # center force
+        positions -= positions.mean(axis=0)
+
+    for i, node in enumerate(nodes):
+        for axis, key in enumerate("xyz"[:dimensions]):
+            node[key] = round(float(positions[i, axis]), 2)
+
+
+def initial_positions(n, dimensions):
+    """Phyllotaxis arrangement, same as d3-force(-3d) uses for nodes without a position"""
+    i = np.arange(n, dtype=np.float64)
+    radius = 10 * np.cbrt(0.5 + i) if dimensions == 3 else 10 * np.sqrt(0.5 + i)
+    angle = i * np.pi * (3 - np.sqrt(5))
+    if dimensions == 2:
+        return np.stack([radius * np.cos(angle), radius * np.sin(angle)], axis=1)
+
+    roll_angle = i * np.pi * 20 / (9 + np.sqrt(221))
+    return np.stack([radius * np.sin(angle) * np.cos(roll_angle), radius * np.cos(angle), radius * np.sin(angle) * np.sin(roll_angle)], axis=1)
+
+
+class LinkForce:
+    """Pulls linked nodes towards LINK_DISTANCE, weighted by the number of links of both nodes, like d3.forceLink()"""
+
+    def __init__(self, n, sources, targets):
+        self.sources = sources
+        self.targets = targets
+
+        count = np.bincount(np.concatenate([sources, targets]), minlength=n).astype(np.float64)
+        self.strength = 1 / np.maximum(np.minimum(count[sources], count[targets]), 1)
+        self.bias = count[sources] / np.maximum(count[sources] + count[targets], 1)
+
+    def apply(self, positions, velocities, alpha):
+        if len(self.sources) == 0:
+            return
+
+        delta = (positions[self.targets] + velocities[self.targets]) - (positions[self.sources] + velocities[self.sources])
+        length = np.sqrt((delta**2).sum(axis=1))
+        length[length == 0] = 1e-6
+        delta *= ((length - LINK_DISTANCE) / length * alpha * self.strength)[:, None]
+
+        np.add.at(velocities, self.targets, -delta * self.bias[:, None])
+        np.add.at(velocities, self.sources, delta * (1 - self.bias)[:, None])
+
+
+def apply_many_body_force(positions, velocities, strength):
+    """Every node pushes (strength < 0) or pulls (strength > 0) every other node with a force of strength / distance^2, like d3.forceManyBody()
+    The force on node i is sum_j w_ij * (p_j - p_i) = (W @ P)_i - sum_j w_ij * p_i, so it can be computed with matrix products.
+    """
+    n = len(positions)
+    if n <= EXACT_MANY_BODY_MAX_NODES:
+        bodies, masses = positions, np.ones(n)
+        own_cell = None
+    else:
+        bodies, masses, own_cell = bin_positions(positions)
+    bodies_norm = (bodies**2).sum(axis=1)
+
+    for start in range(0, n, CHUNK_SIZE):
+        chunk = positions[start : start + CHUNK_SIZE]
+        rows = np.arange(len(chunk))
+        distance2 = np.maximum((chunk**2).sum(axis=1)[:, None] + bodies_norm[None, :] - 2 * chunk @ bodies.T, 1)
+        weight = masses[None, :] / distance2
+
+        if own_cell is None:
+            # the node itself is skipped
+            weight[rows, rows + start] = 0
+        else:
+            # the center of mass of the own cell includes the node itself, it is replaced by the center of mass of the other nodes in the cell
+            cells = own_cell[start : start + CHUNK_SIZE]
+            weight[rows, cells] = 0
+
+        force = weight @ bodies - weight.sum(axis=1)[:, None] * chunk
+
+        if own_cell is not None:
+            others = masses[cells] - 1
+            delta = (bodies[cells] * masses[cells][:, None] - chunk) / np.maximum(others, 1)[:, None] - chunk
+            force += delta * (others / np.maximum((delta**2).sum(axis=1), 1))[:, None]
+
+        velocities[start : start + CHUNK_SIZE] += force * strength
+
+
+def bin_positions(positions):
+    """Bins the nodes in a grid of cells with on average a handful of nodes each (or more, when MAX_CELLS is reached).
+    Returns the center of mass and the number of nodes of every non-empty cell, and the cell of every node.
+    """
+    n, dimensions = positions.shape
+    cells_per_axis = max(2, int(min(n / 4, MAX_CELLS) ** (1 / dimensions)))
+
+    low = positions.min(axis=0)
+    size = np.maximum(positions.max(axis=0) - low, 1e-6)
+    coords = np.minimum(((positions - low) / size * cells_per_axis).astype(np.int64), cells_per_axis - 1)
+    flat = np.ravel_multi_index(coords.T, (cells_per_axis,) * dimensions)
+
+    occupied, own_cell = np.unique(flat, return_inverse=True)
+    masses = np.bincount(own_cell, minlength=len(occupied)).astype(np.float64)
+    sums = np.zeros((len(occupied), dimensions))
+    np.add.at(sums, own_cell, positions)
+    return sums / masses[:, None], masses, own_cell
@@ -1,5 +1,17 @@
 import json
-import re
+import hashlib
+import regex as re
+
+# Same as the default tokenizer of FlexSearch, which search.js uses when the index is built in the browser
+TOKEN_SPLIT_PATTERN = re.compile(r"[\p{Z}\p{S}\p{P}\p{C}]+")
+INDEX_FIELDS = ("title", "content")
+
+# Number of documents per file of the snippet store, also set in search.js
+SNIPPET_BUCKET_SIZE = 100
+
+# Search data files in obs.html/data/, see get_search_data_file()
+SEARCH_DATA_FILE = "search.json.gzip"
+COMPACT_SEARCH_DATA_FILE = "search.compact.json.gzip"
 
 
 class SearchHead:
@@ -17,7 +29,7 @@ class SearchHead:
             "content": SanatizeText(content),
             "tags": GetTags(metadata),
         }
-        self.data.append(p)
+        self.add_entry(p)
 
     def AddFile(self, gc, fo):
         """Used to be able to find files as well as notes"""
@@ -36,13 +48,142 @@ class SearchHead:
             "content": filename,
             "tags": filename,
         }
-        if p not in self.data:
-            self.data.append(p)
+        self.add_entry(p, unique=True)
 
-    def OutputJson(self):
-        """the search.json"""
+    def add_entry(self, entry, unique=False):
+        if unique and entry in self.data:
+            return
+        self.data.append(entry)
+
+    def OutputJson(self, compactor=None):
+        """the search.json
+        With a compactor, the content of every entry is replaced by its compacted version, see ContentCompactor.
+        """
         # return json.dumps(self.data, ensure_ascii=False).encode('utf8')
-        return json.dumps(self.data)
+        if compactor is None:
+            return json.dumps(self.data)
+        return json.dumps([{**doc, "content": compactor.compact(doc["content"])} for doc in self.data])
+
+    def WriteSnippets(self, folder):
+        """Writes the content of the entries to folder/snippets/<n>.json, SNIPPET_BUCKET_SIZE entries per file.
+        The search results are highlighted with these, so that the indexed content does not have to be readable text.
+        Returns a hash of the written data.
+        """
+        folder = folder.joinpath("snippets")
+        folder.mkdir(parents=True, exist_ok=True)
+
+        digest = hashlib.sha1()
+        for start in range(0, len(self.data), SNIPPET_BUCKET_SIZE):
+            bucket = json.dumps([doc["content"] for doc in self.data[start : start + SNIPPET_BUCKET_SIZE]])
+            digest.update(bucket.encode("utf-8"))
+            with open(folder.joinpath(f"{start // SNIPPET_BUCKET_SIZE}.json"), "w", encoding="utf-8") as f:
+                f.write(bucket)
+        return digest.hexdigest()
+
+    def WriteIndexShards(self, folder, prefix_length, compactor=None):
+        """Writes a prebuilt inverted index of the search data to folder, so that the browser does not have to build it (see search.js):
+
+        - index.json: the title and url of every document
+        - terms/<hex of prefix>.json: for every term that starts with the prefix, the ids of the documents that contain it per field, most occurrences first
+
+        Terms shorter than prefix_length end up in the shard of the term itself.
+        The results are highlighted with the snippet store, see WriteSnippets().
+        """
+        folder.joinpath("terms").mkdir(parents=True, exist_ok=True)
+
+        # term --> field --> doc id --> number of occurrences
+        postings = {}
+        for doc_id, doc in enumerate(self.data):
+            for f, field in enumerate(INDEX_FIELDS):
+                text = doc[field]
+                if field == "content" and compactor is not None:
+                    text = compactor.compact(text)
+                for term in tokenize(text):
+                    counts = postings.setdefault(term, ({}, {}))[f]
+                    counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        shards = {}
+        for term, fields in postings.items():
+            shards.setdefault(term[:prefix_length], {})[term] = [sorted(counts.keys(), key=lambda doc_id: -counts[doc_id]) for counts in fields]
+
+        for prefix, shard in shards.items():
+            with open(folder.joinpath("terms", prefix.encode("utf-8").hex() + ".json"), "w", encoding="utf-8") as f:
+                f.write(json.dumps(shard))
+
+        index = {
+            "prefix_length": prefix_length,
+            "docs": [{"title": doc["title"], "url": doc["url"], "rtr_url": doc["rtr_url"]} for doc in self.data],
+        }
+        with open(folder.joinpath("index.json"), "w", encoding="utf-8") as f:
+            f.write(json.dumps(index))
+
+
+def uses_snippet_store(gc):
+    """The search results are highlighted with the snippet store instead of with the search data, when the search data does not contain the full content"""
+    if not gc("toggles/features/search/enabled", cached=True):
+        return False
+    return bool(gc("toggles/features/search/prebuilt_index/enabled", cached=True) or gc("toggles/features/search/compaction/enabled", cached=True))
+
+
+class ContentCompactor:
+    """Shrinks the content of search entries that is indexed, see toggles/features/search/compaction.
+    The compacted content is a list of words, so it is only used for matching. The snippet store is used for highlighting.
+    """
+
+    def __init__(self, max_bytes=0, stopwords=None, remove_duplicates=False):
+        self.max_bytes = max_bytes
+        self.stopwords = set(x.lower() for x in stopwords) if stopwords else set()
+        self.remove_duplicates = remove_duplicates
+
+    @classmethod
+    def from_config(cls, gc):
+        """Returns the compactor as configured, or None when compaction is disabled"""
+        if not gc("toggles/features/search/compaction/enabled", cached=True):
+            return None
+
+        max_bytes = gc("toggles/features/search/compaction/content_max_bytes", cached=True)
+        if not isinstance(max_bytes, int) or max_bytes < 0:
+            raise Exception(f"Config value toggles/features/search/compaction/content_max_bytes should be a positive integer or 0, got: {max_bytes}")
+
+        stopwords = None
+        if gc("toggles/features/search/compaction/remove_stopwords", cached=True):
+            stopwords = gc("toggles/features/search/compaction/stopwords", cached=True)
+
+        return cls(max_bytes, stopwords, gc("toggles/features/search/compaction/remove_duplicate_tokens", cached=True))
+
+    def compact(self, content):
+        terms = [term for term in tokenize(content) if term not in self.stopwords]
+        if self.remove_duplicates:
+            terms = list(dict.fromkeys(terms))
+
+        if self.max_bytes == 0:
+            return " ".join(terms)
+
+        # cut off at the last whole word that fits
+        size = -1
+        for i, term in enumerate(terms):
+            size += len(term.encode("utf-8")) + 1
+            if size > self.max_bytes:
+                terms = terms[:i]
+                break
+        return " ".join(terms)
+
+
+def get_search_data_file(gc):
+    """Returns the name of the search data file that search.js loads.
+    search.json.gzip always holds the full content, as it is also the input of `obsidianhtml search`, the compacted search data is written next to it.
+    """
+    if gc("toggles/features/search/compaction/enabled", cached=True):
+        return COMPACT_SEARCH_DATA_FILE
+    return SEARCH_DATA_FILE
+
+
+def get_query_stopwords(gc):
+    """Returns the stopwords that ContentCompactor leaves out of the indexed content, search.js leaves them out of queries as well"""
+    compactor = ContentCompactor.from_config(gc)
+    if compactor is None:
+        return []
+    return sorted(compactor.stopwords)
 
 
 def SanatizeText(text):
@@ -54,6 +195,10 @@ def SanatizeText(text):
     return text
 
 
+def tokenize(text):
+    return [term for term in TOKEN_SPLIT_PATTERN.split(text.lower()) if term != ""]
+
+
 def GetKeywords(text):
     # clean up text
     text = text.lower()
@@ -60,9 +60,12 @@ def get_html_page_content(pb, pane_id):
 
     # get file and convert to soup
     fo = pb.index.fo_by_html_relpath[file_rtr]
-    dst_abs_path = fo.path["html"]["file_absolute_path"]
-    with open(dst_abs_path, "r", encoding="utf-8") as f:
-        html = f.read()
+    if fo.page_record is not None:
+        html = fo.page_record.populate_template(pb)
+    else:
+        dst_abs_path = fo.path["html"]["file_absolute_path"]
+        with open(dst_abs_path, "r", encoding="utf-8") as f:
+            html = f.read()
 
     soup = BeautifulSoup(html, features="html5lib")
 
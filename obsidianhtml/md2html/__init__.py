@@ -13,7 +13,8 @@ from ..parser.MarkdownLink import MarkdownLink
 from ..core.FileObject import FileObject
 from ..lib import simpleHash, get_rel_html_url_prefix
 
-from ..compiler.Templating import PopulateTemplate
+from ..compiler.Templating import PageRecord
+from ..compiler.Rewriter import tag_links
 
 
 def convert_markdown_page_to_html_and_export(fo: "FileObject", pb, backlink_node=None, log_level=1, capture_in_jar=False):
@@ -25,7 +26,6 @@ def convert_markdown_page_to_html_and_export(fo: "FileObject", pb, backlink_node
 
     # Unpack picknick basket so we don't have to type too much.
     paths = pb.paths  # Paths of interest, such as the output and input folders
-    files = pb.index.files  # Hashtable of all files found in the obsidian vault
 
     # Don't parse if not parsable
     if not fo.metadata["is_parsable_note"]:
@@ -34,33 +34,13 @@ def convert_markdown_page_to_html_and_export(fo: "FileObject", pb, backlink_node
     page_path = fo.path["markdown"]["file_absolute_path"]
     rel_dst_path = fo.path["html"]["file_relative_path"]
 
-    if pb.gc("toggles/relative_path_html", cached=True):
-        html_url_prefix = pb.sc(path="html_url_prefix", value=get_rel_html_url_prefix(rel_dst_path.as_posix()))
-    else:
-        html_url_prefix = pb.gc("html_url_prefix")
-
-    page_depth = len(rel_dst_path.as_posix().split("/")) - 1
-
-    # Load contents
-    # ------------------------------------------------------------------
-    # Create an object that handles a lot of the logic of parsing the page paths, content, etc
-    md = fo.load_markdown_page("markdown")
-
-    # Graph view integrations
+    # Load contents and add the page to the graph
     # ------------------------------------------------------------------
-    # The nodelist will result in graph.json, which may have uses beyond the graph view
-
-    # [17] Add self to nodelist
-    node = pb.index.network_tree.add_file_object_to_node_list(fo, backlink_node)
+    node, md = add_markdown_page_to_network_tree(fo, pb, backlink_node)
     backlink_node = node
 
-    # [425] Add included references as links in graph view
-    if pb.gc("toggles/features/graph/show_inclusions_in_graph"):
-        if "obs.html.data" in md.metadata and "inclusion_references" in md.metadata["obs.html.data"]:
-            for incl in md.metadata["obs.html.data"]["inclusion_references"]:
-                inc_md = files[incl].load_markdown_page("markdown")
-                pb.index.network_tree.add_file_object_to_node_list(files[incl], backlink_node, link_type="inclusion")
-                md.links.append(inc_md.fo)
+    html_url_prefix = pb.gc("html_url_prefix")
+    page_depth = len(rel_dst_path.as_posix().split("/")) - 1
 
     # Skip further processing if processing has happened already for this file
     # ------------------------------------------------------------------
@@ -311,31 +291,8 @@ def convert_markdown_page_to_html_and_export(fo: "FileObject", pb, backlink_node
 
     # ------------------------------------------------------------------
     # [14] Tag external/anchor links with a class so they can be decorated differently
-    for l in re.findall(r'(?<=\<a href=")([^"]*)', html_body):
-        if l == "":
-            continue
-
-        # anchor links
-        if l[0] == "#":
-            new_str = f'<a href="{l}" class="anchor-link"'
-
-        # not internal or internal and not .html file
-        elif (l[0] not in ("/", ".")) or ("." in l.split("/")[-1] and ".html" not in l.split("/")[-1]):
-            # add in target="_blank" (or not)
-            external_blank_html = ""
-            if pb.gc("toggles/external_blank", cached=True):
-                external_blank_html = 'target="_blank" '
-
-            new_str = f'<a href="{l}" {external_blank_html}class="external-link"'
-        else:
-            continue
-
-        # convert link
-        safe_str = f'<a href="{l}"'
-        html_body = html_body.replace(safe_str, new_str)
-
     # [15] Tag not created links with a class so they can be decorated differently
-    html_body = html_body.replace(f'<a href="{html_url_prefix}/not_created.html">', f'<a href="{html_url_prefix}/not_created.html" class="nonexistent-link">')
+    html_body = tag_links(html_body, html_url_prefix, external_blank=pb.gc("toggles/external_blank", cached=True))
 
     html_body += '\n<div class="note-footer">\n'
 
@@ -359,40 +316,53 @@ def convert_markdown_page_to_html_and_export(fo: "FileObject", pb, backlink_node
         graph_template = (
             pb.graph_template.replace("{id}", simpleHash(html_body))
             .replace("{pinnedNode}", node["id"])
-            .replace("{pinnedNodeGraph}", str(node["nid"]))
+            .replace("{pinnedNodeGraph}", "{_obsidian_html_node_nid_pattern_}")
             .replace("{html_url_prefix}", html_url_prefix)
             .replace("{graph_coalesce_force}", pb.gc("toggles/features/graph/coalesce_force", cached=True))
             .replace("{graph_classes}", "")
         )
         html_body += f"\n{graph_template}\n"
 
-    # Add node_id to page so that we can fetch this in the second-pass
-    html_body += "{_obsidian_html_node_id_pattern_:" + node["id"] + "}\n"
+    # [16] Keep the page until the second pass, where it is wrapped in the html template and written
+    # ------------------------------------------------------------------
+    fo.page_record = PageRecord(node["id"], node["name"], html_url_prefix, page_depth, html_body)
+
+    md.AddToTagtree(pb.tagtree, fo.path["html"]["file_relative_path"].as_posix())
 
-    # [16] Wrap body html in valid html structure from template
+    # Return links to crawl through linked notes
     # ------------------------------------------------------------------
-    html = PopulateTemplate(pb, node["id"], pb.dynamic_inclusions, pb.html_template, content=html_body)
+    return (backlink_node, md.links)
+
 
-    html = html.replace("{node_name}", node["name"])
-    html = html.replace("{pinnedNode}", node["id"]).replace("{html_url_prefix}", html_url_prefix).replace("{page_depth}", str(page_depth))
-    # [?] Documentation styling: Navbar
+def add_markdown_page_to_network_tree(fo: "FileObject", pb, backlink_node=None):
+    """Loads the markdown page and adds it, and the pages it includes, to the network tree. Returns the node and the MarkdownPage object."""
+    files = pb.index.files  # Hashtable of all files found in the obsidian vault
+    rel_dst_path = fo.path["html"]["file_relative_path"]
+
+    if pb.gc("toggles/relative_path_html", cached=True):
+        pb.sc(path="html_url_prefix", value=get_rel_html_url_prefix(rel_dst_path.as_posix()))
+
+    # Load contents
     # ------------------------------------------------------------------
-    html = html.replace("{{navbar_links}}", "\n".join(pb.navbar_links))
+    # Create an object that handles a lot of the logic of parsing the page paths, content, etc
+    md = fo.load_markdown_page("markdown")
 
-    # Save file
+    # Graph view integrations
     # ------------------------------------------------------------------
-    fo.path["html"]["file_absolute_path"].parent.mkdir(parents=True, exist_ok=True)
-    html_dst_path_posix = fo.path["html"]["file_absolute_path"].as_posix()
+    # The nodelist will result in graph.json, which may have uses beyond the graph view
 
-    md.AddToTagtree(pb.tagtree, fo.path["html"]["file_relative_path"].as_posix())
+    # [17] Add self to nodelist
+    node = pb.index.network_tree.add_file_object_to_node_list(fo, backlink_node)
 
-    # Write html
-    with open(html_dst_path_posix, "w", encoding="utf-8") as f:
-        f.write(html)
+    # [425] Add included references as links in graph view
+    if pb.gc("toggles/features/graph/show_inclusions_in_graph"):
+        if "obs.html.data" in md.metadata and "inclusion_references" in md.metadata["obs.html.data"]:
+            for incl in md.metadata["obs.html.data"]["inclusion_references"]:
+                inc_md = files[incl].load_markdown_page("markdown")
+                pb.index.network_tree.add_file_object_to_node_list(files[incl], node, link_type="inclusion")
+                md.links.append(inc_md.fo)
 
-    # Return links to crawl through linked notes
-    # ------------------------------------------------------------------
-    return (backlink_node, md.links)
+    return node, md
 
 
 def pythonmarkdown_convert_md_to_html(pb, page, rel_dst_path):
@@ -451,26 +421,25 @@ def pythonmarkdown_convert_md_to_html(pb, page, rel_dst_path):
     return html_body
 
 
-def insert_backlinks(pb, html, node_id, page_depth):
-    backlinks = [x for x in pb.index.network_tree.tree["links"] if x["target"] == node_id]
+def get_backlinks_html(pb, node_id, page_depth):
+    """Returns the html for the {_obsidian_html_backlinks_pattern_} placeholder."""
+    backlinks = pb.index.network_tree.get_backlinks(node_id)
     snippet = ""
     if len(backlinks) > 0:
         snippet = "<h2>Backlinks</h2>\n<ul>\n"
         for l in backlinks:
-            if l["target"] == node_id:
-                url = pb.index.network_tree.node_lookup[l["source"]]["url"]
-                if pb.gc("toggles/relative_path_html", cached=True):
-                    url = ("../" * page_depth) + pb.index.network_tree.node_lookup[l["source"]]["rtr_url"]
-                if url[0] not in [".", "/"]:
-                    url = "/" + url
-                snippet += f'\t<li><a class="backlink" href="{url}">{l["source"]}</a></li>\n'
+            url = pb.index.network_tree.node_lookup[l["source"]]["url"]
+            if pb.gc("toggles/relative_path_html", cached=True):
+                url = ("../" * page_depth) + pb.index.network_tree.node_lookup[l["source"]]["rtr_url"]
+            if url[0] not in [".", "/"]:
+                url = "/" + url
+            snippet += f'\t<li><a class="backlink" href="{url}">{l["source"]}</a></li>\n'
         snippet += "</ul>"
         snippet = f'<div class="backlinks">\n{snippet}\n</div>\n'
     else:
         snippet = '<div class="backlinks" style="display:none"></div>\n'
 
-    # replace placeholder with list & write output
-    return re.sub("\{_obsidian_html_backlinks_pattern_\}", snippet, html)
+    return snippet
 
 
 def get_tags(node):
@@ -479,10 +448,15 @@ def get_tags(node):
     return []
 
 
-def insert_tags_footer(pb, html, tags, md_metadata):
+def get_tags_footer_html(pb, tags, md_metadata):
+    """Returns the html for the {_obsidian_html_tags_footer_pattern_} placeholder,
+    and a dict with the html for the inline tag placeholders (<code>{_obsidian_pattern_tag_tag}</code>).
+    """
+    inline_tags = {}
+
     # remove placeholder
     if bool(tags) is False or ("obs.html.tags" in md_metadata.keys() and "no_tag_footer" in md_metadata["obs.html.tags"]):
-        return re.sub(r"\{_obsidian_html_tags_footer_pattern_\}", "", html)
+        return "", inline_tags
 
     snippet = "<h2>Tags</h2>\n<ul>\n"
     for tag in tags:
@@ -490,10 +464,7 @@ def insert_tags_footer(pb, html, tags, md_metadata):
         snippet += f'\t<li><a class="backlink" href="{url}">{tag}</a></li>\n'
 
         if pb.gc("toggles/preserve_inline_tags", cached=True):
-            placeholder = re.escape("<code>{_obsidian_pattern_tag_" + tag + "}</code>")
-            inline_tag = f'<a class="inline-tag" href="{url}">{tag}</a>'
-            html = re.sub(placeholder, inline_tag, html)
+            inline_tags[tag] = f'<a class="inline-tag" href="{url}">{tag}</a>'
     snippet += "</ul>"
 
-    # replace placeholder with list & write output
-    return re.sub(r"\{_obsidian_html_tags_footer_pattern_\}", snippet, html)
+    return snippet, inline_tags
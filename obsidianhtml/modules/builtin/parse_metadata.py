@@ -33,7 +33,8 @@ class ParseMetadataModule(ObsidianHtmlModule):
         """This function is run before run(), if it returns False, then the module run is skipped entirely. Any other value will be accepted"""
         return
 
-    def sanatize_frontmatter(self, metadata):
+    @staticmethod
+    def sanatize_frontmatter(metadata):
         # imitate obsidian shenannigans
         if "tags" in metadata.keys():
             tags = metadata["tags"]
@@ -52,14 +53,23 @@ class ParseMetadataModule(ObsidianHtmlModule):
             metadata["tags"] = []
         return metadata
 
-    def get_frontmatter(self, file_path):
+    @classmethod
+    def get_frontmatter(cls, file_path):
         with open(file_path, encoding="utf-8") as f:
             metadata, page = frontmatter.parse(f.read())
-        return self.sanatize_frontmatter(metadata), page
+        return cls.sanatize_frontmatter(metadata), page
 
-    def get_inline_tags(self, page):
+    @staticmethod
+    def get_inline_tags(page):
         return [x[1:].replace(".", "") for x in re.findall(r"(?<!\S)#[\p{L}\p{N}/\-\p{Emoji_Presentation}]*[\p{L}\-_/\p{Emoji_Presentation}][\p{L}\p{N}/\-\p{Emoji_Presentation}]*", page)]
 
+    @classmethod
+    def read_metadata(cls, file_path):
+        """Returns the metadata of the note as it is stored in index/metadata.json: the frontmatter, with the inline tags added to the tags."""
+        metadata, page = cls.get_frontmatter(file_path)
+        metadata["tags"] = list(set(metadata["tags"] + cls.get_inline_tags(page)))
+        return metadata
+
     def run(self):
         # get input
         files = self.modfile("index/markdown_files.json").read().from_json()
@@ -72,9 +82,7 @@ class ParseMetadataModule(ObsidianHtmlModule):
             metadata = {}
             metadata["tags"] = []
             try:
-                metadata, page = self.get_frontmatter(file)
-                inline_tags = self.get_inline_tags(page)
-                metadata["tags"] = list(set(metadata["tags"] + inline_tags))
+                metadata = self.read_metadata(file)
             except Exception as e:
                 og_path = Path(paths["original_input_folder"]).joinpath(rel_path).as_posix()
                 self.print(
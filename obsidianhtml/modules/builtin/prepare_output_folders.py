@@ -45,7 +45,8 @@ class PrepareOutputFoldersModule(ObsidianHtmlModule):
             paths[key] = Path(value)
 
         # remove previous output
-        if self.value_of("clean_existing") is True:
+        # (incremental builds decide themselves whether the output can be reused, see controller/BuildManifest.py)
+        if self.value_of("clean_existing") is True and not self.gc("incremental_build"):
             if self.gc("toggles/compile_md") and paths["md_folder"].exists():
                 shutil.rmtree(paths["md_folder"])
             if paths["html_output_folder"].exists():
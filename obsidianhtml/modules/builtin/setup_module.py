@@ -132,7 +132,12 @@ class SetupModule(ObsidianHtmlModule):
         user_config = yaml.safe_load(user_config_yaml)
 
         default_config = yaml.safe_load(OpenIncludedFile("defaults_config.yml"))
-        config = self.store("config", MergeDictRecurse(default_config, user_config))
+        config = MergeDictRecurse(default_config, user_config)
+
+        # `obsidianhtml watch` relies on incremental builds
+        if arguments["command"][0] == "watch":
+            config["incremental_build"] = True
+        config = self.store("config", config)
 
         # set module data folder so that we can write output
         if "module_data_folder" not in config:
@@ -28,6 +28,10 @@ function initGraph(args) {
             return graph_select_node(args, graph)
         }
 
+        // large graphs are drawn with less detail, see graph.js
+        let lod = window.ObsHtmlGraph.use_level_of_detail(data);
+        let clustered = false;      // updated every frame
+
         g.graph = ForceGraph()
             (args.graph_container)
             .graphData(data)
@@ -38,7 +42,17 @@ function initGraph(args) {
             .nodeLabel('name')
             .d3Force("charge", d3.forceManyBody().strength(args.coalesce_force))
             .nodeColor((node) => {return g.colors.node_inactive})
-            .nodeCanvasObjectMode(() => 'after')
+            .nodeCanvasObjectMode(() => clustered ? 'replace' : 'after')
+            .onRenderFramePre((ctx, globalScale) => {
+                if (!lod){
+                    return
+                }
+                window.ObsHtmlGraph.reset_labels(args.uid);
+                clustered = window.ObsHtmlGraph.is_clustered(globalScale);
+                if (clustered){
+                    window.ObsHtmlGraph.draw_clusters(ctx, globalScale, data.nodes, g.colors.node_inactive);
+                }
+            })
             .nodeCanvasObject((node, ctx, globalScale) => {
                 // draw text only for nodes connected to the current node
                 let isConnected = false;
@@ -47,8 +61,14 @@ function initGraph(args) {
                         isConnected = true;
                     }
                 })
+
+                // when clustered, only the current node is drawn on top of the clusters
+                if (clustered && node.id != g.current_node_id){
+                    return
+                }
+
                 // draw text
-                if (isConnected){
+                if (isConnected && (!lod || window.ObsHtmlGraph.draw_label(args.uid))){
                     const label = node.name;
                     const fontSize = 11 / globalScale;
                     ctx.font = `${fontSize}px Sans-Serif`;
@@ -81,6 +101,9 @@ function initGraph(args) {
                 ctx.fill();
 
             })
+            .linkVisibility(link => {
+                return !clustered || link.source.id == g.current_node_id || link.target.id == g.current_node_id
+            })
             .linkColor(link => {
                 if (link.source.id == g.current_node_id){
                     return g.colors.link_active
@@ -114,6 +137,20 @@ function initGraph(args) {
                 g.current_node_id = node.id
                 g.actions['right_click'](args)
             })
+
+        // the nodes are already in their final position, no need to run the simulation
+        if (window.ObsHtmlGraph.settings.layout_dimensions > 0){
+            g.graph.cooldownTicks(0)
+        }
+        // run the simulation of large graphs in a worker, so that the tab stays responsive
+        else if (lod && window.ObsHtmlGraph.settings.simulation_in_worker){
+            g.graph.cooldownTicks(0)
+            set_auto_pause_redraw(g.graph, false)
+            window.ObsHtmlGraph.run_simulation_in_worker(args.uid, data, args.coalesce_force, () => {
+                set_auto_pause_redraw(g.graph, true)
+                g.graph.zoomToFit(1000, rem(3), function(n){return zoom_select(n, args)})
+            })
+        }
         
         setTimeout( () => g.graph.zoomToFit(1000, rem(3), function(n){return initGraphDone(n, args)}), 1000 );
     });
@@ -136,9 +173,17 @@ function initGraphDone(n, args){
 // HELPER FUNCTIONS
 /////////////////////////////////////////////////////////////////////////////////////
 
+// the graph is only redrawn while its own simulation runs, unless auto pause redraw is disabled (not available in older versions of force-graph)
+function set_auto_pause_redraw(graph, value){
+    if (typeof graph.autoPauseRedraw == 'function'){
+        graph.autoPauseRedraw(value)
+    }
+}
+
 function graph_select_node(args){
     let g = window.ObsHtmlGraph.graphs[args.uid];
     g.current_node_id = args.node.id;
+    window.ObsHtmlGraph.expand_graph(args.uid, args.node);
 
     g.graph.zoomToFit(1000, rem(3), function(n){return zoom_select(n, args)})
     return false;
@@ -19,45 +19,58 @@ function run(args) {
 
 function initGraph_3d(args) {
     let g = window.ObsHtmlGraph.graphs[args.uid];
-    g.graph = ForceGraph3D()
-        (args.graph_container)
-        .jsonUrl(args.data)
-        .width(args.width)
-        .height(args.height)
-        .nodeLabel('name')
-        .linkDirectionalParticles("value")
-        .linkDirectionalParticleSpeed(0.010)
-        .linkDirectionalParticleWidth(2.0)
-        .nodeColor(node => {
-            if (node.id == g.current_node_id){
-                return '#ff0000'
-            }
-            let isConnected = false;
-            node.links.forEach(link => {
-                if (link == g.current_node_id){
-                    isConnected = true;
+
+    // Load data then start graph
+    fetch(args.data).then(res => res.json()).then(data => {
+        // large graphs are drawn with less detail, see graph.js
+        let lod = window.ObsHtmlGraph.use_level_of_detail(data);
+
+        g.graph = ForceGraph3D()
+            (args.graph_container)
+            .graphData(data)
+            .width(args.width)
+            .height(args.height)
+            .nodeLabel('name')
+            .nodeResolution(lod ? 4 : 8)
+            .linkDirectionalParticles(lod ? 0 : "value")
+            .linkDirectionalParticleSpeed(0.010)
+            .linkDirectionalParticleWidth(2.0)
+            .nodeColor(node => {
+                if (node.id == g.current_node_id){
+                    return '#ff0000'
                 }
+                let isConnected = false;
+                node.links.forEach(link => {
+                    if (link == g.current_node_id){
+                        isConnected = true;
+                    }
+                })
+                if (isConnected){
+                    return '#f7be49';
+                }
+                return '#ffffff'
             })
-            if (isConnected){
-                return '#f7be49';
-            }
-            return '#ffffff'
-        })
-        .linkColor(link => {
-            if (link.source == g.current_node_id || link.target == g.current_node_id){
-                return '#ff0000'
-            }
-            return '#dadada'
-        })
-        .linkOpacity(0.3)
-        .onNodeClick(node => {
-            args.node = node;
-            g.actions['left_click'](args)
-        })
-        .onNodeRightClick(node => {
-            args.node = node;
-            g.actions['right_click'](args, g.graph)
-        });
+            .linkColor(link => {
+                if (link.source == g.current_node_id || link.target == g.current_node_id){
+                    return '#ff0000'
+                }
+                return '#dadada'
+            })
+            .linkOpacity(0.3)
+            .onNodeClick(node => {
+                args.node = node;
+                g.actions['left_click'](args)
+            })
+            .onNodeRightClick(node => {
+                args.node = node;
+                g.actions['right_click'](args, g.graph)
+            });
+
+        // the nodes are already in their final position, no need to run the simulation
+        if (window.ObsHtmlGraph.settings.layout_dimensions == 3){
+            g.graph.cooldownTicks(0)
+        }
+    });
 }
 
 
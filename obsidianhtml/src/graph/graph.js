@@ -43,6 +43,14 @@ var default_colors = {
     'text': '#dcddde'
 }
 
+// Set to true by the full page graph, which always loads the full graph.json
+var settings = {
+    'full_graph': false,
+    'layout_dimensions': GRAPH_LAYOUT_DIMENSIONS,   // 2 or 3 when the node positions are computed at build time, 0 otherwise
+    'level_of_detail': GRAPH_LEVEL_OF_DETAIL,       // see toggles/features/graph/level_of_detail
+    'simulation_in_worker': GRAPH_SIMULATION_IN_WORKER
+}
+
 // Graph listing mutations
 //////////////////////////////////////////////////////////////////////////////
 var graphs = {};                                // each graph has an object in this hashtable. see new_graph_listing() for type
@@ -59,7 +67,10 @@ function new_graph_listing(){
         'width': 0,                             // width of the container in px
         'height': 0,                            // height of the container in px
         'actions': clone(default_actions),      // what functions to call based on which actions
-        'colors': clone(default_colors)
+        'colors': clone(default_colors),
+        'loaded_shards': {},                    // nids of the nodes of which the neighborhood is loaded (GRAPH_DATA_SHARDED)
+        'worker': null,                         // the Web Worker running the force simulation, see run_simulation_in_worker()
+        'labels_drawn': 0                       // number of labels drawn in the current frame, see draw_label()
     }
 }
 
@@ -82,6 +93,7 @@ function add_graph(uid, pinned_node, grapher_id, container){
 }
 function remove_graph(uid, cont, close){
     cont.innerHTML = "";
+    stop_worker(uid);
     
     if (close){
         delete graphs[uid];
@@ -162,12 +174,188 @@ function enable_graph(uid){
     let args = get_graph_args(uid)
     args.current_node_id = graphs[uid].current_node_id
 
-    graphs[uid]['grapher_module'].run(args)
-
     graphs[uid].active = true;
+
+    // only load the neighborhood of the pinned node, unless the node is unknown (e.g. on the dirtree page)
+    if (GRAPH_DATA_SHARDED && !settings.full_graph){
+        graphs[uid].loaded_shards = {};
+        get_node_table().then(node_table => {
+            let nid = node_table[graphs[uid].pinned_node];
+            if (nid != undefined){
+                args.data = get_graph_shard(nid);
+                graphs[uid].loaded_shards[nid] = true;
+            }
+            graphs[uid]['grapher_module'].run(args)
+            graph_dependencies_loaded[graphs[uid].grapher_id] = true
+        })
+        return
+    }
+
+    graphs[uid]['grapher_module'].run(args)
     graph_dependencies_loaded[graphs[uid].grapher_id] = true
 }
 
+// SHARDED GRAPH DATA
+//////////////////////////////////////////////////////////////////////////////
+var node_table = null;
+
+function get_graph_shard_folder(){
+    return get_graph_data().replace(/graph\.json$/, 'graph/');
+}
+function get_graph_shard(nid){
+    return get_graph_shard_folder() + nid + '.json';
+}
+
+// node id --> nid, loaded only once
+function get_node_table(){
+    if (node_table == null){
+        node_table = fetch(get_graph_shard_folder() + 'nodes.json').then(res => res.json());
+    }
+    return node_table;
+}
+
+// add the neighborhood of the given node to the graph, if it is not yet loaded
+function expand_graph(uid, node){
+    let g = graphs[uid];
+    if (!GRAPH_DATA_SHARDED || settings.full_graph || g == undefined || node.nid == undefined || node.nid in g.loaded_shards){
+        return
+    }
+    g.loaded_shards[node.nid] = true;
+
+    fetch(get_graph_shard(node.nid)).then(res => res.json()).then(shard => {
+        if (g.graph == null){ // graph closed in the meantime
+            return
+        }
+        let data = g.graph.graphData();
+
+        let nodes = {};
+        data.nodes.forEach(n => {nodes[n.id] = n});
+        shard.nodes.forEach(n => {
+            if (!(n.id in nodes)){
+                n.links = [];
+                nodes[n.id] = n;
+                data.nodes.push(n);
+            }
+        });
+
+        // the simulation replaces the source/target ids of links with the node objects
+        let link_id = (link) => (link.source.id || link.source) + '\n' + (link.target.id || link.target);
+        let links = {};
+        data.links.forEach(l => {links[link_id(l)] = true});
+        shard.links.forEach(l => {
+            if (link_id(l) in links){
+                return
+            }
+            links[link_id(l)] = true;
+            data.links.push(l);
+
+            // keep the lists of connected nodes up to date, these are used to highlight nodes
+            if (!nodes[l.source].links.includes(l.target)){ nodes[l.source].links.push(l.target) }
+            if (!nodes[l.target].links.includes(l.source)){ nodes[l.target].links.push(l.source) }
+        });
+
+        g.graph.graphData(data);
+    })
+}
+
+// LEVEL OF DETAIL
+//////////////////////////////////////////////////////////////////////////////
+// Large graphs (at least level_of_detail.min_nodes nodes) are drawn with less detail, so that the tab stays responsive:
+// - when zoomed out, nodes are drawn as clusters, and only the links of the current node are drawn
+// - only a limited number of labels is drawn per frame
+function use_level_of_detail(data){
+    return settings.level_of_detail.enabled && data.nodes.length >= settings.level_of_detail.min_nodes
+}
+
+function is_clustered(global_scale){
+    return global_scale < settings.level_of_detail.cluster_below_zoom
+}
+
+// call at the start of every frame
+function reset_labels(uid){
+    graphs[uid].labels_drawn = 0;
+}
+
+// returns false when the maximum number of labels for this frame has been reached
+function draw_label(uid){
+    let g = graphs[uid];
+    if (g.labels_drawn >= settings.level_of_detail.max_labels){
+        return false
+    }
+    g.labels_drawn += 1;
+    return true
+}
+
+// draws one circle per cluster_size x cluster_size px area of the screen, in the center of the nodes in that area, sized by the number of nodes
+function draw_clusters(ctx, global_scale, nodes, color){
+    let size = settings.level_of_detail.cluster_size / global_scale;
+
+    let clusters = {};
+    nodes.forEach(node => {
+        if (node.x == undefined){
+            return
+        }
+        let key = Math.floor(node.x / size) + ',' + Math.floor(node.y / size);
+        if (!(key in clusters)){
+            clusters[key] = {'x': 0, 'y': 0, 'count': 0};
+        }
+        clusters[key].x += node.x;
+        clusters[key].y += node.y;
+        clusters[key].count += 1;
+    });
+
+    ctx.fillStyle = color;
+    for (let key in clusters){
+        let c = clusters[key];
+        ctx.beginPath();
+        ctx.arc(c.x / c.count, c.y / c.count, Math.min(size / 2, 4 * Math.sqrt(c.count)), 0, 2 * Math.PI);
+        ctx.fill();
+    }
+}
+
+// SIMULATION IN WORKER
+//////////////////////////////////////////////////////////////////////////////
+// Runs the force simulation in graph_worker.js instead of on the main thread, and moves the nodes as positions come in.
+// The grapher should stop its own simulation (cooldownTicks(0)). on_done is called when the simulation has settled.
+function run_simulation_in_worker(uid, data, strength, on_done){
+    let g = graphs[uid];
+    stop_worker(uid);
+
+    let index = {};
+    data.nodes.forEach((node, i) => {index[node.id] = i});
+    let link_end = (end) => index[end.id != undefined ? end.id : end];
+
+    g.worker = new Worker(new URL('./graph_worker.js', import.meta.url));
+    g.worker.onmessage = function(e){
+        let positions = e.data.positions;
+        data.nodes.forEach((node, i) => {
+            node.x = positions[2*i];
+            node.y = positions[2*i+1];
+            node.vx = 0;
+            node.vy = 0;
+        });
+        if (e.data.done){
+            stop_worker(uid);
+            on_done();
+        }
+    }
+    g.worker.postMessage({
+        'nodes': data.nodes.map(node => {return {'x': node.x, 'y': node.y}}),
+        'links': data.links.map(link => [link_end(link.source), link_end(link.target)]),
+        'strength': parseFloat(strength),
+        'post_every': 10
+    });
+}
+
+function stop_worker(uid){
+    let g = graphs[uid];
+    if (g == undefined || g.worker == null){
+        return
+    }
+    g.worker.terminate();
+    g.worker = null;
+}
+
 // the args hashtable is sent to the grapher function to tell it what it needs to know to draw the graph
 function get_graph_args(uid){
         let cont = document.getElementById('A'+uid);
@@ -336,6 +524,7 @@ function get_node_url_adaptive(node){
 function graph_select_node(args){
     graphs[args.uid].current_node_id = args.node.id;
     graphs[args.uid].graph.refresh();
+    expand_graph(args.uid, args.node);
     return false;
 }
 
@@ -377,6 +566,14 @@ export {
     run, 
     graphs, 
     graph_dependencies_loaded, 
+    settings,
+    expand_graph,
+    use_level_of_detail,
+    is_clustered,
+    reset_labels,
+    draw_label,
+    draw_clusters,
+    run_simulation_in_worker,
     default_actions,
     graph_select_node,
     graph_open_link_normal,
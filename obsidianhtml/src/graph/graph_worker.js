@@ -0,0 +1,37 @@
+// Runs the force simulation of a graph in a Web Worker, so that the page stays responsive while large graphs settle.
+// See run_simulation_in_worker() in graph.js.
+//
+// Receives:  {'nodes': [{'x': .., 'y': ..}, ...], 'links': [[source_index, target_index], ...], 'strength': .., 'post_every': ..}
+// Sends:     {'positions': Float32Array [x0, y0, x1, y1, ...], 'done': bool}, every post_every ticks, and when the simulation has settled
+
+importScripts('https://d3js.org/d3.v4.min.js');
+
+onmessage = function(e){
+    let msg = e.data;
+    let nodes = msg.nodes;
+    let links = msg.links.map(link => {return {'source': link[0], 'target': link[1]}});
+
+    // same forces as force-graph uses
+    let simulation = d3.forceSimulation(nodes)
+        .force('link', d3.forceLink(links))
+        .force('charge', d3.forceManyBody().strength(msg.strength))
+        .force('center', d3.forceCenter())
+        .stop();
+
+    let ticks = Math.ceil(Math.log(simulation.alphaMin()) / Math.log(1 - simulation.alphaDecay()));
+    for (let i = 1; i <= ticks; i++){
+        simulation.tick();
+        if (i % msg.post_every == 0 || i == ticks){
+            post_positions(nodes, i == ticks);
+        }
+    }
+}
+
+function post_positions(nodes, done){
+    let positions = new Float32Array(nodes.length * 2);
+    for (let i = 0; i < nodes.length; i++){
+        positions[2*i] = nodes[i].x;
+        positions[2*i+1] = nodes[i].y;
+    }
+    postMessage({'positions': positions, 'done': done}, [positions.buffer]);
+}
@@ -14,6 +14,7 @@ var RELATIVE_PATHS = {relative_paths};
 var documentation_mode = {documentation_mode};
 var tab_mode = !no_tab_mode;
 var gzip_hash = '{gzip_hash}'                       // used to check whether the localStorage data is stale
+var LIVE_RELOAD = {live_reload};
 
 // global cache
 var fn_cache_ls_available = null;
@@ -26,6 +27,9 @@ document.addEventListener('DOMContentLoaded', load_page);   // all the code that
 if (RELATIVE_PATHS){
     document.addEventListener('DOMContentLoaded', set_rel_paths);
 }
+if (LIVE_RELOAD){
+    document.addEventListener('DOMContentLoaded', subscribe_live_reload);
+}
 
 function set_rel_paths(){
     // update directory navigation links
@@ -506,6 +510,62 @@ function httpGetAsync(theUrl, callback, level, callbackpath) {
 }
 
 
+// Live reload
+// ----------------------------------------------------------------------------
+// `obsidianhtml serve` sends the url paths of the files that changed after every build.
+// The content of the tabs that show one of these files is replaced, instead of reloading the whole page.
+function subscribe_live_reload(){
+    if (typeof EventSource === 'undefined'){
+        return;
+    }
+    let source = new EventSource(CONFIGURED_HTML_URL_PREFIX + '/obs.html/live_reload');
+    source.addEventListener('change', function(e) {
+        let changed = JSON.parse(e.data);
+        let containers = document.getElementsByClassName('container');
+        for (let container of containers){
+            if (container.url && changed.includes(get_live_reload_path(container.url))){
+                reload_container(container);
+            }
+        }
+    });
+}
+
+function get_live_reload_path(url){
+    let path = decodeURI(new URL(url, window.location.href).pathname);
+    if (path.endsWith('/')){
+        path += 'index.html';
+    }
+    return path;
+}
+
+function reload_container(container){
+    fetch(container.url, {cache: 'no-cache'})
+        .then(response => response.text())
+        .then(text => {
+            let page = new DOMParser().parseFromString(text, 'text/html');
+            let new_content = page.querySelector('.container .content');
+            let content = container.querySelector('.content');
+            if (!new_content || !content){
+                return;
+            }
+
+            let scroll_top = container.scrollTop;
+            content.innerHTML = new_content.innerHTML;
+
+            // arm the new content, same as when a tab is opened
+            SetContainer(container);
+            LoadTableOfContents(container);
+            if (tab_mode){
+                SetLinks(container.level);
+            }
+            if (typeof MathJax !== 'undefined' && typeof MathJax.typeset === 'function'){
+                MathJax.typeset();
+            }
+            container.scrollTop = scroll_top;
+        });
+}
+
+
 function load_script_on_demand(path, callback, callback_args){
     console.log('loading', path);
     // create script tag
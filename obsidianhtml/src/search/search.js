@@ -9,6 +9,16 @@ var URL_MODE = '{url_mode}';
 var RELATIVE_PATHS = {relative_paths};
 var CONFIGURED_HTML_URL_PREFIX = '{configured_html_url_prefix}';
 var TRY_PRELOAD = {try_preload};
+var PREBUILT_INDEX = {prebuilt_index};        // see toggles/features/search/prebuilt_index
+var SNIPPET_STORE = {snippet_store};          // highlight the results with obs.html/data/search/snippets/ instead of with the search data
+var SNIPPET_BUCKET_SIZE = {snippet_bucket_size};
+var SEARCH_STOPWORDS = {search_stopwords};     // left out of the indexed content by toggles/features/search/compaction, so also left out of queries
+var SEARCH_DATA_FILE = '{search_data_file}';   // search.json.gzip, or the compacted search data when toggles/features/search/compaction is enabled
+
+var PREBUILT = null;                    // promise of index.json of the prebuilt index
+var PREBUILT_SHARDS = {};               // prefix --> promise of the terms shard
+var SNIPPETS = {};                      // bucket --> promise of the contents of the documents in the bucket
+var SEARCH_COUNTER = 0;                 // used to drop the results of searches that finish after a newer search
 
 var fuse;                               // fuzzy search object
 var index;
@@ -21,6 +31,9 @@ if (TRY_PRELOAD){
 }
 
 async function PreLoadSearchData(){
+    if (PREBUILT_INDEX){
+        return LoadSearchData()
+    }
     console.log('Try preloading search_data')
     let search_data = ls_get('search_data');
     if (search_data){
@@ -46,6 +59,13 @@ async function LoadSearchData(){
         return
     }
 
+    // only the list of documents is loaded up front, the rest of the prebuilt index is loaded when needed
+    if (PREBUILT_INDEX){
+        PREBUILT = fetch(get_search_data_url('index.json')).then(res => res.json());
+        SEARCH_DATA_LOADED = true;
+        return
+    }
+
     console.log('Search engine loading...')
     const start = performance.now();
 
@@ -88,7 +108,7 @@ async function LoadSearchData(){
     // no cached data available, get data and cache it when possible
     console.log('Loading search data from file...')
 
-    GetGzipContentsAsB64Str(CONFIGURED_HTML_URL_PREFIX + '/obs.html/data/search.json.gzip').then(gzipped_data_str => {
+    GetGzipContentsAsB64Str(CONFIGURED_HTML_URL_PREFIX + '/obs.html/data/' + SEARCH_DATA_FILE).then(gzipped_data_str => {
 
         ls_set('search_hash', gzip_hash);
 
@@ -169,12 +189,38 @@ function run_search(search_string_id, hard_search_id) {
 }
 
 function search(string_search, hard_search) {
+    if (PREBUILT_INDEX){
+        let counter = ++SEARCH_COUNTER;
+        GetResultsPrebuilt(string_search).then(results => ShowResultsWithSnippets(results, string_search, hard_search, counter))
+        return
+    }
+
     // get matches using flexsearch
     results = GetResultsFlex(string_search, hard_search)
 
+    if (SNIPPET_STORE){
+        ShowResultsWithSnippets(results, string_search, hard_search, ++SEARCH_COUNTER)
+        return results
+    }
+
     // convert matches to a <ul><li> list
-    html = GetHtmlFlex(results, string_search, hard_search)
+    html = GetHtmlFlex(results, string_search, hard_search, id => SEARCH_DATA[id].content)
 
+    ShowResults(results, html)
+    return results
+}
+
+function ShowResultsWithSnippets(results, string_search, hard_search, counter) {
+    return GetSnippets(results).then(snippets => {
+        // drop the results when a newer search was started in the meantime
+        if (counter != SEARCH_COUNTER){
+            return
+        }
+        ShowResults(results, GetHtmlFlex(results, string_search, hard_search, id => snippets[id]))
+    })
+}
+
+function ShowResults(results, html) {
     // make result div grow based on the number of results, with a max height
     let resultsdivbox = document.getElementById('search-results-box')
 
@@ -189,15 +235,13 @@ function search(string_search, hard_search) {
     // put results in result div
     let resultsdiv = document.getElementById('search-results')
     resultsdiv.innerHTML = html;
-
-    return results
 }
 
 function GetResultsFlex(search_string, hard_search) {
     let match_ids = []
     let matches = []
 
-    index.search(search_string).forEach(field => {
+    index.search(query_words(search_string).join(' ')).forEach(field => {
         field.result.forEach(result => {
             let record_id = result
 
@@ -220,7 +264,116 @@ function GetResultsFlex(search_string, hard_search) {
     return matches
 }
 
-function GetHtmlFlex(fs_results, search_string, hard_search) {
+// PREBUILT INDEX
+// -----------------------------------------------------------------------------------------------
+// The prebuilt index is written by SearchHead.WriteIndexShards() at build time.
+// Words are matched on the terms that start with them (same as the 'forward' tokenizer of FlexSearch), a document matches a
+// field when all words match in that field, and documents are ranked by how high they are in the posting lists of the words.
+
+function get_search_data_url(path){
+    return CONFIGURED_HTML_URL_PREFIX + '/obs.html/data/search/' + path + '?v=' + gzip_hash;
+}
+
+// same as the tokenizer in Search.py
+function tokenize(text){
+    return text.toLowerCase().split(/[\p{Z}\p{S}\p{P}\p{C}]+/u).filter(term => term.length > 0);
+}
+
+// the words of the query that are matched, see SEARCH_STOPWORDS
+function query_words(search_string){
+    let words = tokenize(search_string);
+    let kept = words.filter(word => !SEARCH_STOPWORDS.includes(word));
+    // titles are not compacted, so a query of only stopwords can still match on them
+    return (kept.length > 0) ? kept : words;
+}
+
+function get_prebuilt_shard(prefix){
+    if (!(prefix in PREBUILT_SHARDS)){
+        let hex = Array.from(new TextEncoder().encode(prefix)).map(b => b.toString(16).padStart(2, '0')).join('');
+        PREBUILT_SHARDS[prefix] = fetch(get_search_data_url('terms/' + hex + '.json')).then(res => res.ok ? res.json() : {});
+    }
+    return PREBUILT_SHARDS[prefix];
+}
+
+async function GetResultsPrebuilt(search_string) {
+    let words = query_words(search_string);
+    if (words.length == 0 || PREBUILT == null){
+        return []
+    }
+    let prebuilt = await PREBUILT;
+    let fields = ['title', 'content'];
+
+    // for every word: field --> doc id --> best rank of the doc in the posting lists of the terms that start with the word
+    let word_ranks = await Promise.all(words.map(word => {
+        let chars = Array.from(word);
+        return get_prebuilt_shard(chars.slice(0, prebuilt.prefix_length).join('')).then(shard => {
+            let terms = (chars.length < prebuilt.prefix_length) ? [word] : Object.keys(shard).filter(term => term.startsWith(word));
+            let ranks = [{}, {}];
+            terms.forEach(term => {
+                if (!(term in shard)){
+                    return
+                }
+                shard[term].forEach((doc_ids, f) => {
+                    doc_ids.forEach((doc_id, rank) => {
+                        if (!(doc_id in ranks[f]) || rank < ranks[f][doc_id]){
+                            ranks[f][doc_id] = rank;
+                        }
+                    })
+                })
+            })
+            return ranks
+        })
+    }));
+
+    let matches = [];
+    let matches_by_id = {};
+    fields.forEach((field, f) => {
+        // documents that match all words in this field, best ranked first
+        let scores = [];
+        for (let doc_id in word_ranks[0][f]){
+            if (!word_ranks.every(ranks => doc_id in ranks[f])){
+                continue
+            }
+            scores.push([parseInt(doc_id), word_ranks.reduce((score, ranks) => score + ranks[f][doc_id], 0)]);
+        }
+        scores.sort((a, b) => a[1] - b[1]);
+
+        scores.slice(0, 100).forEach(([doc_id, score]) => {
+            if (doc_id in matches_by_id){
+                matches_by_id[doc_id].matched_on.push(field);
+                return
+            }
+            let doc = prebuilt.docs[doc_id];
+            matches_by_id[doc_id] = { id: doc_id, title: doc.title, url: get_node_url_adaptive(doc), matched_on: [field] };
+            matches.push(matches_by_id[doc_id]);
+        })
+    })
+
+    return matches
+}
+
+// SNIPPET STORE
+// -----------------------------------------------------------------------------------------------
+// The content of the documents, written by SearchHead.WriteSnippets() at build time, SNIPPET_BUCKET_SIZE documents per file.
+
+// returns doc id --> content, for the documents in results
+async function GetSnippets(results) {
+    let snippets = {};
+    await Promise.all(results.map(res => {
+        let bucket = Math.floor(res.id / SNIPPET_BUCKET_SIZE);
+        if (!(bucket in SNIPPETS)){
+            SNIPPETS[bucket] = fetch(get_search_data_url('snippets/' + bucket + '.json')).then(res => res.json());
+        }
+        return SNIPPETS[bucket].then(contents => {
+            snippets[res.id] = contents[res.id % SNIPPET_BUCKET_SIZE];
+        })
+    }));
+    return snippets
+}
+
+// RESULTS
+// -----------------------------------------------------------------------------------------------
+function GetHtmlFlex(fs_results, search_string, hard_search, get_content) {
     let template = `
 <li>
     <div class="search-result-title">
@@ -242,7 +395,7 @@ function GetHtmlFlex(fs_results, search_string, hard_search) {
         let element = template;
         html += element.replace('{{url}}', res.url)
                     .replace('{{title}}', res.title)
-                    .replace('{{content}}', highlight(SEARCH_DATA[res.id].content, search_string, false, 20).join(" "))
+                    .replace('{{content}}', highlight(get_content(res.id), search_string, false, 20).join(" "))
     });
     html += '</ul>'
     return html